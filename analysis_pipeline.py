@@ -0,0 +1,289 @@
+"""
+Pipeline di analisi a stadi con code limitate
+
+La cattura resta nel thread che possiede il browser (Playwright sync non è
+thread-safe) e consegna i grafici alla pipeline; preparazione, inferenza e
+pubblicazione girano in thread propri, collegati da code di dimensione fissa.
+Mentre il modello analizza il ciclo N, il browser è già libero per la cattura
+successiva (o per un altro simbolo). Se le code si riempiono la consegna si
+blocca: la cattura non può accumulare lavoro più in fretta di quanto l'API smaltisca.
+
+    cattura ──▶ [prepare] ──▶ [infer] ──▶ [publish]
+"""
+import os
+import queue
+import threading
+import time
+
+
+_STOP = object()
+
+
+class AnalysisJob:
+    """Un'analisi che attraversa la pipeline"""
+    
+    def __init__(self, symbol, screenshots, current_price=None, deadline=None, cycle=None, prompt=None,
+                 broker=None):
+        self.symbol = symbol
+        self.broker = broker
+        self.screenshots = screenshots
+        self.current_price = current_price
+        self.deadline = deadline
+        self.cycle = cycle
+        self.prompt = prompt
+        self.submitted = time.monotonic()
+        
+        self.prepared = None
+        self.signal = None
+        self.error = None
+        # {stadio: secondi}
+        self.timings = {}
+    
+    @property
+    def label(self):
+        return f"{self.symbol} #{self.cycle}" if self.cycle is not None else self.symbol
+
+
+class Stage:
+    """Stadio con N worker e coda d'ingresso limitata"""
+    
+    def __init__(self, name, func, workers=1, queue_size=2):
+        """
+        Inizializza lo stadio
+        
+        Args:
+            name: Nome dello stadio (log e statistiche)
+            func: Funzione job -> job da passare allo stadio successivo (None = scartato)
+            workers: Numero di thread dello stadio
+            queue_size: Job al massimo in attesa nella coda d'ingresso
+        """
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.next = None
+        self.on_done = None
+        self._threads = []
+        
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy = 0
+        self.busy_time = 0.0
+    
+    def start(self):
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"pipeline-{self.name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+    
+    def _work(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                return
+            
+            with self._lock:
+                self.busy += 1
+            start = time.monotonic()
+            result = None
+            try:
+                result = self.func(job)
+            except Exception as e:
+                job.error = e
+                with self._lock:
+                    self.errors += 1
+                print(f"❌ [pipeline:{self.name}] {job.label}: {e}")
+            elapsed = time.monotonic() - start
+            job.timings[self.name] = elapsed
+            with self._lock:
+                self.busy -= 1
+                self.busy_time += elapsed
+                self.processed += 1
+                if result is None and job.error is None:
+                    self.dropped += 1
+            
+            if result is not None and self.next is not None:
+                # Coda piena: il worker attende (backpressure verso gli stadi precedenti)
+                self.next.queue.put(result)
+            else:
+                self.on_done(job)
+    
+    def stats(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queued": self.queue.qsize(),
+                "busy": self.busy,
+                "processed": self.processed,
+                "dropped": self.dropped,
+                "errors": self.errors,
+                "avg_ms": round(self.busy_time / self.processed * 1000) if self.processed else None,
+            }
+
+
+class AnalysisPipeline:
+    """Preparazione, inferenza e pubblicazione dei segnali in parallelo alla cattura"""
+    
+    def __init__(self, analyzer, publish, prepare_workers=1, infer_workers=2, publish_workers=1, queue_size=2,
+                 on_complete=None):
+        """
+        Inizializza la pipeline
+        
+        Args:
+            analyzer: DeepSeekAnalyzer condiviso (prepare/infer)
+            publish: Funzione chiamata con ogni AnalysisJob concluso con un segnale
+            prepare_workers: Thread dello stadio di preparazione (hash, prompt, immagini)
+            infer_workers: Richieste all'API in corso contemporaneamente dalla pipeline
+            publish_workers: Thread dello stadio di pubblicazione
+            queue_size: Job al massimo in attesa davanti a ogni stadio
+            on_complete: Funzione chiamata con ogni AnalysisJob uscito dalla pipeline,
+                         anche senza segnale (job.signal None, job.error valorizzato)
+        """
+        self.analyzer = analyzer
+        self.publish = publish
+        self.on_complete = on_complete
+        self.stages = [
+            Stage("prepare", self._prepare, prepare_workers, queue_size),
+            Stage("infer", self._infer, infer_workers, queue_size),
+            Stage("publish", self._publish, publish_workers, queue_size),
+        ]
+        for stage, following in zip(self.stages, self.stages[1:] + [None]):
+            stage.next = following
+            stage.on_done = self._job_done
+        
+        self._cond = threading.Condition()
+        self.in_flight = 0
+        self.completed = 0
+        self.signals = 0
+        self.expired = 0
+        self._started = False
+    
+    @classmethod
+    def from_env(cls, analyzer, publish, on_complete=None):
+        """
+        Crea la pipeline dalle variabili d'ambiente
+        
+        PIPELINE_INFER_WORKERS (2), PIPELINE_QUEUE_SIZE (2)
+        """
+        return cls(
+            analyzer,
+            publish,
+            infer_workers=int(os.getenv("PIPELINE_INFER_WORKERS", "2")),
+            queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", "2")),
+            on_complete=on_complete
+        )
+    
+    def start(self):
+        """Avvia i worker di tutti gli stadi"""
+        if not self._started:
+            for stage in self.stages:
+                stage.start()
+            self._started = True
+    
+    def submit(self, symbol, screenshots, current_price=None, deadline=None, cycle=None, prompt=None,
+               broker=None):
+        """
+        Consegna i grafici catturati alla pipeline
+        
+        Si blocca se la coda di preparazione è piena (backpressure sulla cattura).
+        
+        Args:
+            symbol: Simbolo analizzato
+            screenshots: Dizionario {timeframe: path}
+            current_price: Prezzo al momento della cattura
+            deadline: Istante (time.monotonic) oltre il quale il segnale non serve più
+            cycle: Numero del ciclo (per i log)
+            prompt: Variante del prompt (prompt_<NOME>.txt, default: quella del simbolo)
+            broker: Broker del simbolo (per il prezzo dal feed se current_price manca)
+        
+        Returns:
+            AnalysisJob accodato
+        """
+        self.start()
+        job = AnalysisJob(symbol, screenshots, current_price, deadline, cycle, prompt, broker)
+        with self._cond:
+            self.in_flight += 1
+        self.stages[0].queue.put(job)
+        return job
+    
+    def _prepare(self, job):
+        job.prepared = self.analyzer.prepare(job.screenshots, current_price=job.current_price, symbol=job.symbol,
+                                             prompt=job.prompt, broker=job.broker)
+        return job if job.prepared is not None else None
+    
+    def _infer(self, job):
+        if job.deadline is not None and time.monotonic() >= job.deadline:
+            # Rimasto in coda fino alla scadenza: il ciclo successivo ha grafici più recenti
+            print(f"⏰ [pipeline] {job.label}: scaduta in coda, analisi saltata")
+            with self._cond:
+                self.expired += 1
+            return None
+        job.signal = self.analyzer.infer(job.prepared, job.deadline)
+        return job if job.signal is not None else None
+    
+    def _publish(self, job):
+        self.publish(job)
+        with self._cond:
+            self.signals += 1
+        return job
+    
+    def _job_done(self, job):
+        if self.on_complete is not None:
+            try:
+                self.on_complete(job)
+            except Exception as e:
+                print(f"⚠️  [pipeline] {job.label}: errore nel completamento: {e}")
+        with self._cond:
+            self.in_flight -= 1
+            self.completed += 1
+            self._cond.notify_all()
+    
+    def drain(self, timeout=None):
+        """
+        Attende che tutti i job accodati siano conclusi
+        
+        Returns:
+            True se la pipeline è vuota, False allo scadere del timeout
+        """
+        end = time.monotonic() + timeout if timeout is not None else None
+        with self._cond:
+            while self.in_flight:
+                remaining = end - time.monotonic() if end is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+    
+    def close(self, timeout=None):
+        """Attende i job in corso (fino a timeout) e ferma i worker"""
+        self.drain(timeout)
+        if self._started:
+            for stage in self.stages:
+                stage.stop()
+            self._started = False
+    
+    def stats(self):
+        """
+        Stato della pipeline (per /api/status)
+        
+        Returns:
+            Dizionario con job in corso, conclusi, segnali, scaduti e statistiche per stadio
+        """
+        with self._cond:
+            summary = {
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "signals": self.signals,
+                "expired": self.expired,
+            }
+        summary["stages"] = {stage.name: stage.stats() for stage in self.stages}
+        return summary
@@ -3,17 +3,29 @@ Trading Bot - Flask Web Application
 Interfaccia web per visualizzare i log in tempo reale
 """
 from flask import Flask, render_template, Response, jsonify
-from datetime import datetime, timedelta
+from datetime import datetime
 import threading
 import queue
-import time
 import os
 import sys
 from io import StringIO
 
 # Import delle funzioni del trading bot
 from tradingview_scraper import TradingViewScraper
+from async_scraper import AsyncTradingViewScraper, AsyncScraperRunner, ENGINES
 from deepseek_analyzer import DeepSeekAnalyzer
+from network_filter import NetworkFilter
+from image_pipeline import ImagePipeline
+from price_feed import PriceFeed, PRICE_FEED_MAX_AGE
+from browser_watchdog import BrowserWatchdog
+from browser_state import BrowserState
+from screenshot_store import ScreenshotStore
+from frame_cache import FrameCache
+from analysis_pipeline import AnalysisPipeline
+from scheduler import CandleScheduler
+from scraper_pool import ScraperPool
+from orchestrator import MultiSymbolOrchestrator, load_symbol_configs
+from price_trigger import PriceTrigger
 
 app = Flask(__name__)
 
@@ -22,6 +34,16 @@ log_queue = queue.Queue()
 bot_thread = None
 bot_running = False
 current_price_global = None  # Ultimo prezzo conosciuto
+network_filter_global = None  # Filtro di rete del browser (contatori per /api/status)
+price_feed_global = PriceFeed()  # Ultimi tick dai websocket di TradingView
+screenshot_store_global = None  # Archivio screenshot (deduplicazione e retention)
+frame_cache_global = None  # Cache dei frame per candela (hit/miss per /api/status)
+analyzer_global = None  # Analizzatore condiviso tra i cicli (connessioni keep-alive)
+watchdog_global = None  # Watchdog del browser persistente (riavvii e RSS per /api/status)
+pipeline_global = None  # Pipeline di analisi (PIPELINE=true): inferenza in parallelo alla cattura
+scheduler_global = None  # Scheduler allineato alle candele (ritardi e sforamenti per /api/status)
+orchestrator_global = None  # Orchestratore multi-simbolo (SYMBOLS): stato per simbolo in /api/status
+trigger_global = None  # Trigger sul movimento del prezzo (TRIGGER_PIPS / TRIGGER_VOLATILITY)
 
 class LogCapture:
     """Cattura i log e li mette nella coda"""
@@ -61,15 +83,23 @@ def print_signal(signal: dict):
     log_message(f"   {signal['spiegazione']}")
     log_message("\n" + "="*70 + "\n")
 
+def publish_signal(job):
+    """Pubblica il segnale di un'analisi conclusa nella pipeline"""
+    log_message(f"✅ [{job.label}] Segnale ricevuto con successo")
+    print_signal(job.signal)
+
 def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str, 
-                       screenshots_dir: str = "screenshots", scraper: TradingViewScraper = None):
-    """Esegue un ciclo completo di analisi"""
+                       screenshots_dir: str = "screenshots", scraper: TradingViewScraper = None,
+                       analyzer: DeepSeekAnalyzer = None, deadline: float = None,
+                       pipeline: AnalysisPipeline = None, cycle: int = None):
+    """Esegue un ciclo completo di analisi (con pipeline: cattura e consegna, l'analisi prosegue in background)"""
     log_message(f"\n🚀 Avvio ciclo di analisi - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     log_message(f"   Simbolo: {symbol}")
     log_message(f"   Broker: {broker}")
     
     # Inizializza scraper solo se non fornito
     scraper_created = False
+    analyzer_created = False
     if scraper is None:
         scraper = TradingViewScraper(symbol=symbol, broker=broker)
         scraper_created = True
@@ -100,10 +130,19 @@ def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str,
             current_price_global = current_price
             log_message(f"\n💰 Ultimo prezzo conosciuto: {current_price}")
         
+        if pipeline is not None:
+            pipeline.submit(symbol, available_screenshots, current_price=current_price, deadline=deadline, cycle=cycle,
+                            broker=broker)
+            log_message("📨 Grafici consegnati alla pipeline di analisi")
+            return True
+        
         # Analizza con DeepSeek
         log_message("\n🤖 Analisi AI in corso...")
-        analyzer = DeepSeekAnalyzer(api_key=deepseek_api_key)
-        signal = analyzer.analyze_charts(available_screenshots, current_price=current_price, symbol=symbol)
+        if analyzer is None:
+            analyzer = DeepSeekAnalyzer(api_key=deepseek_api_key, price_feed=price_feed_global)
+            analyzer_created = True
+        signal = analyzer.analyze_charts(available_screenshots, current_price=current_price, symbol=symbol,
+                                         deadline=deadline, broker=broker)
         
         if signal:
             log_message("✅ Segnale ricevuto con successo")
@@ -120,10 +159,60 @@ def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str,
         # Chiudi scraper solo se creato localmente
         if scraper_created:
             scraper.close()
+        if analyzer_created:
+            analyzer.close()
+
+def run_multi_symbol_bot(spec, api_key, broker, interval, screenshots_dir, ready_timeout, image_pipeline,
+                         browser_state):
+    """Esegue più simboli nello stesso processo: un browser e un analizzatore condivisi"""
+    global bot_running, analyzer_global, pipeline_global, scheduler_global, orchestrator_global
+    
+    try:
+        configs = load_symbol_configs(spec, broker=broker, interval=interval)
+    except (OSError, ValueError) as e:
+        log_message(f"❌ ERRORE: SYMBOLS non valido: {e}")
+        return
+    
+    max_pages = int(os.getenv("POOL_MAX_PAGES", "4"))
+    log_message("="*70)
+    log_message("🤖 TRADING BOT - Analisi automatica CFD con DeepSeek AI (multi-simbolo)")
+    log_message("="*70)
+    log_message(f"\nConfigurazione:")
+    log_message(f"  - Simboli: {len(configs)} (browser condiviso, max {max_pages} pagine)")
+    for config in configs:
+        log_message(f"      {config.broker}:{config.symbol} ogni {config.interval} minuti, "
+                    f"timeframe {', '.join(config.timeframes)}, prompt {config.prompt or config.symbol}")
+    log_message(f"  - Directory screenshots: {screenshots_dir}")
+    log_message(f"  - Filtro rete: {network_filter_global.mode if network_filter_global else 'off'}")
+    log_message("")
+    
+    pool = ScraperPool(max_pages=max_pages, ready_timeout=ready_timeout, network_filter=network_filter_global,
+                       image_pipeline=image_pipeline, price_feed=price_feed_global, browser_state=browser_state,
+                       screenshot_store=screenshot_store_global, frame_cache=frame_cache_global)
+    analyzer_global = DeepSeekAnalyzer(api_key=api_key, price_feed=price_feed_global)
+    scheduler_global = None
+    orchestrator_global = MultiSymbolOrchestrator(
+        configs, pool, analyzer_global, publish_signal,
+        screenshots_dir=screenshots_dir,
+        offset=float(os.getenv("SCHEDULE_OFFSET", "5")),
+        overrun=os.getenv("SCHEDULE_OVERRUN", "skip").lower(),
+        infer_workers=int(os.getenv("PIPELINE_INFER_WORKERS", "2")),
+        queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", "2"))
+    )
+    pipeline_global = orchestrator_global.pipeline
+    
+    screenshot_store_global.start()
+    bot_running = True
+    try:
+        orchestrator_global.run()
+    finally:
+        bot_running = False
+        orchestrator_global.close()
 
 def run_bot():
     """Esegue il bot in un thread separato"""
-    global bot_running
+    global bot_running, network_filter_global, watchdog_global, screenshot_store_global, frame_cache_global
+    global analyzer_global, pipeline_global, scheduler_global, trigger_global
     
     # Parametri dal environment
     api_key = os.getenv("FIREWORKS_API_KEY", "")
@@ -131,29 +220,97 @@ def run_bot():
     broker = os.getenv("BROKER", "EIGHTCAP")
     interval = int(os.getenv("INTERVAL", "10"))
     screenshots_dir = os.getenv("SCREENSHOTS_DIR", "/app/screenshots")
+    concurrency = int(os.getenv("CAPTURE_CONCURRENCY", "1"))
+    ready_timeout = float(os.getenv("CHART_READY_TIMEOUT", "30"))
+    live_tabs = os.getenv("LIVE_TABS", "false").lower() == "true"
+    use_pipeline = os.getenv("PIPELINE", "false").lower() == "true"
+    engine = os.getenv("SCRAPER_ENGINE", "sync").lower()
+    if engine not in ENGINES:
+        log_message(f"⚠️  SCRAPER_ENGINE={engine} non valido ({', '.join(ENGINES)}): uso sync")
+        engine = "sync"
+    network_filter_global = NetworkFilter.from_env()
+    image_pipeline = ImagePipeline.from_env()
+    browser_state = BrowserState.from_env()
+    screenshot_store_global = ScreenshotStore.from_env(screenshots_dir)
+    frame_cache_global = FrameCache.from_env()
     
     if not api_key:
         log_message("❌ ERRORE: FIREWORKS_API_KEY non configurata!")
         return
     
+    symbols_spec = os.getenv("SYMBOLS", "").strip()
+    if symbols_spec:
+        # Ogni simbolo ha il proprio scheduler nell'orchestratore: il trigger sul prezzo vale solo per SYMBOL
+        if float(os.getenv("TRIGGER_PIPS", "0")) > 0 or float(os.getenv("TRIGGER_VOLATILITY", "0")) > 0:
+            log_message("⚠️  TRIGGER_* ignorati con SYMBOLS: i simboli partono sui confini delle candele")
+        if engine != "sync":
+            log_message(f"⚠️  SCRAPER_ENGINE={engine} ignorato con SYMBOLS: il pool usa il motore sync")
+        run_multi_symbol_bot(symbols_spec, api_key, broker, interval, screenshots_dir, ready_timeout,
+                             image_pipeline, browser_state)
+        return
+    
+    scheduler_global = CandleScheduler.from_env(interval)
+    trigger_global = PriceTrigger.from_env(price_feed_global, symbol, interval, broker=broker)
+    
     log_message("="*70)
     log_message("🤖 TRADING BOT - Analisi automatica CFD con DeepSeek AI")
     log_message("="*70)
     log_message(f"\nConfigurazione:")
     log_message(f"  - Simbolo: {symbol}")
     log_message(f"  - Broker: {broker}")
-    log_message(f"  - Intervallo: {interval} minuti")
+    log_message(f"  - Intervallo: {interval} minuti (chiusura candela + {scheduler_global.offset:g}s, "
+                f"sforamenti: {scheduler_global.overrun})")
+    if trigger_global is not None:
+        log_message(f"  - Trigger: movimento {trigger_global.pips or '-'} pips, volatilità {trigger_global.volatility or '-'} pips "
+                    f"in {trigger_global.window:g}s, spaziatura {trigger_global.min_spacing:g}-{trigger_global.max_spacing:g}s")
     log_message(f"  - Directory screenshots: {screenshots_dir}")
+    log_message(f"  - Motore di cattura: {engine}")
+    log_message(f"  - Cattura parallela: {concurrency} pagine")
+    log_message(f"  - Tab live: {'attive' if live_tabs else 'disattivate'}")
+    log_message(f"  - Filtro rete: {network_filter_global.mode if network_filter_global else 'off'}")
+    log_message(f"  - Immagini: {image_pipeline.fmt}, max {image_pipeline.max_width}px, qualità {image_pipeline.quality}")
+    log_message(f"  - Stato browser: {browser_state.state_dir if browser_state else 'non persistente'}")
+    log_message(f"  - Pipeline analisi: {'attiva' if use_pipeline else 'disattivata'}")
     log_message("")
     
     # Crea scraper persistente per mantenere la cache
-    persistent_scraper = TradingViewScraper(symbol=symbol, broker=broker)
-    log_message("💾 Scraper persistente creato (cache 1H attiva)\n")
+    scraper_options = dict(symbol=symbol, broker=broker, concurrency=concurrency, ready_timeout=ready_timeout,
+                           network_filter=network_filter_global, image_pipeline=image_pipeline,
+                           price_feed=price_feed_global, browser_state=browser_state,
+                           screenshot_store=screenshot_store_global, frame_cache=frame_cache_global)
+    if engine == "async":
+        # Event loop persistente nel thread del bot: stessa interfaccia sync del watchdog
+        watchdog_global = AsyncScraperRunner(AsyncTradingViewScraper(**scraper_options))
+        log_message("💾 Scraper async persistente creato (cache frame per candela attiva)")
+        log_message("⚠️  Motore async: watchdog browser non disponibile\n")
+    else:
+        persistent_scraper = TradingViewScraper(live_tabs=live_tabs, **scraper_options)
+        
+        # Watchdog: ricicla il browser su crash o memoria eccessiva, con standby pre-avviato
+        watchdog_global = BrowserWatchdog.from_env(persistent_scraper)
+        log_message("💾 Scraper persistente creato (cache frame per candela attiva)")
+        log_message(f"🛡️  Watchdog browser attivo (max RSS {watchdog_global.max_rss_mb} MB)\n")
+    
+    # Archiviazione e retention degli screenshot in background
+    screenshot_store_global.start()
+    
+    # Analizzatore condiviso tra i cicli: connessioni HTTP keep-alive e storico compatto dei segnali
+    analyzer_global = DeepSeekAnalyzer(api_key=api_key, price_feed=price_feed_global)
+    if use_pipeline:
+        pipeline_global = AnalysisPipeline.from_env(analyzer_global, publish_signal)
     
     bot_running = True
     cycle = 0
     
     while bot_running:
+        if trigger_global is not None:
+            # Avvio al movimento del prezzo: in attesa il browser resta attivo per ricevere i tick
+            run = trigger_global.wait(pump=watchdog_global.pump_events)
+        else:
+            # Avvio sul prossimo confine di candela (il primo ciclo parte subito)
+            run = scheduler_global.wait_next()
+        if run is None:
+            break
         cycle += 1
         
         log_message("="*70)
@@ -162,8 +319,10 @@ def run_bot():
         log_message("")
         
         try:
-            # Esegui ciclo di analisi
-            success = run_analysis_cycle(symbol, broker, api_key, screenshots_dir, scraper=persistent_scraper)
+            # Esegui ciclo di analisi (l'analisi deve concludersi prima dello slot successivo)
+            success = run_analysis_cycle(symbol, broker, api_key, screenshots_dir, scraper=watchdog_global,
+                                         analyzer=analyzer_global, deadline=run.deadline,
+                                         pipeline=pipeline_global, cycle=cycle)
             
             if success:
                 log_message("✅ Ciclo completato con successo")
@@ -174,16 +333,18 @@ def run_bot():
             log_message(f"❌ Errore nel ciclo: {e}")
         
         log_message("")
-        next_time = datetime.now()
-        next_time = next_time.replace(second=0, microsecond=0)
-        next_time += timedelta(minutes=interval)
-        
-        log_message(f"⏳ Prossima analisi alle {next_time.strftime('%H:%M:%S')} ({interval} minuti)")
+        if trigger_global is not None:
+            next_time = datetime.fromtimestamp(trigger_global.next_forced())
+            log_message(f"⏳ Prossima analisi al movimento del prezzo (al più tardi alle {next_time.strftime('%H:%M:%S')})")
+        else:
+            scheduler_global.finish(run)
+            next_time = datetime.fromtimestamp(scheduler_global.next_slot)
+            log_message(f"⏳ Prossima analisi alle {next_time.strftime('%H:%M:%S')} (candele da {interval} minuti)")
         log_message(f"   Premi Ctrl+C per terminare")
         log_message("")
         
-        # Attendi intervallo
-        time.sleep(interval * 60)
+        # Browser di riserva del watchdog avviato tra un ciclo e l'altro
+        watchdog_global.idle()
 
 @app.route('/')
 def index():
@@ -208,12 +369,35 @@ def stream_logs():
 @app.route('/api/status')
 def status():
     """API per ottenere lo stato del bot"""
+    broker = os.getenv('BROKER', 'EIGHTCAP')
+    if os.getenv('SYMBOLS', '').strip():
+        # Multi-simbolo: simbolo e prezzo sono per simbolo, in 'symbols' e 'ticks'
+        symbol = None
+        current_price = None
+    else:
+        symbol = os.getenv('SYMBOL', 'XAUUSD')
+        # Solo un tick recente del broker configurato; altrimenti l'ultimo prezzo del ciclo
+        tick = price_feed_global.last(symbol, max_age=PRICE_FEED_MAX_AGE, broker=broker)
+        current_price = tick['price'] if tick else current_price_global
     return jsonify({
         'status': 'running' if bot_running else 'stopped',
-        'symbol': os.getenv('SYMBOL', 'XAUUSD'),
-        'broker': os.getenv('BROKER', 'EIGHTCAP'),
+        'symbol': symbol,
+        'broker': broker,
         'interval': os.getenv('INTERVAL', '10'),
-        'current_price': current_price_global,
+        'current_price': current_price,
+        'ticks': price_feed_global.snapshot(),
+        'browser': watchdog_global.stats() if watchdog_global else None,
+        'network': network_filter_global.stats() if network_filter_global else None,
+        'screenshots': screenshot_store_global.stats() if screenshot_store_global else None,
+        'frame_cache': frame_cache_global.stats() if frame_cache_global else None,
+        'llm_http': analyzer_global.transport.stats() if analyzer_global else None,
+        'llm_backends': analyzer_global.backend_stats() if analyzer_global else None,
+        'llm_rate_limit': analyzer_global.limiter.stats() if analyzer_global else None,
+        'llm_cache': analyzer_global.response_cache.stats() if analyzer_global else None,
+        'pipeline': pipeline_global.stats() if pipeline_global else None,
+        'scheduler': scheduler_global.stats() if scheduler_global else None,
+        'symbols': orchestrator_global.stats() if orchestrator_global else None,
+        'trigger': trigger_global.stats() if trigger_global else None,
         'timestamp': datetime.now().isoformat()
     })
 
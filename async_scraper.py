@@ -0,0 +1,454 @@
+"""
+Variante asyncio dello scraper TradingView basata su playwright.async_api
+
+Espone la stessa API di cattura e prezzo di TradingViewScraper come coroutine,
+così un solo event loop può pilotare più pagine (e più simboli) insieme alle
+chiamate HTTP verso l'AI. Sonde JavaScript, URL, parsing del prezzo e logica di
+prontezza sono quelle di tradingview_scraper: le due classi sono solo due
+livelli di trasporto sopra la stessa logica. TradingViewScraper resta il
+motore predefinito di trading_bot.py e app.py; AsyncScraperRunner permette di
+usare questo motore dagli stessi loop sync (--engine async / SCRAPER_ENGINE=async).
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from playwright.async_api import async_playwright
+
+from tradingview_scraper import (
+    CHART_READY_PROBE_JS,
+    CHROMIUM_LAUNCH_OPTIONS,
+    CLEANUP_JS,
+    PRICE_FEED_MAX_AGE,
+    PRICE_RANGES,
+    PRICE_SELECTORS,
+    ChartNotReadyError,
+    build_chart_url,
+    chart_context_options,
+    is_plausible_price,
+    parse_price_text,
+    pending_chart_phase,
+)
+from image_pipeline import CHART_REGION_JS
+from frame_cache import FrameCache
+from browser_watchdog import chromium_rss_bytes
+
+
+TIMEFRAMES = {
+    "60min": 60,
+    "15min": 15,
+    "1min": 1
+}
+
+# Motori di cattura selezionabili da trading_bot.py (--engine) e app.py (SCRAPER_ENGINE)
+ENGINES = ("sync", "async")
+
+
+class AsyncTradingViewScraper:
+    """Scraper TradingView asincrono: una pagina per timeframe, catture in parallelo"""
+    
+    def __init__(self, symbol="XAUUSD", broker="EIGHTCAP", concurrency=3, ready_timeout=30,
+                 browser=None, network_filter=None, image_pipeline=None, price_feed=None,
+                 price_range=None, browser_state=None, screenshot_store=None, frame_cache=None):
+        """
+        Inizializza lo scraper
+        
+        Args:
+            symbol: Simbolo del CFD (es. XAUUSD)
+            broker: Broker (es. EIGHTCAP)
+            concurrency: Numero massimo di pagine caricate contemporaneamente
+            ready_timeout: Scadenza massima (secondi) per la prontezza del grafico
+            browser: Browser async condiviso (opzionale, non viene chiuso da close())
+            network_filter: NetworkFilter applicato a ogni contesto (opzionale)
+            image_pipeline: ImagePipeline per gli screenshot (opzionale)
+            price_feed: PriceFeed alimentato dai websocket delle pagine (opzionale)
+            price_range: Intervallo (min, max) di prezzi plausibili per il fallback DOM
+            browser_state: BrowserState con storage state e cache asset (opzionale)
+            screenshot_store: ScreenshotStore in cui registrare i frame catturati (opzionale)
+            frame_cache: FrameCache dei frame per candela (default: come TradingViewScraper)
+        """
+        self.symbol = symbol
+        self.broker = broker
+        self.ready_timeout = ready_timeout
+        self.playwright = None
+        self.browser = browser
+        self.shared_browser = browser is not None
+        self.network_filter = network_filter
+        self.image_pipeline = image_pipeline
+        self.price_feed = price_feed
+        self.price_range = price_range or PRICE_RANGES.get(symbol)
+        self.browser_state = browser_state
+        self.screenshot_store = screenshot_store
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache()
+        
+        self._semaphore = asyncio.Semaphore(max(1, int(concurrency)))
+        
+        # Una pagina per timeframe, riutilizzata tra i cicli {timeframe: page}
+        self.pages = {}
+        
+        # Tempi per fase dell'ultima attesa di prontezza {timeframe: {fase: secondi}}
+        self.last_readiness = {}
+    
+    async def __aenter__(self):
+        await self.start()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    async def start(self):
+        """Avvia Playwright e il browser (se non condiviso)"""
+        if self.browser is not None:
+            return
+        
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(**CHROMIUM_LAUNCH_OPTIONS)
+        print(f"    ✓ Browser Playwright (async) inizializzato")
+    
+    async def _new_page(self):
+        """Crea una pagina in un nuovo contesto isolato del browser"""
+        context = await self.browser.new_context(**chart_context_options(self.browser_state))
+        
+        # La cache asset va registrata prima del filtro: il filtro decide per primo
+        if self.browser_state is not None:
+            await self.browser_state.install_async(context)
+        if self.network_filter is not None:
+            await self.network_filter.install_async(context)
+        
+        page = await context.new_page()
+        if self.price_feed is not None:
+            self.price_feed.attach(page)
+        return page
+    
+    async def _page_for(self, timeframe):
+        """Restituisce la pagina del timeframe, ricreandola se chiusa"""
+        page = self.pages.get(timeframe)
+        if page is None or page.is_closed():
+            page = await self._new_page()
+            self.pages[timeframe] = page
+        return page
+    
+    async def _wait_for_chart_ready(self, page, deadline):
+        """
+        Attende la prontezza del grafico (stesse fasi di TradingViewScraper)
+        
+        Args:
+            page: Pagina da controllare
+            deadline: Istante assoluto (time.monotonic) oltre il quale fallire
+        
+        Returns:
+            Dizionario {fase: secondi}
+        
+        Raises:
+            ChartNotReadyError: scadenza superata o errore non recuperabile
+        """
+        start = time.monotonic()
+        phase_start = start
+        timings = {}
+        current = "canvas"
+        
+        while True:
+            try:
+                state = await page.evaluate(CHART_READY_PROBE_JS)
+            except Exception:
+                # Contesto JS non ancora disponibile durante la navigazione
+                state = None
+            
+            if state is not None:
+                if state.get("error"):
+                    raise ChartNotReadyError(f"grafico non disponibile ({state['error']})")
+                
+                pending = pending_chart_phase(state)
+                if pending != current:
+                    now = time.monotonic()
+                    timings[current] = round(now - phase_start, 2)
+                    phase_start = now
+                    current = pending
+                if pending is None:
+                    break
+            
+            if time.monotonic() >= deadline:
+                raise ChartNotReadyError(
+                    f"fase '{current}' non completata entro {deadline - start:.1f}s"
+                )
+            await asyncio.sleep(0.25)
+        
+        timings["total"] = round(time.monotonic() - start, 2)
+        return timings
+    
+    async def _clean_interface(self, page):
+        """Chiude popup e rimuove dialog/overlay che coprirebbero il grafico"""
+        try:
+            for _ in range(2):
+                await page.keyboard.press('Escape')
+            await page.evaluate(CLEANUP_JS)
+        except Exception as e:
+            print(f"    Warning cleanup: {str(e)[:40]}")
+    
+    async def _take_screenshot(self, page, output_path):
+        """Salva lo screenshot, tramite la pipeline immagini se configurata"""
+        if self.image_pipeline is None:
+            await page.screenshot(path=output_path, full_page=False)
+            return
+        
+        clip = await page.evaluate(CHART_REGION_JS) if self.image_pipeline.clip else None
+        raw = await page.screenshot(clip=clip, full_page=False)
+        # Ridimensionamento e codifica sono CPU-bound: fuori dall'event loop
+        await asyncio.to_thread(self.image_pipeline.save, raw, output_path)
+    
+    async def capture_screenshot(self, timeframe, output_path):
+        """
+        Cattura screenshot del grafico
+        
+        Args:
+            timeframe: Timeframe (1, 15, 60 minuti)
+            output_path: Percorso dove salvare lo screenshot
+        
+        Returns:
+            True se successo, False altrimenti
+        """
+        async with self._semaphore:
+            try:
+                if self.browser is None:
+                    await self.start()
+                
+                page = await self._page_for(timeframe)
+                deadline = time.monotonic() + self.ready_timeout
+                await page.goto(build_chart_url(self.symbol, self.broker, timeframe),
+                                wait_until='commit', timeout=60000)
+                
+                timings = await self._wait_for_chart_ready(page, deadline)
+                await self._clean_interface(page)
+                self.last_readiness[timeframe] = timings
+                
+                await self._take_screenshot(page, output_path)
+                print(f"  ✅ [{timeframe}] Salvato: {output_path} (pronto in {timings['total']:.2f}s)")
+                return True
+            
+            except Exception as e:
+                print(f"  ❌ [{timeframe}] Errore: {e}")
+                return False
+    
+    async def get_current_price(self, page=None):
+        """
+        Prezzo corrente: feed websocket se disponibile, altrimenti DOM
+        
+        Args:
+            page: Pagina da cui leggere il prezzo nel fallback DOM
+                  (default: pagina del timeframe 1 minuto)
+        
+        Returns:
+            Prezzo corrente o None
+        """
+        if self.price_feed is not None:
+            price = self.price_feed.price(self.symbol, max_age=PRICE_FEED_MAX_AGE, broker=self.broker)
+            if price is not None:
+                return price
+        
+        page = page or self.pages.get(1)
+        if page is None or page.is_closed():
+            return None
+        
+        reference = self.price_feed.price(self.symbol, broker=self.broker) if self.price_feed is not None else None
+        for selector in PRICE_SELECTORS:
+            try:
+                for element in (await page.locator(selector).all())[:5]:
+                    price_value = parse_price_text(await element.text_content())
+                    if price_value is not None and is_plausible_price(price_value, self.price_range, reference):
+                        return price_value
+            except Exception as e:
+                print(f"   ⚠️  Errore con selettore {selector}: {e}")
+        return None
+    
+    async def capture_all_timeframes(self, output_dir="screenshots"):
+        """
+        Cattura tutti i timeframe in parallelo ed estrae il prezzo corrente
+        
+        Args:
+            output_dir: Directory dove salvare gli screenshot
+        
+        Returns:
+            Tupla (screenshots_dict, current_price) come TradingViewScraper
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        
+        now = datetime.now()
+        timestamp = now.strftime("%Y%m%d_%H%M%S")
+        extension = self.image_pipeline.extension if self.image_pipeline else ".png"
+        
+        print(f"🚀 CATTURA ASYNC - {self.broker}:{self.symbol} - {now.strftime('%Y-%m-%d %H:%M:%S')}")
+        
+        # Frame della stessa candela ancora validi: quei timeframe non vengono ricaricati
+        reference_price = None
+        if self.price_feed is not None:
+            reference_price = self.price_feed.price(self.symbol, max_age=PRICE_FEED_MAX_AGE, broker=self.broker)
+        screenshots = {}
+        for tf_name, tf_value in TIMEFRAMES.items():
+            cached_path = self.frame_cache.get(self.symbol, tf_name, tf_value, reference_price,
+                                               now.timestamp())
+            if cached_path:
+                print(f"   💾 [{tf_name}] Candela ancora aperta, riutilizzo: {cached_path}")
+            screenshots[tf_name] = cached_path
+        
+        jobs = [tf_name for tf_name in TIMEFRAMES if screenshots[tf_name] is None]
+        paths = {
+            tf_name: os.path.join(output_dir, f"{timestamp}_{tf_name}{extension}")
+            for tf_name in jobs
+        }
+        results = await asyncio.gather(*(
+            self.capture_screenshot(TIMEFRAMES[tf_name], paths[tf_name])
+            for tf_name in jobs
+        ))
+        
+        for tf_name, success in zip(jobs, results):
+            path = paths[tf_name] if success else None
+            if path and self.screenshot_store is not None:
+                path = await asyncio.to_thread(self.screenshot_store.put, self.symbol, tf_name, path, now)
+            screenshots[tf_name] = path
+        
+        current_price = await self.get_current_price()
+        print(f"   💰 Prezzo corrente: {current_price}")
+        
+        for tf_name in jobs:
+            if screenshots[tf_name]:
+                self.frame_cache.put(self.symbol, tf_name, TIMEFRAMES[tf_name], screenshots[tf_name],
+                                     current_price, now.timestamp())
+        
+        page = self.pages.get(1)
+        if self.browser_state is not None and page is not None and any(results):
+            await self.browser_state.save_async(page.context)
+        
+        return screenshots, current_price
+    
+    async def pump_events(self, seconds):
+        """
+        Lascia girare l'event loop per alcuni secondi tra un ciclo e l'altro
+        
+        I frame websocket arrivano al PriceFeed mentre il loop è attivo; se nessuna
+        pagina è aperta carica il grafico a 1 minuto, così il feed riceve i tick.
+        
+        Args:
+            seconds: Durata dell'attesa
+        
+        Returns:
+            True se gli eventi sono stati consegnati, False se il browser non è disponibile
+        """
+        try:
+            page = self.pages.get(1)
+            if page is None or page.is_closed():
+                await self.start()
+                page = await self._page_for(1)
+                await page.goto(build_chart_url(self.symbol, self.broker, 1), wait_until='commit', timeout=60000)
+            await asyncio.sleep(seconds)
+            return True
+        except Exception as e:
+            print(f"   ⚠️  Browser non disponibile durante l'attesa: {e}")
+            await asyncio.sleep(seconds)
+            return False
+    
+    async def close(self):
+        """Chiude le pagine, il browser (se non condiviso) e Playwright"""
+        for page in self.pages.values():
+            try:
+                await page.context.close()
+            except Exception:
+                pass
+        self.pages = {}
+        
+        if self.browser is not None and not self.shared_browser:
+            try:
+                await self.browser.close()
+            except Exception:
+                pass
+            self.browser = None
+        
+        if self.playwright is not None:
+            try:
+                await self.playwright.stop()
+            except Exception:
+                pass
+            self.playwright = None
+
+
+class AsyncScraperRunner:
+    """Interfaccia sync di AsyncTradingViewScraper per i loop di trading_bot.py e app.py"""
+    
+    def __init__(self, scraper):
+        """
+        Inizializza il runner
+        
+        Le pagine di Playwright async restano legate all'event loop che le ha create:
+        il runner tiene un solo loop per tutta la vita dello scraper, nel thread del bot.
+        
+        Args:
+            scraper: AsyncTradingViewScraper da pilotare
+        """
+        self.scraper = scraper
+        self.loop = asyncio.new_event_loop()
+        self.last_rss_mb = 0.0
+        self.peak_rss_mb = 0.0
+    
+    def __getattr__(self, name):
+        # Attributi non definiti qui (price_feed, symbol, ...) delegati allo scraper
+        return getattr(self.scraper, name)
+    
+    def _run(self, coro):
+        return self.loop.run_until_complete(coro)
+    
+    def capture_all_timeframes(self, output_dir="screenshots"):
+        """Come TradingViewScraper.capture_all_timeframes, con le catture in parallelo sul loop"""
+        result = self._run(self.scraper.capture_all_timeframes(output_dir=output_dir))
+        self.last_rss_mb = chromium_rss_bytes() / (1024 * 1024)
+        self.peak_rss_mb = max(self.peak_rss_mb, self.last_rss_mb)
+        return result
+    
+    def get_current_price(self):
+        """Come TradingViewScraper.get_current_price"""
+        return self._run(self.scraper.get_current_price())
+    
+    def pump_events(self, seconds):
+        """Come TradingViewScraper.pump_events: il loop gira e consegna i tick al feed"""
+        return self._run(self.scraper.pump_events(seconds))
+    
+    def idle(self):
+        """Nessun browser di riserva con il motore async (compatibile con BrowserWatchdog.idle)"""
+    
+    def stats(self):
+        """
+        Stato del browser (per /api/status), con le stesse chiavi di BrowserWatchdog.stats
+        
+        Returns:
+            Dizionario con motore, RSS e contatori (riavvii e crash non gestiti dal motore async)
+        """
+        return {
+            "engine": "async",
+            "restarts": 0,
+            "last_restart": None,
+            "last_restart_reason": None,
+            "rss_mb": round(self.last_rss_mb, 1),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "max_rss_mb": None,
+            "page_crashes": 0,
+            "standby_ready": False,
+        }
+    
+    def close(self):
+        """Chiude lo scraper e l'event loop"""
+        if self.loop.is_closed():
+            return
+        try:
+            self._run(self.scraper.close())
+        finally:
+            self.loop.close()
+
+
+if __name__ == "__main__":
+    # Test del modulo: tre timeframe catturati in parallelo sullo stesso event loop
+    async def main():
+        async with AsyncTradingViewScraper(symbol="XAUUSD", broker="EIGHTCAP") as scraper:
+            screenshots, price = await scraper.capture_all_timeframes()
+            print(f"\nPrezzo: {price}")
+            for tf, path in screenshots.items():
+                print(f"  {'✅' if path else '❌'} {tf}: {path or 'ERRORE'}")
+    
+    asyncio.run(main())
@@ -0,0 +1,306 @@
+"""
+Stato persistente del browser tra i riavvii del processo
+
+Salva e ripristina lo storage state (cookie e localStorage, incluse le scelte
+sui popup di consenso/login) e mantiene su disco una cache HTTP degli asset
+statici di TradingView, servita tramite routing Playwright. Dopo un riavvio del
+container il primo ciclo non riscarica gli asset e non ritrova i popup.
+
+Uso da riga di comando per invalidare lo stato quando si corrompe:
+    python3 browser_state.py --invalidate [--state-dir /app/browser-state]
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from urllib.parse import urlparse
+
+
+# Host i cui asset statici sono versionati e quindi sicuri da mettere in cache
+CACHEABLE_HOSTS = ("static.tradingview.com", "s3-symbol-logo.tradingview.com")
+
+# Tipi di risorsa messi in cache
+CACHEABLE_TYPES = ("script", "stylesheet", "font", "image")
+
+
+class BrowserState:
+    """Storage state e cache HTTP su disco condivisi dai contesti del browser"""
+    
+    def __init__(self, state_dir, max_cache_mb=500):
+        """
+        Inizializza lo stato persistente
+        
+        Args:
+            state_dir: Directory dello stato (da montare come volume Docker)
+            max_cache_mb: Dimensione massima della cache asset (MB)
+        """
+        self.state_dir = state_dir
+        self.storage_state_path = os.path.join(state_dir, "storage_state.json")
+        self.cache_dir = os.path.join(state_dir, "http-cache")
+        self.max_cache_mb = max_cache_mb
+        
+        self.cache_hits = 0
+        self.cache_misses = 0
+        
+        os.makedirs(self.cache_dir, exist_ok=True)
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea lo stato dalle variabili d'ambiente
+        
+        BROWSER_STATE_DIR: directory dello stato (vuota = disattivato)
+        BROWSER_CACHE_MAX_MB: dimensione massima della cache (default: 500)
+        
+        Returns:
+            BrowserState, oppure None se BROWSER_STATE_DIR non è impostata
+        """
+        state_dir = os.getenv("BROWSER_STATE_DIR", "")
+        if not state_dir:
+            return None
+        return cls(state_dir, max_cache_mb=int(os.getenv("BROWSER_CACHE_MAX_MB", "500")))
+    
+    def context_options(self):
+        """
+        Opzioni per browser.new_context() che ripristinano lo storage state
+        
+        Uno stato illeggibile (file troncato o non JSON) viene scartato: il
+        contesto parte pulito invece di fallire alla creazione.
+        
+        Returns:
+            Dizionario di opzioni (vuoto se non c'è uno stato salvato valido)
+        """
+        try:
+            with open(self.storage_state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"   ⚠️  Storage state illeggibile, scartato: {e}")
+            self._discard_storage_state()
+            return {}
+        if not isinstance(state, dict):
+            print("   ⚠️  Storage state non valido, scartato")
+            self._discard_storage_state()
+            return {}
+        return {"storage_state": state}
+    
+    def _discard_storage_state(self):
+        """Elimina lo storage state salvato (se presente)"""
+        try:
+            os.remove(self.storage_state_path)
+        except OSError:
+            pass
+    
+    def _write_storage_state(self, state):
+        """Scrive lo storage state in un file temporaneo e lo sostituisce in modo atomico"""
+        tmp_path = self.storage_state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.storage_state_path)
+    
+    def save(self, context):
+        """
+        Salva lo storage state di un contesto e rispetta il limite della cache
+        
+        Args:
+            context: BrowserContext Playwright (sync)
+        """
+        try:
+            self._write_storage_state(context.storage_state())
+        except Exception as e:
+            print(f"   ⚠️  Impossibile salvare lo storage state: {e}")
+        self._prune_cache()
+    
+    async def save_async(self, context):
+        """Versione async di save"""
+        try:
+            self._write_storage_state(await context.storage_state())
+        except Exception as e:
+            print(f"   ⚠️  Impossibile salvare lo storage state: {e}")
+        self._prune_cache()
+    
+    def _cache_paths(self, url):
+        """Percorsi (corpo, metadati) della voce di cache per un URL"""
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return base + ".body", base + ".json"
+    
+    def _is_cacheable(self, request):
+        """Verifica se la richiesta riguarda un asset statico da mettere in cache"""
+        host = urlparse(request.url).hostname or ""
+        return (request.method == "GET"
+                and request.resource_type in CACHEABLE_TYPES
+                and host in CACHEABLE_HOSTS)
+    
+    def _load(self, url):
+        """
+        Legge una voce di cache
+        
+        Returns:
+            Tupla (status, headers, body) o None se assente
+        """
+        body_path, meta_path = self._cache_paths(url)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            with open(body_path, "rb") as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        # L'mtime segna l'ultimo uso: _prune_cache elimina le voci usate meno di recente
+        try:
+            os.utime(body_path)
+        except OSError:
+            pass
+        return meta["status"], meta["headers"], body
+    
+    def _store(self, url, status, headers, body):
+        """Scrive una voce di cache (corpo prima dei metadati, così una voce a metà non viene letta)"""
+        body_path, meta_path = self._cache_paths(url)
+        os.makedirs(os.path.dirname(body_path), exist_ok=True)
+        with open(body_path, "wb") as f:
+            f.write(body)
+        # Gli header di codifica/lunghezza non valgono per il corpo già decodificato
+        headers = {k: v for k, v in headers.items()
+                   if k.lower() not in ("content-encoding", "content-length", "transfer-encoding")}
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "status": status, "headers": headers}, f)
+    
+    def install(self, context):
+        """
+        Installa la cache asset su un contesto (API sync di Playwright)
+        
+        Va installata prima del NetworkFilter: Playwright esegue gli handler in
+        ordine inverso di registrazione, quindi il filtro decide per primo e le
+        richieste ammesse arrivano qui con route.fallback().
+        
+        Args:
+            context: BrowserContext Playwright
+        """
+        context.route("**/*", self._handle_route)
+    
+    def _handle_route(self, route):
+        """Serve gli asset dalla cache su disco o li scarica e li memorizza"""
+        request = route.request
+        if not self._is_cacheable(request):
+            route.fallback()
+            return
+        
+        cached = self._load(request.url)
+        if cached is not None:
+            status, headers, body = cached
+            self.cache_hits += 1
+            route.fulfill(status=status, headers=headers, body=body)
+            return
+        
+        self.cache_misses += 1
+        try:
+            response = route.fetch()
+        except Exception:
+            route.fallback()
+            return
+        if response.status == 200:
+            try:
+                self._store(request.url, response.status, response.headers, response.body())
+            except OSError as e:
+                print(f"   ⚠️  Cache asset non scrivibile: {e}")
+        route.fulfill(response=response)
+    
+    async def install_async(self, context):
+        """Installa la cache asset su un contesto (API async di Playwright)"""
+        await context.route("**/*", self._handle_route_async)
+    
+    async def _handle_route_async(self, route):
+        """Versione async di _handle_route"""
+        request = route.request
+        if not self._is_cacheable(request):
+            await route.fallback()
+            return
+        
+        cached = self._load(request.url)
+        if cached is not None:
+            status, headers, body = cached
+            self.cache_hits += 1
+            await route.fulfill(status=status, headers=headers, body=body)
+            return
+        
+        self.cache_misses += 1
+        try:
+            response = await route.fetch()
+        except Exception:
+            await route.fallback()
+            return
+        if response.status == 200:
+            try:
+                self._store(request.url, response.status, response.headers, await response.body())
+            except OSError as e:
+                print(f"   ⚠️  Cache asset non scrivibile: {e}")
+        await route.fulfill(response=response)
+    
+    def _prune_cache(self):
+        """Elimina le voci usate meno di recente (LRU, mtime aggiornato a ogni hit) se la cache supera max_cache_mb"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith(".body"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+        
+        limit = self.max_cache_mb * 1024 * 1024
+        for _, size, path in sorted(entries):
+            if total <= limit:
+                break
+            for victim in (path, path[:-len(".body")] + ".json"):
+                try:
+                    os.remove(victim)
+                except OSError:
+                    pass
+            total -= size
+    
+    def stats(self):
+        """Contatori della cache asset e presenza dello storage state"""
+        return {
+            "storage_state": os.path.exists(self.storage_state_path),
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+        }
+    
+    def invalidate(self):
+        """Cancella storage state e cache asset (da usare quando lo stato salvato è corrotto)"""
+        self._discard_storage_state()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        print(f"🧹 Stato del browser invalidato in {self.state_dir}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestione dello stato persistente del browser")
+    parser.add_argument(
+        "--state-dir",
+        type=str,
+        default=os.getenv("BROWSER_STATE_DIR", "browser-state"),
+        help="Directory dello stato (default: BROWSER_STATE_DIR o browser-state)"
+    )
+    parser.add_argument(
+        "--invalidate",
+        action="store_true",
+        help="Cancella storage state e cache asset"
+    )
+    args = parser.parse_args()
+    
+    state = BrowserState(args.state_dir)
+    if args.invalidate:
+        state.invalidate()
+    else:
+        print(json.dumps(state.stats(), indent=2))
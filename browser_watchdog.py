@@ -0,0 +1,334 @@
+"""
+Watchdog del browser per lo scraper persistente
+
+Sorveglia la memoria (RSS) dei processi Chromium e i crash delle pagine di un
+TradingViewScraper di lunga durata. Quando una soglia viene superata ricicla il
+browser sostituendolo con un browser di riserva già avviato, così il riciclo
+non aggiunge un avvio a freddo al ciclo successivo. Il browser di riserva si
+avvia tra un ciclo e l'altro (idle), mai durante la cattura, e la sua memoria
+non conta nella soglia RSS del browser attivo.
+"""
+import os
+import time
+from datetime import datetime
+
+from tradingview_scraper import launch_chromium
+
+
+def _read_proc_table():
+    """
+    Legge la tabella dei processi da /proc (solo Linux)
+    
+    Returns:
+        Dizionario {pid: (ppid, nome, rss_byte)}
+    """
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    table = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                stat = f.read()
+            with open(f"/proc/{entry}/statm", "r") as f:
+                rss_pages = int(f.read().split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        # Il nome è tra parentesi e può contenere spazi: i campi successivi partono dopo ')'
+        name = stat[stat.find("(") + 1:stat.rfind(")")]
+        ppid = int(stat[stat.rfind(")") + 2:].split()[1])
+        table[int(entry)] = (ppid, name, rss_pages * page_size)
+    return table
+
+
+def _is_chromium(name):
+    """Verifica se il nome di un processo è di Chromium"""
+    return "chrom" in name.lower() or "headless" in name.lower()
+
+
+def _children_map(table):
+    """Figli di ogni processo {ppid: [pid]}"""
+    children = {}
+    for pid, (ppid, _, _) in table.items():
+        children.setdefault(ppid, []).append(pid)
+    return children
+
+
+def chromium_rss_bytes(root_pid=None, exclude=()):
+    """
+    Somma la RSS dei processi Chromium nell'albero del processo indicato
+    
+    Args:
+        root_pid: Processo radice, incluso se è Chromium (default: processo corrente)
+        exclude: Processi esclusi insieme ai loro discendenti (es. il browser di riserva)
+    
+    Returns:
+        RSS totale in byte (0 se /proc non è disponibile)
+    """
+    root_pid = root_pid or os.getpid()
+    try:
+        table = _read_proc_table()
+    except OSError:
+        return 0
+    if root_pid not in table:
+        return 0
+    
+    children = _children_map(table)
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        if pid in exclude:
+            continue
+        _, name, rss = table[pid]
+        if _is_chromium(name):
+            total += rss
+        stack.extend(children.get(pid, []))
+    return total
+
+
+def chromium_root_pids():
+    """
+    Processi principali dei browser Chromium discendenti del processo corrente
+    
+    Returns:
+        Insieme di pid (vuoto se /proc non è disponibile)
+    """
+    try:
+        table = _read_proc_table()
+    except OSError:
+        return set()
+    
+    children = _children_map(table)
+    roots = set()
+    stack = list(children.get(os.getpid(), []))
+    while stack:
+        pid = stack.pop()
+        if _is_chromium(table[pid][1]):
+            # Il primo processo Chromium di un ramo è il browser: i suoi figli sono renderer e GPU
+            roots.add(pid)
+            continue
+        stack.extend(children.get(pid, []))
+    return roots
+
+
+def _started_pid(before):
+    """Processo principale del browser avviato dopo la lettura before (None se ambiguo)"""
+    started = chromium_root_pids() - before
+    return started.pop() if len(started) == 1 else None
+
+
+class BrowserWatchdog:
+    """Supervisore di un TradingViewScraper con riciclo del browser e standby pre-avviato"""
+    
+    def __init__(self, scraper, max_rss_mb=1500, max_crashes=1, max_age_hours=24, standby=True):
+        """
+        Inizializza il watchdog
+        
+        Args:
+            scraper: TradingViewScraper da sorvegliare (con browser proprio)
+            max_rss_mb: RSS massima dei processi Chromium prima del riciclo
+            max_crashes: Numero di crash di pagina che provoca il riciclo
+            max_age_hours: Età massima del browser prima del riciclo (0 = illimitata)
+            standby: Mantiene un browser di riserva già avviato
+        """
+        self.scraper = scraper
+        self.max_rss_mb = max_rss_mb
+        self.max_crashes = max_crashes
+        self.max_age_hours = max_age_hours
+        self.standby_enabled = standby
+        
+        self.standby_browser = None
+        # Pid dei processi principali di browser attivo e di riserva (None se non identificati)
+        self.browser_pid = None
+        self.standby_pid = None
+        self.standby_pending = False
+        self.browser_started_at = None
+        self.crashes_at_start = 0
+        self.restart_count = 0
+        self.last_restart = None
+        self.last_restart_reason = None
+        self.last_rss_mb = 0.0
+        self.peak_rss_mb = 0.0
+    
+    @classmethod
+    def from_env(cls, scraper):
+        """
+        Crea il watchdog dalle variabili d'ambiente
+        
+        WATCHDOG_MAX_RSS_MB (1500), WATCHDOG_MAX_CRASHES (1),
+        WATCHDOG_MAX_AGE_HOURS (24), WATCHDOG_STANDBY (true)
+        """
+        return cls(
+            scraper,
+            max_rss_mb=int(os.getenv("WATCHDOG_MAX_RSS_MB", "1500")),
+            max_crashes=int(os.getenv("WATCHDOG_MAX_CRASHES", "1")),
+            max_age_hours=float(os.getenv("WATCHDOG_MAX_AGE_HOURS", "24")),
+            standby=os.getenv("WATCHDOG_STANDBY", "true").lower() == "true"
+        )
+    
+    def __getattr__(self, name):
+        # Delega allo scraper tutto ciò che il watchdog non ridefinisce (price_feed, symbol, ...)
+        if name == "scraper":
+            raise AttributeError(name)
+        return getattr(self.scraper, name)
+    
+    def _launch(self):
+        """
+        Avvia un browser e ne identifica il processo principale
+        
+        Returns:
+            Tupla (browser, pid) con pid None se non identificabile
+        """
+        before = chromium_root_pids()
+        browser = launch_chromium(self.scraper.playwright)
+        return browser, _started_pid(before)
+    
+    def _ensure_started(self):
+        """Avvia il browser dello scraper se non ancora presente (lo standby parte in idle)"""
+        if self.scraper.browser is None:
+            before = chromium_root_pids()
+            self.scraper._init_browser()
+            self.browser_pid = _started_pid(before)
+            self.browser_started_at = time.monotonic()
+            self.crashes_at_start = self.scraper.crash_count
+            self.standby_pending = self.standby_enabled and self.standby_browser is None
+    
+    def idle(self):
+        """
+        Avvia il browser di riserva se manca (da chiamare tra un ciclo e l'altro)
+        
+        L'avvio richiede qualche secondo: farlo qui lo tiene fuori dal percorso
+        critico della cattura.
+        """
+        if not self.standby_pending or self.scraper.playwright is None:
+            return
+        self.standby_pending = False
+        try:
+            self.standby_browser, self.standby_pid = self._launch()
+            print(f"    🛟 Browser di riserva pronto")
+        except Exception as e:
+            print(f"    ⚠️  Browser di riserva non avviato: {e}")
+            self.standby_browser = None
+            self.standby_pid = None
+    
+    def pump_events(self, seconds):
+        """Come TradingViewScraper.pump_events, avviando prima lo standby se manca"""
+        self.idle()
+        return self.scraper.pump_events(seconds)
+    
+    def _active_rss_bytes(self):
+        """RSS del solo browser attivo (escluso lo standby)"""
+        if self.browser_pid is not None and os.path.exists(f"/proc/{self.browser_pid}"):
+            return chromium_rss_bytes(self.browser_pid)
+        exclude = {self.standby_pid} if self.standby_pid is not None else ()
+        return chromium_rss_bytes(exclude=exclude)
+    
+    def _recycle_reason(self):
+        """
+        Verifica le soglie di riciclo
+        
+        Returns:
+            Motivo del riciclo o None se il browser è in salute
+        """
+        browser = self.scraper.browser
+        if browser is None:
+            return None
+        if not browser.is_connected():
+            return "browser disconnesso"
+        
+        crashes = self.scraper.crash_count - self.crashes_at_start
+        if self.max_crashes and crashes >= self.max_crashes:
+            return f"{crashes} crash di pagina"
+        
+        self.last_rss_mb = self._active_rss_bytes() / 1024 / 1024
+        self.peak_rss_mb = max(self.peak_rss_mb, self.last_rss_mb)
+        if self.max_rss_mb and self.last_rss_mb > self.max_rss_mb:
+            return f"RSS {self.last_rss_mb:.0f} MB > {self.max_rss_mb} MB"
+        
+        age_hours = (time.monotonic() - self.browser_started_at) / 3600 if self.browser_started_at else 0
+        if self.max_age_hours and age_hours > self.max_age_hours:
+            return f"età {age_hours:.1f} h > {self.max_age_hours} h"
+        
+        return None
+    
+    def recycle(self, reason):
+        """
+        Sostituisce il browser dello scraper con lo standby e prepara un nuovo standby
+        
+        Args:
+            reason: Motivo del riciclo (per log e stato)
+        """
+        print(f"♻️  Riciclo browser: {reason}")
+        
+        if self.standby_browser is not None and self.standby_browser.is_connected():
+            new_browser, new_pid = self.standby_browser, self.standby_pid
+        else:
+            new_browser, new_pid = self._launch()
+        self.standby_browser = None
+        self.standby_pid = None
+        
+        self.scraper.replace_browser(new_browser)
+        self.browser_pid = new_pid
+        self.browser_started_at = time.monotonic()
+        self.crashes_at_start = self.scraper.crash_count
+        self.restart_count += 1
+        self.last_restart = datetime.now().isoformat()
+        self.last_restart_reason = reason
+        
+        # Il nuovo standby parte in idle(), fuori dal ciclo in corso
+        self.standby_pending = self.standby_enabled
+        
+        print(f"   ✅ Browser riciclato (riavvii totali: {self.restart_count})")
+    
+    def check(self):
+        """Controlla le soglie e ricicla il browser se necessario"""
+        reason = self._recycle_reason()
+        if reason:
+            self.recycle(reason)
+    
+    def capture_all_timeframes(self, output_dir="screenshots"):
+        """
+        Cattura tramite lo scraper sorvegliato, controllando la salute prima e dopo
+        
+        Args:
+            output_dir: Directory dove salvare gli screenshot
+        
+        Returns:
+            Tupla (screenshots_dict, current_price) come TradingViewScraper
+        """
+        self._ensure_started()
+        self.check()
+        result = self.scraper.capture_all_timeframes(output_dir=output_dir)
+        self.check()
+        return result
+    
+    def stats(self):
+        """
+        Stato del watchdog (per /api/status)
+        
+        Returns:
+            Dizionario con riavvii, RSS, crash e stato dello standby
+        """
+        return {
+            "restarts": self.restart_count,
+            "last_restart": self.last_restart,
+            "last_restart_reason": self.last_restart_reason,
+            "rss_mb": round(self.last_rss_mb, 1),
+            "peak_rss_mb": round(self.peak_rss_mb, 1),
+            "max_rss_mb": self.max_rss_mb,
+            "page_crashes": self.scraper.crash_count,
+            "standby_ready": self.standby_browser is not None,
+        }
+    
+    def close(self):
+        """Chiude standby, browser e Playwright"""
+        if self.standby_browser is not None:
+            try:
+                self.standby_browser.close()
+            except Exception:
+                pass
+            self.standby_browser = None
+        self.standby_pid = None
+        self.standby_pending = False
+        self.scraper.close()
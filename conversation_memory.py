@@ -0,0 +1,134 @@
+"""
+Memoria compatta delle analisi precedenti
+
+Invece di rimandare all'API i messaggi completi (con gli screenshot in base64),
+ogni turno viene ridotto a testo: orario, simbolo, timeframe analizzati, prezzo
+e segnale con una spiegazione accorciata. La memoria ha un budget di token e un
+numero massimo di turni per simbolo, quindi la dimensione della richiesta resta
+costante per quanto a lungo giri il bot e un simbolo non scalza lo storico degli altri.
+"""
+import itertools
+import json
+import threading
+from collections import deque
+from datetime import datetime
+
+
+# Stima grossolana: ~4 caratteri per token per testo misto italiano/JSON
+CHARS_PER_TOKEN = 4
+
+
+class ConversationMemory:
+    """Storico compatto dei segnali, condivisibile tra cicli e simboli"""
+    
+    def __init__(self, max_tokens=1000, max_turns=20, summary_chars=240):
+        """
+        Inizializza la memoria
+        
+        Args:
+            max_tokens: Budget di token dello storico inviato a ogni richiesta (0 = nessuno storico)
+            max_turns: Numero massimo di turni conservati per simbolo
+            summary_chars: Lunghezza massima della spiegazione conservata per ogni segnale
+        """
+        self.max_tokens = max_tokens
+        self.max_turns = max_turns
+        self.summary_chars = summary_chars
+        # Turni per simbolo {symbol: deque}, ognuno con il proprio limite
+        self._turns = {}
+        # Ordine globale di registrazione, per unire lo storico di più simboli
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+    
+    def record(self, symbol, price, signal, timestamp=None, timeframes=None):
+        """
+        Registra il segnale di un'analisi
+        
+        Args:
+            symbol: Simbolo analizzato
+            price: Prezzo al momento dell'analisi (può essere None)
+            signal: Segnale restituito dal modello
+            timestamp: Istante dell'analisi (default: ora)
+            timeframes: Timeframe dei grafici analizzati (es. ["1min", "15min", "60min"])
+        """
+        summary = str(signal.get("spiegazione", ""))
+        if len(summary) > self.summary_chars:
+            summary = summary[:self.summary_chars - 1].rstrip() + "…"
+        
+        turn = {
+            "time": (timestamp or datetime.now()).strftime("%Y-%m-%d %H:%M"),
+            "symbol": symbol,
+            "timeframes": list(timeframes or []),
+            "price": price,
+            "signal": {
+                "operazione": signal.get("operazione"),
+                "lotto": signal.get("lotto"),
+                "stop_loss": signal.get("stop_loss"),
+                "take_profit": signal.get("take_profit"),
+                "spiegazione": summary,
+            },
+        }
+        with self._lock:
+            turn["seq"] = next(self._seq)
+            if symbol not in self._turns:
+                self._turns[symbol] = deque(maxlen=self.max_turns)
+            self._turns[symbol].append(turn)
+    
+    def _turn_messages(self, turn):
+        """Coppia di messaggi (utente, assistente) che rappresenta un turno"""
+        price = f"{turn['price']:.2f}" if turn["price"] is not None else "n/d"
+        charts = f"grafici {'/'.join(turn['timeframes'])}, " if turn["timeframes"] else ""
+        return [
+            {
+                "role": "user",
+                "content": f"[{turn['time']}] Analisi {turn['symbol']}, prezzo {price} "
+                           f"({charts}immagini omesse)"
+            },
+            {
+                "role": "assistant",
+                "content": json.dumps(turn["signal"], ensure_ascii=False)
+            },
+        ]
+    
+    def messages(self, symbol=None):
+        """
+        Messaggi dello storico entro il budget di token, dal più vecchio al più recente
+        
+        Args:
+            symbol: Limita lo storico a un simbolo (None = tutti)
+        
+        Returns:
+            Lista di messaggi chat (solo testo)
+        """
+        if not self.max_tokens:
+            return []
+        
+        with self._lock:
+            if symbol is not None:
+                turns = list(self._turns.get(symbol, ()))
+            else:
+                turns = sorted((turn for turns in self._turns.values() for turn in turns),
+                               key=lambda turn: turn["seq"])
+        
+        selected = []
+        budget = self.max_tokens * CHARS_PER_TOKEN
+        for turn in reversed(turns):
+            pair = self._turn_messages(turn)
+            size = sum(len(message["content"]) for message in pair)
+            if size > budget:
+                break
+            budget -= size
+            selected[:0] = pair
+        return selected
+    
+    def estimated_tokens(self, symbol=None):
+        """Token stimati dello storico che verrebbe inviato"""
+        return sum(len(message["content"]) for message in self.messages(symbol)) // CHARS_PER_TOKEN
+    
+    def clear(self):
+        """Svuota la memoria"""
+        with self._lock:
+            self._turns.clear()
+    
+    def __len__(self):
+        with self._lock:
+            return sum(len(turns) for turns in self._turns.values())
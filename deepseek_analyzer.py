@@ -2,63 +2,34 @@
 """
 DeepSeek Analyzer - Analisi grafici tramite Fireworks AI (Qwen3-VL 235B Instruct)
 """
-import base64
 import json
 import os
+import threading
 import time
-import urllib.request
-import urllib.error
-from typing import Dict, Optional
-
-
-class DeepSeekAnalyzer:
-    """Analizzatore di grafici CFD tramite Fireworks AI"""
-    
-    def __init__(self, api_key: str):
-        """
-        Inizializza l'analizzatore
-        
-        Args:
-            api_key: Chiave API Fireworks AI
-        """
-        self.api_key = api_key
-        self.api_url = "https://api.fireworks.ai/inference/v1/chat/completions"
-        self.conversation_history = []
-    
-    def _encode_image(self, image_path: str) -> str:
-        """
-        Codifica un'immagine in base64
-        
-        Args:
-            image_path: Percorso dell'immagine
-            
-        Returns:
-            Stringa base64 dell'immagine
-        """
-        with open(image_path, "rb") as image_file:
-            return base64.b64encode(image_file.read()).decode('utf-8')
-    
-    def _create_analysis_prompt(self) -> str:
-        """
-        Carica il prompt per l'analisi dei grafici dal file prompt.txt
-        
-        Returns:
-            Prompt formattato
-        """
-        # Percorso del file prompt (nella stessa directory dello script)
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        prompt_file = os.path.join(script_dir, "prompt.txt")
-        
-        # Leggi il prompt dal file
-        try:
-            with open(prompt_file, "r", encoding="utf-8") as f:
-                prompt = f.read()
-            return prompt
-        except FileNotFoundError:
-            print(f"⚠️  File prompt.txt non trovato in {script_dir}")
-            print("   Uso prompt di default...")
-            # Fallback al prompt di default se il file non esiste
-            prompt = """Sei un trader professionista esperto di scalping su XAUUSD (Gold).
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List, Optional
+
+from http_transport import HttpTransport, HttpError
+from json_stream import JsonObjectScanner
+from conversation_memory import ConversationMemory, CHARS_PER_TOKEN
+from prompt_cache import PromptCache
+from request_body import Base64File, RequestBody
+from llm_backends import Backend, parse_backends, DISPATCH_MODES
+from price_feed import PRICE_FEED_MAX_AGE
+from resilience import DeadlineExceeded, RetryPolicy, retry_after_seconds
+from rate_limiter import RateLimiter, shared_limiter, IMAGE_TOKENS
+from response_cache import ResponseCache
+
+
+# Campi obbligatori del segnale restituito dal modello
+REQUIRED_FIELDS = ("operazione", "lotto", "stop_loss", "take_profit", "spiegazione")
+
+MODEL = "accounts/fireworks/models/qwen3-vl-235b-a22b-instruct"
+
+# Prompt di default se prompt.txt non esiste (scritto per XAUUSD: per altri simboli
+# conviene fornire prompt_<SIMBOLO>.txt)
+DEFAULT_PROMPT = """Sei un trader professionista esperto di scalping su XAUUSD (Gold).
 Analizza i tre grafici forniti (1 minuto, 15 minuti, 1 ora) e genera un segnale di trading PROFITTEVOLE.
 
 📊 FASE 1 - ANALISI TECNICA MULTI-TIMEFRAME:
@@ -208,217 +179,640 @@ La risposta DEVE iniziare con { e finire con }
 → CORREGGI i valori fino a superare TUTTE le validazioni
 
 Rispondi SOLO con il JSON, niente altro."""
-            return prompt
+
+
+def timeframe_minutes(name: str) -> float:
+    """Minuti di un timeframe nel formato <N>min (gli altri nomi vanno in coda)"""
+    if name.endswith("min") and name[:-3].isdigit():
+        return int(name[:-3])
+    return float("inf")
+
+
+class PreparedAnalysis:
+    """Analisi pronta per l'invio: prezzo, prompt, sorgenti delle immagini ed eventuale segnale in cache"""
+    
+    def __init__(self, symbol: str, current_price: Optional[float]):
+        self.symbol = symbol
+        self.current_price = current_price
+        self.timeframes = []
+        self.fingerprint = None
+        self.cached_signal = None
+        self.prompt_json = None
+        self.price_line = ""
+        self.images = []
+
+
+class DeepSeekAnalyzer:
+    """Analizzatore di grafici CFD tramite Fireworks AI"""
     
-    def analyze_charts(self, screenshots: Dict[str, str], current_price: Optional[float] = None, account_size: float = 1000.0, symbol: str = "XAUUSD") -> Optional[Dict]:
+    def __init__(self, api_key: str, price_feed=None, transport: Optional[HttpTransport] = None,
+                 stream: Optional[bool] = None, memory: Optional[ConversationMemory] = None,
+                 response_cache: Optional[ResponseCache] = None, backends: Optional[List[Backend]] = None,
+                 dispatch: Optional[str] = None, hedge_after: Optional[float] = None,
+                 retry_policy: Optional[RetryPolicy] = None, limiter: Optional[RateLimiter] = None):
         """
-        Analizza i grafici e restituisce un segnale di trading
+        Inizializza l'analizzatore
+        
+        Pensato per essere creato una volta e riutilizzato tra cicli e simboli:
+        il trasporto mantiene aperte le connessioni verso l'API.
         
         Args:
-            screenshots: Dizionario con i percorsi degli screenshot {timeframe: path}
-            current_price: Prezzo corrente del simbolo (opzionale)
-            account_size: Dimensione del conto in USD
-            symbol: Simbolo del CFD (es. XAUUSD)
-            
+            api_key: Chiave API Fireworks AI
+            price_feed: PriceFeed da cui leggere il prezzo se non fornito (opzionale)
+            transport: HttpTransport keep-alive (default: da variabili d'ambiente LLM_*)
+            stream: Riceve la risposta in streaming e la interrompe appena il JSON del
+                    segnale è completo (default: variabile d'ambiente LLM_STREAM, true)
+            memory: ConversationMemory con lo storico compatto dei segnali (default: budget
+                    da variabile d'ambiente LLM_MEMORY_TOKENS, 1000)
+            response_cache: ResponseCache che riusa il segnale se i grafici non sono cambiati
+                            (default: da variabili d'ambiente LLM_CACHE_*)
+            backends: Coppie modello/endpoint in ordine di priorità (default: variabile
+                      d'ambiente LLM_BACKENDS, altrimenti solo Qwen3-VL 235B su Fireworks AI)
+            dispatch: Con più backend: "hedge" avvia il successivo solo se il precedente non
+                      risponde entro hedge_after secondi, "parallel" li interroga tutti
+                      (default: variabile d'ambiente LLM_DISPATCH, hedge)
+            hedge_after: Secondi di attesa prima di avviare il backend successivo
+                         (default: variabile d'ambiente LLM_HEDGE_AFTER, 10)
+            retry_policy: RetryPolicy per i tentativi sugli errori transitori (default: da
+                          variabili d'ambiente LLM_MAX_ATTEMPTS, LLM_RETRY_*)
+            limiter: RateLimiter RPM/TPM con concorrenza adattiva (default: quello condiviso
+                     dal processo, da variabili d'ambiente LLM_RPM, LLM_TPM, LLM_MAX_CONCURRENCY)
+        """
+        self.api_key = api_key
+        self.price_feed = price_feed
+        self.transport = transport or HttpTransport.from_env()
+        if stream is None:
+            stream = os.getenv("LLM_STREAM", "true").lower() == "true"
+        self.stream = stream
+        self.memory = memory or ConversationMemory(max_tokens=int(os.getenv("LLM_MEMORY_TOKENS", "1000")))
+        self.response_cache = response_cache or ResponseCache.from_env()
+        
+        # Prompt letti una volta (nella stessa directory dello script); ogni backend ha il
+        # proprio corpo della richiesta pre-serializzato
+        self.prompts = PromptCache(os.path.dirname(os.path.abspath(__file__)), fallback=DEFAULT_PROMPT)
+        if backends is None:
+            backends = parse_backends(os.getenv("LLM_BACKENDS", ""), api_key, stream=self.stream)
+        self.backends = backends or [Backend(MODEL, api_key=api_key, stream=self.stream)]
+        
+        self.dispatch = dispatch or os.getenv("LLM_DISPATCH", "hedge")
+        if self.dispatch not in DISPATCH_MODES:
+            raise ValueError(f"Modalità di dispatch non valida: {self.dispatch} (valide: {', '.join(DISPATCH_MODES)})")
+        self.hedge_after = hedge_after if hedge_after is not None else float(os.getenv("LLM_HEDGE_AFTER", "10"))
+        
+        # Tentativi limitati dalla scadenza: senza scadenza esplicita un'analisi dura al massimo LLM_DEADLINE secondi
+        self.retry = retry_policy or RetryPolicy.from_env()
+        self.deadline_budget = float(os.getenv("LLM_DEADLINE", "120"))
+        self.limiter = limiter or shared_limiter()
+        
+        # Le richieste perdenti restano in volo fino alla cancellazione: il doppio dei worker
+        # evita che ritardino l'analisi successiva
+        self._executor = None
+        if len(self.backends) > 1:
+            self._executor = ThreadPoolExecutor(max_workers=2 * len(self.backends), thread_name_prefix="llm")
+    
+    def _image_mime_type(self, image_path: str) -> str:
+        """
+        Determina il MIME type dell'immagine dall'estensione del file
+        
+        Args:
+            image_path: Percorso dell'immagine
+        
         Returns:
-            Dizionario con il segnale di trading o None se errore
+            MIME type (es. image/jpeg)
         """
-        try:
-            # Prepara il contenuto del messaggio - FORMATO OPENAI COMPATIBILE
-            prompt_text = self._create_analysis_prompt()
-            
-            # Aggiungi prezzo corrente se disponibile
-            if current_price is not None:
-                price_line = f"\n\nUltimo valore conosciuto di {symbol}: {current_price:.2f}\n"
-                prompt_text += price_line
-                print(f"   ✅ Prezzo accodato al prompt: {price_line.strip()}")
-            
-            content = [
-                {
-                    "type": "text",
-                    "text": prompt_text
-                }
-            ]
-            
-            # Aggiungi le immagini nel FORMATO OPENAI (image_url)
-            for timeframe in ["1min", "15min", "60min"]:
-                if timeframe in screenshots and screenshots[timeframe]:
-                    image_base64 = self._encode_image(screenshots[timeframe])
-                    content.append({
-                        "type": "image_url",  # FORMATO CORRETTO
-                        "image_url": {
-                            "url": f"data:image/jpeg;base64,{image_base64}"
-                        }
-                    })
-            
-            if len(content) == 1:  # Solo testo, nessuna immagine
-                print("Nessuna immagine disponibile per l'analisi")
-                return None
-            
-            # Crea il messaggio con le immagini
-            user_message = {
-                "role": "user",
-                "content": content
-            }
-            
-            # Aggiungi alla cronologia
-            self.conversation_history.append(user_message)
-            
-            # Prepara la richiesta API con urllib
-            payload = json.dumps({
-                "model": "accounts/fireworks/models/qwen3-vl-235b-a22b-instruct",
-                "messages": self.conversation_history,
-                "temperature": 0.7,
-                "max_tokens": 2000,
-                "stream": False
-            }).encode('utf-8')
-            
-            # Crea la richiesta
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {self.api_key}'
-            }
+        extension = os.path.splitext(image_path)[1].lower()
+        return {
+            ".jpg": "image/jpeg",
+            ".jpeg": "image/jpeg",
+            ".webp": "image/webp",
+        }.get(extension, "image/png")
+    
+    def _create_analysis_prompt(self, symbol: Optional[str] = None) -> str:
+        """
+        Carica il prompt per l'analisi dei grafici (prompt_<SIMBOLO>.txt o prompt.txt)
+        
+        Il file viene letto una sola volta e riletto solo quando cambia l'mtime.
+        
+        Args:
+            symbol: Simbolo per cui cercare una variante del prompt
+        
+        Returns:
+            Prompt formattato
+        """
+        return self.prompts.get(symbol)
+    
+    def _complete_streaming(self, backend: Backend, payload: RequestBody, deadline: float,
+                            cancel: Optional[threading.Event] = None) -> Optional[str]:
+        """
+        Riceve la risposta come server-sent events e si ferma al primo JSON valido
+        
+        Args:
+            backend: Backend da interrogare
+            payload: Corpo della richiesta (con "stream": true)
+            deadline: Istante (time.monotonic) oltre il quale lo stream viene abbandonato
+            cancel: Evento che interrompe lo stream (un altro backend ha già risposto)
+        
+        Returns:
+            Testo della risposta fino alla fine dell'oggetto JSON (o completo se non trovato),
+            None se interrotto
+        """
+        scanner = JsonObjectScanner(REQUIRED_FIELDS)
+        start = time.monotonic()
+        first_token = None
+        
+        lines = self.transport.stream_lines(backend.url, payload, backend.headers, timeout=deadline - start)
+        # closing(): uscendo prima della fine il trasporto recupera subito la connessione
+        with closing(lines):
+            for line in lines:
+                if cancel is not None and cancel.is_set():
+                    return None
+                if time.monotonic() > deadline:
+                    raise DeadlineExceeded(f"risposta incompleta alla scadenza del ciclo ({len(scanner.text)} caratteri)")
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                
+                try:
+                    choice = json.loads(data)["choices"][0]
+                except (ValueError, KeyError, IndexError):
+                    continue
+                delta = (choice.get("delta") or {}).get("content") or ""
+                if not delta:
+                    continue
+                
+                if first_token is None:
+                    first_token = time.monotonic() - start
+                    print(f"   ⏱️  [{backend.name}] Primo token dopo {first_token:.2f}s")
+                
+                if scanner.feed(delta) is not None:
+                    # Il segnale è completo: si smette di leggere (il resto non serve al segnale)
+                    print(f"   ⏱️  [{backend.name}] Segnale completo dopo {time.monotonic() - start:.2f}s "
+                          f"({len(scanner.text)} caratteri, stream interrotto)")
+                    return scanner.text[:scanner.result_end]
             
-            req = urllib.request.Request(
-                self.api_url,
-                data=payload,
-                headers=headers,
-                method='POST'
-            )
+        print(f"   ⏱️  [{backend.name}] Risposta completa dopo {time.monotonic() - start:.2f}s")
+        return scanner.text
+    
+    def _request(self, backend: Backend, payload: RequestBody, deadline: float,
+                 cancel: Optional[threading.Event] = None, tokens: int = 0) -> Optional[str]:
+        """
+        Invia la richiesta a un backend con retry entro la scadenza
+        
+        Si riprova solo sugli errori transitori (rete, timeout, 408/429/5xx), rispettando
+        Retry-After, e solo se l'attesa termina prima della scadenza. Ogni errore
+        dell'API viene contato dal circuit breaker del backend, la scadenza del ciclo
+        (DeadlineExceeded) no. Ogni tentativo passa dal limitatore di richieste
+        condiviso del processo.
+        
+        Args:
+            backend: Backend da interrogare
+            payload: Corpo della richiesta
+            deadline: Istante (time.monotonic) oltre il quale non si attende più
+            cancel: Evento che interrompe attese e stream
+            tokens: Token stimati della richiesta (per il limite TPM)
+        
+        Returns:
+            Testo della risposta del modello, None se interrotto
+        """
+        max_attempts = self.retry.max_attempts
+        
+        for attempt in range(1, max_attempts + 1):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise DeadlineExceeded("scadenza del ciclo raggiunta")
             
-            # Chiamata API con retry automatico
-            max_retries = 3
-            retry_delay = 2  # secondi
+            # Slot del limitatore RPM/TPM e della concorrenza adattiva, condiviso da tutti gli analizzatori
+            if not self.limiter.acquire(tokens, deadline):
+                backend.breaker.release()
+                raise DeadlineExceeded("nessuno slot del limitatore di richieste prima della scadenza")
             
-            for attempt in range(max_retries):
+            try:
+                if attempt > 1:
+                    print(f"[{backend.name}] Tentativo {attempt}/{max_attempts}...")
+                else:
+                    print(f"Invio richiesta a {backend.name}...")
+                
+                # Connessione keep-alive del pool: l'handshake TLS si paga solo alla prima richiesta
                 try:
-                    if attempt > 0:
-                        print(f"Tentativo {attempt + 1}/{max_retries}...")
-                    else:
-                        print("Invio richiesta a Fireworks AI (Qwen3-VL 235B)...")
-                    
-                    with urllib.request.urlopen(req, timeout=60) as response:
-                        response_data = json.loads(response.read().decode('utf-8'))
-                    
-                    assistant_message = response_data["choices"][0]["message"]["content"]
-                    break  # Successo, esci dal loop
-                    
-                except urllib.error.HTTPError as e:
-                    if e.code == 503 and attempt < max_retries - 1:
-                        # Service Unavailable - riprova
-                        wait_time = retry_delay * (2 ** attempt)  # backoff esponenziale
-                        print(f"⚠️  Servizio temporaneamente non disponibile (503)")
-                        print(f"   Riprovo tra {wait_time} secondi...")
-                        time.sleep(wait_time)
+                    if self.stream:
+                        assistant_message = self._complete_streaming(backend, payload, deadline, cancel)
                     else:
-                        # Altro errore HTTP o ultimo tentativo fallito
-                        raise
-                except Exception as e:
-                    if attempt < max_retries - 1:
-                        wait_time = retry_delay * (2 ** attempt)
-                        print(f"⚠️  Errore: {e}")
-                        print(f"   Riprovo tra {wait_time} secondi...")
-                        time.sleep(wait_time)
-                    else:
-                        raise
-            
-            # Aggiungi risposta alla cronologia
-            self.conversation_history.append({
-                "role": "assistant",
-                "content": assistant_message
-            })
-            
-            # Mantieni solo gli ultimi 10 messaggi
-            if len(self.conversation_history) > 10:
-                self.conversation_history = self.conversation_history[-10:]
+                        response_data = json.loads(self.transport.post(backend.url, payload, backend.headers,
+                                                                       timeout=deadline - time.monotonic()).decode('utf-8'))
+                        assistant_message = response_data["choices"][0]["message"]["content"]
+                finally:
+                    self.limiter.release()
+                if assistant_message is None:
+                    backend.breaker.release()
+                else:
+                    backend.breaker.record_success()
+                    self.limiter.on_success()
+                return assistant_message
             
-            # Parse JSON dalla risposta - gestione robusta
-            json_text = assistant_message.strip()
-            
-            # Rimuovi eventuali markdown code blocks
-            if "```json" in json_text:
-                json_text = json_text.split("```json")[1].split("```")[0]
-            elif "```" in json_text:
-                json_text = json_text.split("```")[1].split("```")[0]
-            
-            # Cerca il JSON nella risposta (trova { e } più esterni)
-            start_idx = json_text.find('{')
-            end_idx = json_text.rfind('}')
-            
-            if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
-                json_text = json_text[start_idx:end_idx+1]
-            
-            json_text = json_text.strip()
-            
-            # Debug: mostra il JSON estratto
-            print(f"JSON estratto per parsing: {json_text[:200]}...")
-            
-            signal = json.loads(json_text)
-            
-            # Valida i campi richiesti
-            required_fields = ["operazione", "lotto", "stop_loss", "take_profit", "spiegazione"]
-            for field in required_fields:
-                if field not in signal:
-                    print(f"Campo mancante nella risposta: {field}")
+            except Exception as e:
+                if cancel is not None and cancel.is_set():
+                    backend.breaker.release()
                     return None
-            
-            # VALIDAZIONE AGGIUNTIVA: controlla logica SL/TP
-            if current_price:
-                op = signal["operazione"].upper()
-                sl = float(signal["stop_loss"])
-                tp = float(signal["take_profit"])
-                
-                print(f"\n🔍 Validazione segnale:")
-                print(f"   Operazione: {op}")
-                print(f"   Prezzo corrente: {current_price:.2f}")
-                print(f"   Stop Loss: {sl:.2f}")
-                print(f"   Take Profit: {tp:.2f}")
-                
-                # Validazione logica BUY
-                if op == "BUY":
-                    if sl >= current_price:
-                        print(f"   ❌ ERRORE: BUY con SL >= prezzo corrente (SL deve essere SOTTO)")
-                        return None
-                    if tp <= current_price:
-                        print(f"   ❌ ERRORE: BUY con TP <= prezzo corrente (TP deve essere SOPRA)")
-                        return None
-                
-                # Validazione logica SELL
-                elif op == "SELL":
-                    if sl <= current_price:
-                        print(f"   ❌ ERRORE: SELL con SL <= prezzo corrente (SL deve essere SOPRA)")
-                        return None
-                    if tp >= current_price:
-                        print(f"   ❌ ERRORE: SELL con TP >= prezzo corrente (TP deve essere SOTTO)")
-                        return None
-                
-                # Calcola R/R ratio
-                sl_distance = abs(current_price - sl)
-                tp_distance = abs(tp - current_price)
-                rr_ratio = tp_distance / sl_distance if sl_distance > 0 else 0
-                
-                print(f"   SL distance: {sl_distance:.2f} pips")
-                print(f"   TP distance: {tp_distance:.2f} pips")
-                print(f"   R/R ratio: 1:{rr_ratio:.2f}")
+                if isinstance(e, DeadlineExceeded):
+                    backend.breaker.release()
+                    raise
+                if time.monotonic() >= deadline and not isinstance(e, HttpError) and self.retry.retryable(e):
+                    # Timeout ridotto al tempo rimasto nel ciclo: è la scadenza, non un guasto del backend
+                    backend.breaker.release()
+                    raise DeadlineExceeded(f"scadenza del ciclo raggiunta durante la richiesta ({e})") from e
+                if isinstance(e, HttpError) and e.code == 429:
+                    self.limiter.on_throttle(retry_after_seconds(e.headers))
+                if not self.retry.retryable(e):
+                    # Errore non transitorio (es. 400/401, risposta malformata): inutile riprovare
+                    backend.breaker.release()
+                    raise
+                backend.breaker.record_failure()
                 
-                if rr_ratio < 1.5:
-                    print(f"   ⚠️ WARNING: R/R ratio < 1:1.5 (non ottimale)")
+                if attempt >= max_attempts:
+                    raise
+                wait_time = self.retry.delay(attempt, e)
+                if time.monotonic() + wait_time >= deadline:
+                    print(f"⚠️  [{backend.name}] {e}")
+                    print(f"   Nessun altro tentativo: l'attesa di {wait_time:.0f}s supera la scadenza del ciclo")
+                    raise
+                if not backend.breaker.allow():
+                    print(f"⚠️  [{backend.name}] {e}")
+                    print(f"   Nessun altro tentativo: circuito aperto")
+                    raise
                 
-                print(f"   ✅ Validazione superata")
-            
-            return signal
+                if isinstance(e, HttpError) and e.code in (429, 503):
+                    print(f"⚠️  [{backend.name}] Servizio temporaneamente non disponibile ({e.code})")
+                else:
+                    print(f"⚠️  [{backend.name}] Errore: {e}")
+                print(f"   Riprovo tra {wait_time:.1f} secondi...")
             
+            if cancel is None:
+                time.sleep(wait_time)
+            elif cancel.wait(wait_time):
+                backend.breaker.release()
+                return None
+    
+    def _parse_signal(self, assistant_message: str) -> Optional[Dict]:
+        """
+        Estrae il segnale JSON dalla risposta del modello
+        
+        Args:
+            assistant_message: Testo della risposta
+        
+        Returns:
+            Segnale con tutti i campi richiesti o None
+        """
+        # Parse JSON dalla risposta - gestione robusta
+        json_text = assistant_message.strip()
+        
+        # Rimuovi eventuali markdown code blocks
+        if "```json" in json_text:
+            json_text = json_text.split("```json")[1].split("```")[0]
+        elif "```" in json_text:
+            json_text = json_text.split("```")[1].split("```")[0]
+        
+        # Cerca il JSON nella risposta (trova { e } più esterni)
+        start_idx = json_text.find('{')
+        end_idx = json_text.rfind('}')
+        
+        if start_idx != -1 and end_idx != -1 and end_idx > start_idx:
+            json_text = json_text[start_idx:end_idx+1]
+        
+        json_text = json_text.strip()
+        
+        # Debug: mostra il JSON estratto
+        print(f"JSON estratto per parsing: {json_text[:200]}...")
+        
+        try:
+            signal = json.loads(json_text)
         except json.JSONDecodeError as e:
             print(f"Errore nel parsing JSON: {e}")
             print(f"Risposta ricevuta: {assistant_message}")
             return None
+        
+        # Valida i campi richiesti
+        for field in REQUIRED_FIELDS:
+            if field not in signal:
+                print(f"Campo mancante nella risposta: {field}")
+                return None
+        return signal
+    
+    def _validate_signal(self, signal: Dict, current_price: Optional[float]) -> bool:
+        """
+        Controlla la logica SL/TP del segnale rispetto al prezzo corrente
+        
+        Args:
+            signal: Segnale restituito dal modello
+            current_price: Prezzo corrente (senza prezzo il controllo viene saltato)
+        
+        Returns:
+            True se il segnale è coerente
+        """
+        if not current_price:
+            return True
+        
+        op = signal["operazione"].upper()
+        sl = float(signal["stop_loss"])
+        tp = float(signal["take_profit"])
+        
+        print(f"\n🔍 Validazione segnale:")
+        print(f"   Operazione: {op}")
+        print(f"   Prezzo corrente: {current_price:.2f}")
+        print(f"   Stop Loss: {sl:.2f}")
+        print(f"   Take Profit: {tp:.2f}")
+        
+        # Validazione logica BUY
+        if op == "BUY":
+            if sl >= current_price:
+                print(f"   ❌ ERRORE: BUY con SL >= prezzo corrente (SL deve essere SOTTO)")
+                return False
+            if tp <= current_price:
+                print(f"   ❌ ERRORE: BUY con TP <= prezzo corrente (TP deve essere SOPRA)")
+                return False
+        
+        # Validazione logica SELL
+        elif op == "SELL":
+            if sl <= current_price:
+                print(f"   ❌ ERRORE: SELL con SL <= prezzo corrente (SL deve essere SOPRA)")
+                return False
+            if tp >= current_price:
+                print(f"   ❌ ERRORE: SELL con TP >= prezzo corrente (TP deve essere SOTTO)")
+                return False
+        
+        # Calcola R/R ratio
+        sl_distance = abs(current_price - sl)
+        tp_distance = abs(tp - current_price)
+        rr_ratio = tp_distance / sl_distance if sl_distance > 0 else 0
+        
+        print(f"   SL distance: {sl_distance:.2f} pips")
+        print(f"   TP distance: {tp_distance:.2f} pips")
+        print(f"   R/R ratio: 1:{rr_ratio:.2f}")
+        
+        if rr_ratio < 1.5:
+            print(f"   ⚠️ WARNING: R/R ratio < 1:1.5 (non ottimale)")
+        
+        print(f"   ✅ Validazione superata")
+        return True
+    
+    def _run_backend(self, backend: Backend, payload: RequestBody, current_price: Optional[float], deadline: float,
+                     cancel: Optional[threading.Event] = None, tokens: int = 0) -> Optional[Dict]:
+        """
+        Interroga un backend e restituisce il suo segnale solo se supera la validazione
+        
+        Args:
+            backend: Backend da interrogare
+            payload: Corpo della richiesta per il backend
+            current_price: Prezzo corrente per la validazione SL/TP
+            deadline: Istante (time.monotonic) entro cui deve arrivare la risposta
+            cancel: Evento che interrompe la richiesta
+            tokens: Token stimati della richiesta
+        
+        Returns:
+            Segnale validato o None
+        """
+        start = time.monotonic()
+        try:
+            assistant_message = self._request(backend, payload, deadline, cancel, tokens)
+            if assistant_message is None:
+                backend.record_cancelled()
+                return None
+            
+            signal = self._parse_signal(assistant_message)
+            if signal is None or not self._validate_signal(signal, current_price):
+                backend.record_failure()
+                return None
+        except DeadlineExceeded as e:
+            # La scadenza del ciclo non è un errore del backend
+            print(f"   ⏰ [{backend.name}] {e}")
+            backend.record_cancelled()
+            return None
+        except Exception as e:
+            if cancel is not None and cancel.is_set():
+                backend.record_cancelled()
+            else:
+                print(f"❌ [{backend.name}] Errore durante l'analisi: {e}")
+                backend.record_failure()
+            return None
+        
+        backend.record(time.monotonic() - start)
+        return signal
+    
+    def _estimate_tokens(self, history, prompt_json: str, price_line: str, images) -> int:
+        """Token stimati dell'input di una richiesta (testo a caratteri, immagini a forfait)"""
+        chars = sum(len(message["content"]) for message in history) + len(prompt_json) + len(price_line)
+        return chars // CHARS_PER_TOKEN + len(images) * IMAGE_TOKENS
+    
+    def _dispatch(self, history, prompt_json: str, price_line: str, images,
+                  current_price: Optional[float], deadline: float) -> Optional[Dict]:
+        """
+        Invia l'analisi ai backend e restituisce il primo segnale valido
+        
+        In modalità hedge il backend successivo parte se il precedente non ha risposto
+        entro hedge_after secondi (o subito, se ha fallito); in modalità parallel
+        partono tutti insieme. Al primo segnale valido le altre richieste vengono
+        annullate: gli stream si chiudono, le richieste non in streaming vengono ignorate.
+        I backend con il circuito aperto vengono saltati e alla scadenza si rinuncia.
+        
+        Returns:
+            Segnale validato o None
+        """
+        tokens = self._estimate_tokens(history, prompt_json, price_line, images)
+        
+        if len(self.backends) == 1:
+            backend = self.backends[0]
+            if not backend.breaker.allow():
+                print(f"   ⛔ [{backend.name}] Circuito aperto: analisi saltata "
+                      f"(nuovo tentativo tra {backend.breaker.stats()['retry_in_s']}s)")
+                return None
+            payload = backend.template.build(history, prompt_json, price_line, images)
+            signal = self._run_backend(backend, payload, current_price, deadline, tokens=tokens)
+            if signal is not None:
+                backend.record_win()
+            return signal
+        
+        cancel = threading.Event()
+        pending = {}
+        queue = list(self.backends)
+        delay = self.hedge_after if self.dispatch == "hedge" else 0
+        next_start = time.monotonic()
+        
+        try:
+            while pending or queue:
+                # Avvia i backend il cui turno è arrivato (o tutti se nessuno è in volo)
+                while queue and (not pending or time.monotonic() >= next_start):
+                    backend = queue.pop(0)
+                    if not backend.breaker.allow():
+                        print(f"   ⛔ [{backend.name}] Circuito aperto: backend saltato")
+                        continue
+                    if pending and delay:
+                        print(f"   🔀 Nessuna risposta entro {delay:g}s: avvio anche {backend.name}")
+                    payload = backend.template.build(history, prompt_json, price_line, images)
+                    pending[self._executor.submit(self._run_backend, backend, payload, current_price,
+                                                  deadline, cancel, tokens)] = backend
+                    next_start = time.monotonic() + delay
+                if not pending:
+                    break
+                
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    print(f"   ⏰ Scadenza del ciclo raggiunta: annullo {', '.join(b.name for b in pending.values())}")
+                    return None
+                timeout = min(remaining, max(0.0, next_start - time.monotonic())) if queue else remaining
+                done, _ = wait(list(pending), timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    backend = pending.pop(future)
+                    signal = future.result()
+                    if signal is not None:
+                        backend.record_win()
+                        if pending:
+                            print(f"   🏁 Segnale da {backend.name}, annullo: "
+                                  f"{', '.join(b.name for b in pending.values())}")
+                        return signal
+            return None
+        finally:
+            cancel.set()
+    
+    def prepare(self, screenshots: Dict[str, str], current_price: Optional[float] = None,
+                symbol: str = "XAUUSD", prompt: Optional[str] = None,
+                broker: Optional[str] = None) -> Optional[PreparedAnalysis]:
+        """
+        Prima fase dell'analisi: prezzo, cache delle risposte, prompt e sorgenti delle immagini
+        
+        Non chiama l'API: nella pipeline gira in un thread separato dall'inferenza.
+        
+        Args:
+            screenshots: Dizionario con i percorsi degli screenshot {timeframe: path}
+            current_price: Prezzo corrente del simbolo (opzionale)
+            symbol: Simbolo del CFD (es. XAUUSD)
+            prompt: Variante del prompt (prompt_<NOME>.txt, default: quella del simbolo)
+            broker: Broker del simbolo, per leggere dal feed il prezzo della quotazione giusta
+        
+        Returns:
+            PreparedAnalysis o None se non ci sono immagini
+        """
+        # Prezzo dal feed websocket se non fornito dal chiamante (solo un tick recente dello stesso broker)
+        if current_price is None and self.price_feed is not None:
+            current_price = self.price_feed.price(symbol, max_age=PRICE_FEED_MAX_AGE, broker=broker)
+        prepared = PreparedAnalysis(symbol, current_price)
+        
+        # Timeframe dal più breve (1min, 15min, 60min o quelli configurati per il simbolo)
+        timeframes = sorted((tf for tf, path in screenshots.items() if path), key=timeframe_minutes)
+        prepared.timeframes = timeframes
+        
+        # Grafici quasi identici allo stesso livello di prezzo: si riusa l'ultimo segnale validato
+        # (senza prezzo né ricerca né registrazione: il segnale non sarebbe rivalidabile)
+        charts = {tf: screenshots[tf] for tf in timeframes}
+        use_cache = self.response_cache.enabled and charts and current_price is not None
+        prepared.fingerprint = self.response_cache.fingerprint(charts) if use_cache else None
+        # Il segnale in cache va rivalidato: SL/TP possono essere già dal lato sbagliato del prezzo attuale
+        prepared.cached_signal = self.response_cache.get(symbol, prepared.fingerprint, current_price,
+                                                         validate=self._validate_signal)
+        if prepared.cached_signal is not None:
+            return prepared
+        
+        # Prompt già serializzato (ricaricato solo se il file cambia) - FORMATO OPENAI COMPATIBILE
+        prepared.prompt_json = self.prompts.get_serialized(prompt or symbol)
+        
+        # Aggiungi prezzo corrente se disponibile
+        if current_price is not None:
+            prepared.price_line = f"\n\nUltimo valore conosciuto di {symbol}: {current_price:.2f}\n"
+            print(f"   ✅ Prezzo accodato al prompt: {prepared.price_line.strip()}")
+        
+        # Immagini nel FORMATO OPENAI (image_url), codificate in base64 a blocchi durante l'invio
+        for timeframe in timeframes:
+            prepared.images.append(Base64File(screenshots[timeframe], self._image_mime_type(screenshots[timeframe])))
+        
+        if not prepared.images:  # Solo testo, nessuna immagine
+            print("Nessuna immagine disponibile per l'analisi")
+            return None
+        return prepared
+    
+    def infer(self, prepared: PreparedAnalysis, deadline: Optional[float] = None) -> Optional[Dict]:
+        """
+        Seconda fase dell'analisi: richiesta ai backend, validazione e registrazione del segnale
+        
+        Args:
+            prepared: Risultato di prepare()
+            deadline: Istante (time.monotonic) entro cui serve il segnale
+                      (default: ora + LLM_DEADLINE secondi)
+        
+        Returns:
+            Segnale validato o None
+        """
+        if prepared.cached_signal is not None:
+            return prepared.cached_signal
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline_budget
+        symbol = prepared.symbol
+        
+        # Storico compatto (solo testo) letto ora, così include le analisi concluse nel frattempo
+        history = self.memory.messages(symbol)
+        if history:
+            print(f"   🧠 Storico: {len(history) // 2} analisi precedenti (~{self.memory.estimated_tokens(symbol)} token)")
+        
+        # Parti statiche già serializzate per ogni backend, si accodano storico, prezzo e immagini
+        signal = self._dispatch(history, prepared.prompt_json, prepared.price_line, prepared.images,
+                                prepared.current_price, deadline)
+        if signal is None:
+            return None
+        
+        # In memoria resta solo il segnale in forma compatta, senza immagini
+        self.memory.record(symbol, prepared.current_price, signal, timeframes=prepared.timeframes)
+        self.response_cache.put(symbol, prepared.fingerprint, prepared.current_price, signal)
+        
+        return signal
+    
+    def analyze_charts(self, screenshots: Dict[str, str], current_price: Optional[float] = None, account_size: float = 1000.0, symbol: str = "XAUUSD",
+                       deadline: Optional[float] = None, prompt: Optional[str] = None,
+                       broker: Optional[str] = None) -> Optional[Dict]:
+        """
+        Analizza i grafici e restituisce un segnale di trading
+        
+        Args:
+            screenshots: Dizionario con i percorsi degli screenshot {timeframe: path}
+            current_price: Prezzo corrente del simbolo (opzionale)
+            account_size: Dimensione del conto in USD
+            symbol: Simbolo del CFD (es. XAUUSD)
+            deadline: Istante (time.monotonic) entro cui serve il segnale, di solito la fine
+                      del ciclo (default: ora + LLM_DEADLINE secondi)
+            prompt: Variante del prompt (prompt_<NOME>.txt, default: quella del simbolo)
+            broker: Broker del simbolo (per il prezzo dal feed se current_price manca)
+        
+        Returns:
+            Dizionario con il segnale di trading o None se errore
+        """
+        try:
+            prepared = self.prepare(screenshots, current_price=current_price, symbol=symbol, prompt=prompt,
+                                    broker=broker)
+            if prepared is None:
+                return None
+            return self.infer(prepared, deadline)
+        
         except Exception as e:
             print(f"Errore durante l'analisi: {e}")
             return None
+
+    
+    def backend_stats(self):
+        """
+        Statistiche per backend (per /api/status)
+        
+        Returns:
+            Lista di dizionari con vittorie, errori e percentili di latenza
+        """
+        return [backend.stats() for backend in self.backends]
     
     def clear_history(self):
         """Pulisce la cronologia della conversazione"""
-        self.conversation_history = []
+        self.memory.clear()
+    
+    def close(self):
+        """Chiude le connessioni del trasporto HTTP"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+        self.transport.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+"""
+Cache degli screenshot per candela
+
+Un frame catturato resta valido finché la candela del suo timeframe è aperta:
+la chiave è (simbolo, timeframe, apertura della candela), quindi un ciclo che
+cade nella stessa ora di un giorno diverso non riutilizza il frame vecchio.
+Il frame viene scartato prima della chiusura se il prezzo si è mosso più della
+soglia configurata rispetto al prezzo al momento della cattura.
+"""
+import os
+import time
+from collections import OrderedDict
+
+
+def bar_open(timestamp, minutes):
+    """
+    Istante di apertura della candela che contiene timestamp
+    
+    Le candele intraday di TradingView fino a 1 ora sono allineate all'epoca UTC.
+    
+    Args:
+        timestamp: Istante (secondi epoch)
+        minutes: Durata della candela in minuti
+    
+    Returns:
+        Apertura della candela (secondi epoch)
+    """
+    period = int(minutes) * 60
+    return int(timestamp) // period * period
+
+
+class FrameCache:
+    """Cache dei frame per (simbolo, timeframe, candela) con invalidazione sul movimento di prezzo"""
+    
+    def __init__(self, timeframes=("60min", "15min"), max_move_pct=0.15, max_entries=64):
+        """
+        Inizializza la cache
+        
+        Args:
+            timeframes: Nomi dei timeframe che possono essere riutilizzati
+            max_move_pct: Movimento di prezzo (%) oltre il quale il frame è scaduto
+                          anche a candela aperta (0 = solo chiusura della candela)
+            max_entries: Numero massimo di frame in cache
+        """
+        self.timeframes = set(timeframes)
+        self.max_move_pct = max_move_pct
+        self.max_entries = max_entries
+        
+        # {(symbol, tf_name, bar_open): {"path", "price", "created"}}
+        self.entries = OrderedDict()
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea la cache dalle variabili d'ambiente
+        
+        FRAME_CACHE_TIMEFRAMES (60min,15min; vuoto = disattivata),
+        FRAME_CACHE_MAX_MOVE_PCT (0.15)
+        """
+        timeframes = [tf.strip() for tf in os.getenv("FRAME_CACHE_TIMEFRAMES", "60min,15min").split(",")
+                      if tf.strip()]
+        return cls(
+            timeframes=timeframes,
+            max_move_pct=float(os.getenv("FRAME_CACHE_MAX_MOVE_PCT", "0.15"))
+        )
+    
+    def get(self, symbol, tf_name, tf_minutes, price=None, now=None):
+        """
+        Cerca un frame ancora valido per la candela corrente
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD)
+            tf_name: Nome del timeframe (es. 15min)
+            tf_minutes: Durata della candela in minuti
+            price: Prezzo attuale (None = controllo del movimento saltato)
+            now: Istante attuale (default: time.time())
+        
+        Returns:
+            Percorso del frame o None (miss)
+        """
+        if tf_name not in self.timeframes:
+            return None
+        
+        now = now or time.time()
+        key = (symbol, tf_name, bar_open(now, tf_minutes))
+        entry = self.entries.get(key)
+        
+        if entry is None:
+            self.misses += 1
+            return None
+        
+        if not os.path.exists(entry["path"]):
+            self._evict(key, "file non più presente")
+            self.misses += 1
+            return None
+        
+        if price is not None and entry["price"] and self.max_move_pct:
+            move_pct = abs(price - entry["price"]) / entry["price"] * 100
+            if move_pct > self.max_move_pct:
+                self._evict(key, f"prezzo mosso del {move_pct:.2f}%")
+                self.misses += 1
+                return None
+        
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry["path"]
+    
+    def put(self, symbol, tf_name, tf_minutes, path, price=None, now=None):
+        """
+        Registra il frame appena catturato per la candela corrente
+        
+        I frame delle candele precedenti dello stesso simbolo/timeframe vengono eliminati.
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD)
+            tf_name: Nome del timeframe (es. 15min)
+            tf_minutes: Durata della candela in minuti
+            path: Percorso del frame
+            price: Prezzo al momento della cattura
+            now: Istante della cattura (default: time.time())
+        """
+        if tf_name not in self.timeframes:
+            return
+        
+        now = now or time.time()
+        key = (symbol, tf_name, bar_open(now, tf_minutes))
+        
+        for old_key in [k for k in self.entries if k[:2] == key[:2] and k != key]:
+            self._evict(old_key)
+        
+        self.entries[key] = {"path": path, "price": price, "created": now}
+        self.entries.move_to_end(key)
+        
+        while len(self.entries) > self.max_entries:
+            self._evict(next(iter(self.entries)))
+    
+    def _evict(self, key, reason=None):
+        """Rimuove una voce dalla cache"""
+        self.entries.pop(key, None)
+        self.evictions += 1
+        if reason:
+            print(f"   🗑️  [{key[1]}] Frame in cache scartato: {reason}")
+    
+    def evict(self, symbol=None, tf_name=None):
+        """
+        Svuota la cache, per simbolo e/o timeframe
+        
+        Args:
+            symbol: Simbolo da eliminare (None = tutti)
+            tf_name: Timeframe da eliminare (None = tutti)
+        """
+        for key in list(self.entries):
+            if (symbol is None or key[0] == symbol) and (tf_name is None or key[1] == tf_name):
+                self._evict(key)
+    
+    def stats(self):
+        """
+        Contatori della cache (per /api/status)
+        
+        Returns:
+            Dizionario con hit, miss, evizioni, hit rate e voci presenti
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "entries": len(self.entries),
+        }
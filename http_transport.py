@@ -0,0 +1,334 @@
+"""
+Trasporto HTTP persistente per le chiamate all'API di Fireworks AI
+
+Una sessione keep-alive con pool di connessioni, condivisa tra cicli e simboli:
+l'handshake TCP/TLS si paga una volta sola invece che a ogni richiesta.
+Con http2=True usa httpx (se installato) per multiplexare le richieste
+concorrenti sulla stessa connessione; altrimenti requests.Session.
+
+Uno stream interrotto a metà su HTTP/2 si chiude con il reset del solo stream.
+Su HTTP/1.1 chiudere una risposta non letta butterebbe il socket: il resto
+viene letto in background (entro un limite di byte e di tempo) così la
+connessione torna nel pool. Le connessioni aperte sono contate a ogni connect
+del socket, riconnessioni comprese, così le metriche di riuso sono reali.
+"""
+import os
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# Errori di rete/timeout per cui ha senso riprovare (le eccezioni di requests derivano da OSError)
+TRANSIENT_ERRORS = (OSError,) + ((httpx.TransportError,) if httpx is not None else ())
+
+# Limiti per leggere il resto di uno stream interrotto prima di rinunciare alla connessione
+DRAIN_MAX_BYTES = 256 * 1024
+DRAIN_MAX_SECONDS = 10.0
+
+
+class HttpError(Exception):
+    """Risposta HTTP con status di errore"""
+    
+    def __init__(self, code, body=b"", headers=None):
+        self.code = code
+        self.body = body
+        self.headers = headers or {}
+        super().__init__(f"HTTP {code}: {body[:200].decode('utf-8', errors='replace')}")
+
+
+class CountingAdapter(HTTPAdapter):
+    """HTTPAdapter che segnala ogni connessione TCP aperta, anche quando urllib3 riconnette un socket chiuso"""
+    
+    def __init__(self, on_connect, **kwargs):
+        self._on_connect = on_connect
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        on_connect = self._on_connect
+        
+        class CountingHTTPConnection(HTTPConnection):
+            def connect(self):
+                on_connect()
+                super().connect()
+        
+        class CountingHTTPSConnection(HTTPSConnection):
+            def connect(self):
+                on_connect()
+                super().connect()
+        
+        class CountingHTTPPool(HTTPConnectionPool):
+            ConnectionCls = CountingHTTPConnection
+        
+        class CountingHTTPSPool(HTTPSConnectionPool):
+            ConnectionCls = CountingHTTPSConnection
+        
+        self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPPool, "https": CountingHTTPSPool}
+
+
+class HttpTransport:
+    """Client HTTP keep-alive con timeout separati e metriche di riuso delle connessioni"""
+    
+    def __init__(self, connect_timeout=10, read_timeout=60, pool_size=4, http2=False):
+        """
+        Inizializza il trasporto
+        
+        Args:
+            connect_timeout: Timeout (secondi) per stabilire la connessione
+            read_timeout: Timeout (secondi) tra due letture della risposta
+            pool_size: Numero massimo di connessioni mantenute aperte per host
+            http2: Usa HTTP/2 tramite httpx (richiede httpx[http2])
+        """
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        
+        if http2 and httpx is None:
+            print("⚠️  HTTP/2 richiesto ma httpx non è installato: uso HTTP/1.1 keep-alive")
+            http2 = False
+        self.http2 = http2
+        
+        if self.http2:
+            self._client = httpx.Client(
+                http2=True,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size)
+            )
+            self._session = None
+        else:
+            self._session = requests.Session()
+            # Nessun retry a livello di adapter: i tentativi li gestisce l'analizzatore.
+            # Un pool per host, così più backend su endpoint diversi non si sfrattano a vicenda
+            adapter = CountingAdapter(self._on_connect, pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+            self._session.mount("https://", adapter)
+            self._session.mount("http://", adapter)
+            self._client = None
+        
+        self._lock = threading.Lock()
+        self.request_count = 0
+        self.error_count = 0
+        self.total_latency = 0.0
+        self._h2_streams = set()
+        self.connect_count = 0
+        self.drained = 0
+        self.discarded = 0
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea il trasporto dalle variabili d'ambiente
+        
+        LLM_CONNECT_TIMEOUT (10), LLM_READ_TIMEOUT (60), LLM_POOL_SIZE (4), LLM_HTTP2 (false)
+        """
+        return cls(
+            connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "10")),
+            read_timeout=float(os.getenv("LLM_READ_TIMEOUT", "60")),
+            pool_size=int(os.getenv("LLM_POOL_SIZE", "4")),
+            http2=os.getenv("LLM_HTTP2", "false").lower() == "true"
+        )
+    
+    def _headers(self, body, headers):
+        """Header con Content-Length per i corpi in streaming (httpx userebbe il chunked encoding)"""
+        if self.http2 and not isinstance(body, bytes):
+            return dict(headers, **{"Content-Length": str(len(body))})
+        return headers
+    
+    def _timeout(self, limit):
+        """Timeout di lettura, ridotto al tempo rimasto se indicato"""
+        read_timeout = self.read_timeout if limit is None else max(0.1, min(self.read_timeout, limit))
+        if self.http2:
+            return httpx.Timeout(read_timeout, connect=min(self.connect_timeout, read_timeout))
+        return (min(self.connect_timeout, read_timeout), read_timeout)
+    
+    def post(self, url, body, headers, timeout=None):
+        """
+        Invia una richiesta POST e restituisce il corpo della risposta
+        
+        Args:
+            url: URL dell'endpoint
+            body: Corpo della richiesta (bytes o RequestBody iterabile con lunghezza nota)
+            headers: Header HTTP
+            timeout: Tempo massimo (secondi) concesso alla richiesta, se inferiore ai timeout configurati
+        
+        Returns:
+            Corpo della risposta (bytes)
+        
+        Raises:
+            HttpError: status HTTP >= 400
+        """
+        start = time.monotonic()
+        try:
+            if self.http2:
+                response = self._client.post(url, content=body, headers=self._headers(body, headers),
+                                             timeout=self._timeout(timeout))
+                status, content, response_headers = response.status_code, response.content, response.headers
+                stream = response.extensions.get("network_stream")
+                if stream is not None:
+                    with self._lock:
+                        self._h2_streams.add(id(stream))
+            else:
+                response = self._session.post(url, data=body, headers=headers, timeout=self._timeout(timeout))
+                status, content, response_headers = response.status_code, response.content, response.headers
+        except Exception:
+            with self._lock:
+                self.error_count += 1
+            raise
+        finally:
+            with self._lock:
+                self.request_count += 1
+                self.total_latency += time.monotonic() - start
+        
+        if status >= 400:
+            with self._lock:
+                self.error_count += 1
+            raise HttpError(status, content, dict(response_headers))
+        return content
+    
+    def stream_lines(self, url, body, headers, timeout=None):
+        """
+        Invia una richiesta POST e restituisce le righe della risposta man mano che arrivano
+        
+        Interrompere l'iterazione chiude la risposta. Su HTTP/2 viene chiuso solo lo
+        stream; su HTTP/1.1 il resto della risposta viene letto in background entro
+        DRAIN_MAX_BYTES/DRAIN_MAX_SECONDS, così la connessione torna nel pool.
+        
+        Args:
+            url: URL dell'endpoint
+            body: Corpo della richiesta (bytes o RequestBody iterabile con lunghezza nota)
+            headers: Header HTTP
+            timeout: Tempo massimo (secondi) tra due letture, se inferiore ai timeout configurati
+        
+        Yields:
+            Righe della risposta (str, senza terminatore)
+        
+        Raises:
+            HttpError: status HTTP >= 400
+        """
+        start = time.monotonic()
+        with self._lock:
+            self.request_count += 1
+        
+        try:
+            if self.http2:
+                with self._client.stream("POST", url, content=body, headers=self._headers(body, headers),
+                                         timeout=self._timeout(timeout)) as response:
+                    self._record_latency(start)
+                    stream = response.extensions.get("network_stream")
+                    if stream is not None:
+                        with self._lock:
+                            self._h2_streams.add(id(stream))
+                    if response.status_code >= 400:
+                        raise HttpError(response.status_code, response.read(), dict(response.headers))
+                    for line in response.iter_lines():
+                        yield line
+            else:
+                response = self._session.post(url, data=body, headers=headers, stream=True,
+                                              timeout=self._timeout(timeout))
+                self._record_latency(start)
+                try:
+                    if response.status_code >= 400:
+                        raise HttpError(response.status_code, response.content, dict(response.headers))
+                    for line in response.iter_lines():
+                        yield line.decode("utf-8")
+                except GeneratorExit:
+                    # Lettura interrotta dal chiamante: la connessione si recupera in background
+                    self._drain(response)
+                    response = None
+                    raise
+                finally:
+                    if response is not None:
+                        response.close()
+        except Exception:
+            with self._lock:
+                self.error_count += 1
+            raise
+    
+    def _on_connect(self):
+        """Conta una connessione TCP aperta (nuova o riconnessa)"""
+        with self._lock:
+            self.connect_count += 1
+    
+    def _drain(self, response):
+        """
+        Legge in un thread il resto di una risposta HTTP/1.1 e la chiude
+        
+        Solo una risposta letta fino in fondo rilascia la connessione al pool;
+        oltre i limiti il socket viene chiuso e la prossima richiesta riconnette.
+        
+        Args:
+            response: Risposta requests in streaming letta solo in parte
+        """
+        def drain():
+            deadline = time.monotonic() + DRAIN_MAX_SECONDS
+            read = 0
+            complete = False
+            try:
+                for chunk in response.iter_content(8192):
+                    read += len(chunk)
+                    if read > DRAIN_MAX_BYTES or time.monotonic() > deadline:
+                        break
+                else:
+                    complete = True
+            except Exception:
+                pass
+            finally:
+                response.close()
+            with self._lock:
+                if complete:
+                    self.drained += 1
+                else:
+                    self.discarded += 1
+        
+        threading.Thread(target=drain, name="http-drain", daemon=True).start()
+    
+    def _record_latency(self, start):
+        """Registra il tempo fino agli header della risposta"""
+        with self._lock:
+            self.total_latency += time.monotonic() - start
+    
+    def _new_connections(self):
+        """Numero di connessioni aperte finora (ogni altra richiesta ha riusato una connessione)"""
+        if self.http2:
+            return len(self._h2_streams)
+        with self._lock:
+            return self.connect_count
+    
+    def stats(self):
+        """
+        Metriche del trasporto (per /api/status)
+        
+        Returns:
+            Dizionario con richieste, connessioni aperte, riusi, stream interrotti
+            recuperati o scartati e latenza media
+        """
+        with self._lock:
+            requests_done = self.request_count
+            latency = self.total_latency
+            errors = self.error_count
+            drained, discarded = self.drained, self.discarded
+        new_connections = self._new_connections()
+        return {
+            "protocol": "HTTP/2" if self.http2 else "HTTP/1.1",
+            "requests": requests_done,
+            "errors": errors,
+            "connections_opened": new_connections,
+            "connections_reused": max(0, requests_done - new_connections),
+            "streams_drained": drained,
+            "streams_discarded": discarded,
+            "avg_latency_ms": round(latency / requests_done * 1000) if requests_done else None,
+        }
+    
+    def close(self):
+        """Chiude le connessioni del pool"""
+        if self._client is not None:
+            self._client.close()
+        if self._session is not None:
+            self._session.close()
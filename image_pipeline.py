@@ -0,0 +1,148 @@
+"""
+Pipeline immagini per gli screenshot dei grafici
+
+Ritaglia lo screenshot all'area del grafico (prezzo + pannelli indicatori),
+lo ridimensiona alla risoluzione desiderata e lo codifica in JPEG/WebP,
+riducendo dimensione di upload e costo in token visivi per ciclo.
+"""
+import io
+import os
+from PIL import Image
+
+
+# Bounding box dell'area grafico (pannello prezzo + pannelli indicatori), senza toolbar e sidebar
+CHART_REGION_JS = """
+() => {
+    const el = document.querySelector('.chart-container') || document.querySelector('.layout__area--center');
+    if (!el) return null;
+    const r = el.getBoundingClientRect();
+    if (r.width < 100 || r.height < 100) return null;
+    return {x: Math.max(0, r.left), y: Math.max(0, r.top), width: r.width, height: r.height};
+}
+"""
+
+FORMATS = {
+    "jpeg": ("JPEG", ".jpg"),
+    "webp": ("WEBP", ".webp"),
+    "png": ("PNG", ".png"),
+}
+
+
+class ImagePipeline:
+    """Ritaglio, ridimensionamento e codifica degli screenshot"""
+    
+    def __init__(self, clip=True, max_width=1280, fmt="jpeg", quality=80):
+        """
+        Inizializza la pipeline
+        
+        Args:
+            clip: Ritaglia all'area del grafico e degli indicatori
+            max_width: Larghezza massima in pixel (0 = nessun ridimensionamento)
+            fmt: Formato di output (jpeg, webp, png)
+            quality: Qualità di codifica JPEG/WebP (1-100)
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"Formato immagine non valido: {fmt} (validi: {', '.join(FORMATS)})")
+        
+        self.clip = clip
+        self.max_width = max_width
+        self.fmt = fmt
+        self.quality = quality
+        
+        # Byte totali prima/dopo la pipeline (per il riepilogo)
+        self.bytes_before = 0
+        self.bytes_after = 0
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea la pipeline dalle variabili d'ambiente
+        
+        IMAGE_FORMAT (jpeg), IMAGE_MAX_WIDTH (1280), IMAGE_QUALITY (80), IMAGE_CLIP (true)
+        
+        Returns:
+            ImagePipeline configurata
+        """
+        return cls(
+            clip=os.getenv("IMAGE_CLIP", "true").lower() == "true",
+            max_width=int(os.getenv("IMAGE_MAX_WIDTH", "1280")),
+            fmt=os.getenv("IMAGE_FORMAT", "jpeg").lower(),
+            quality=int(os.getenv("IMAGE_QUALITY", "80"))
+        )
+    
+    @property
+    def extension(self):
+        """Estensione dei file prodotti (es. .jpg)"""
+        return FORMATS[self.fmt][1]
+    
+    def screenshot(self, page, output_path):
+        """
+        Cattura lo screenshot della pagina, lo elabora e lo salva
+        
+        Args:
+            page: Pagina Playwright
+            output_path: Percorso del file di output
+        
+        Returns:
+            Tupla (byte_prima, byte_dopo)
+        """
+        clip = page.evaluate(CHART_REGION_JS) if self.clip else None
+        raw = page.screenshot(clip=clip, full_page=False)
+        return self.save(raw, output_path)
+    
+    def save(self, raw, output_path):
+        """
+        Elabora uno screenshot già catturato e lo salva
+        
+        Args:
+            raw: Screenshot PNG originale
+            output_path: Percorso del file di output
+            
+        Returns:
+            Tupla (byte_prima, byte_dopo)
+        """
+        data = self.process(raw)
+        
+        with open(output_path, "wb") as f:
+            f.write(data)
+        
+        self.bytes_before += len(raw)
+        self.bytes_after += len(data)
+        print(f"  📉 Immagine: {len(raw) / 1024:.0f} KB → {len(data) / 1024:.0f} KB ({self.fmt})")
+        return len(raw), len(data)
+    
+    def process(self, image_bytes):
+        """
+        Ridimensiona e ricodifica un'immagine
+        
+        Args:
+            image_bytes: Immagine originale (PNG)
+        
+        Returns:
+            Byte dell'immagine elaborata
+        """
+        image = Image.open(io.BytesIO(image_bytes))
+        
+        if self.max_width and image.width > self.max_width:
+            height = round(image.height * self.max_width / image.width)
+            image = image.resize((self.max_width, height), Image.LANCZOS)
+        
+        pil_format = FORMATS[self.fmt][0]
+        if pil_format in ("JPEG", "WEBP") and image.mode != "RGB":
+            image = image.convert("RGB")
+        
+        output = io.BytesIO()
+        if pil_format == "PNG":
+            image.save(output, format=pil_format, optimize=True)
+        else:
+            image.save(output, format=pil_format, quality=self.quality)
+        return output.getvalue()
+    
+    def report(self):
+        """Stampa il risparmio complessivo e azzera i contatori"""
+        if self.bytes_before:
+            saved = 100 * (1 - self.bytes_after / self.bytes_before)
+            print(f"📉 Pipeline immagini: {self.bytes_before / 1024:.0f} KB → "
+                  f"{self.bytes_after / 1024:.0f} KB (-{saved:.0f}%)")
+        self.bytes_before = 0
+        self.bytes_after = 0
@@ -0,0 +1,94 @@
+"""
+Parsing incrementale di oggetti JSON da un testo in streaming
+
+Il modello risponde con un oggetto JSON, a volte preceduto da un blocco
+markdown o seguito da altro testo. Lo scanner riceve i frammenti man mano che
+arrivano e segnala l'oggetto appena la graffa di apertura viene chiusa,
+senza aspettare la fine della risposta.
+"""
+import json
+
+
+class JsonObjectScanner:
+    """Individua il primo oggetto JSON completo e valido in un flusso di testo"""
+    
+    def __init__(self, required_fields=()):
+        """
+        Inizializza lo scanner
+        
+        Args:
+            required_fields: Campi che l'oggetto deve contenere per essere accettato
+        """
+        self.required_fields = tuple(required_fields)
+        self.text = ""
+        self.result = None
+        self.result_text = None
+        self.result_end = None
+        
+        self._pos = 0
+        self._start = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+    
+    def feed(self, chunk):
+        """
+        Aggiunge un frammento di testo
+        
+        Args:
+            chunk: Testo ricevuto dallo stream
+        
+        Returns:
+            Oggetto decodificato se appena completato, altrimenti None
+        """
+        if self.result is not None:
+            return None
+        self.text += chunk
+        
+        text = self.text
+        while self._pos < len(text):
+            char = text[self._pos]
+            self._pos += 1
+            
+            if self._start is None:
+                if char == "{":
+                    self._start = self._pos - 1
+                    self._depth = 1
+                continue
+            
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            
+            if char == '"':
+                self._in_string = True
+            elif char == "{":
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start:self._pos]
+                    obj = self._accept(candidate)
+                    if obj is not None:
+                        self.result = obj
+                        self.result_text = candidate
+                        self.result_end = self._pos
+                        return obj
+                    # Oggetto non valido (es. esempio nel testo): si cerca il successivo
+                    self._start = None
+        return None
+    
+    def _accept(self, candidate):
+        """Decodifica il candidato e verifica i campi richiesti"""
+        try:
+            obj = json.loads(candidate)
+        except ValueError:
+            return None
+        if not isinstance(obj, dict) or any(field not in obj for field in self.required_fields):
+            return None
+        return obj
@@ -0,0 +1,146 @@
+"""
+Backend dell'API (coppie modello/endpoint) con statistiche di latenza
+
+L'analizzatore può inviare la stessa analisi a più backend: in parallelo oppure
+"hedged", cioè avviando il backend successivo solo se il precedente non ha
+risposto entro una soglia. Ogni backend tiene le proprie latenze per calcolare
+i percentili e limitare la coda lenta di un ciclo.
+"""
+import os
+import threading
+from collections import deque
+
+from prompt_cache import RequestTemplate
+from resilience import CircuitBreaker
+
+
+DEFAULT_URL = "https://api.fireworks.ai/inference/v1/chat/completions"
+
+DISPATCH_MODES = ("hedge", "parallel")
+
+
+def percentile(sorted_values, pct):
+    """Percentile (nearest-rank) di una lista già ordinata"""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Backend:
+    """Coppia modello/endpoint con template della richiesta e latenze recenti"""
+    
+    def __init__(self, model, url=DEFAULT_URL, api_key=None, name=None, stream=False, window=200,
+                 breaker=None):
+        """
+        Inizializza il backend
+        
+        Args:
+            model: Nome del modello
+            url: Endpoint chat/completions compatibile OpenAI
+            api_key: Chiave API del backend
+            name: Nome breve per log e statistiche (default: ultima parte del modello)
+            stream: Richieste in streaming
+            window: Numero di latenze recenti conservate per i percentili
+            breaker: CircuitBreaker del backend (default: da variabili d'ambiente LLM_BREAKER_*)
+        """
+        self.model = model
+        self.url = url
+        self.name = name or model.rsplit("/", 1)[-1]
+        self.template = RequestTemplate(model, temperature=0.7, max_tokens=2000, stream=stream)
+        self.headers = {
+            'Content-Type': 'application/json',
+            'Authorization': f'Bearer {api_key}'
+        }
+        self.breaker = breaker or CircuitBreaker.from_env()
+        
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.wins = 0
+        self.failures = 0
+        self.cancelled = 0
+    
+    def record(self, latency):
+        """Registra la latenza di una risposta valida"""
+        with self._lock:
+            self._latencies.append(latency)
+    
+    def record_win(self):
+        """Registra che la risposta del backend è stata quella usata"""
+        with self._lock:
+            self.wins += 1
+    
+    def record_failure(self):
+        """Registra una richiesta fallita o con segnale non valido"""
+        with self._lock:
+            self.failures += 1
+    
+    def record_cancelled(self):
+        """Registra una richiesta interrotta perché un altro backend ha risposto prima"""
+        with self._lock:
+            self.cancelled += 1
+    
+    def stats(self):
+        """
+        Statistiche del backend (per /api/status)
+        
+        Returns:
+            Dizionario con vittorie, errori, annullate, percentili di latenza (ms) e stato del circuito
+        """
+        with self._lock:
+            latencies = sorted(self._latencies)
+            wins, failures, cancelled = self.wins, self.failures, self.cancelled
+        
+        def ms(value):
+            return round(value * 1000) if value is not None else None
+        
+        return {
+            "name": self.name,
+            "model": self.model,
+            "url": self.url,
+            "responses": len(latencies),
+            "wins": wins,
+            "failures": failures,
+            "cancelled": cancelled,
+            "p50_ms": ms(percentile(latencies, 50)),
+            "p95_ms": ms(percentile(latencies, 95)),
+            "p99_ms": ms(percentile(latencies, 99)),
+            "circuit": self.breaker.stats(),
+        }
+
+
+def parse_backends(spec, api_key, stream=False):
+    """
+    Crea i backend da una specifica testuale
+    
+    Formato: voci separate da virgola, ognuna [nome=]modello[@url]. La chiave API
+    di un backend con nome si legge da LLM_API_KEY_<NOME> (default: api_key).
+    
+    Esempio: "qwen=accounts/fireworks/models/qwen3-vl-235b-a22b-instruct,
+              llama=accounts/fireworks/models/llama4-maverick-instruct-basic"
+    
+    Args:
+        spec: Specifica dei backend
+        api_key: Chiave API di default
+        stream: Richieste in streaming
+    
+    Returns:
+        Lista di Backend nell'ordine di priorità
+    """
+    backends = []
+    for item in spec.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        
+        name = None
+        if "=" in item:
+            name, item = (part.strip() for part in item.split("=", 1))
+        model, _, url = item.partition("@")
+        
+        key = api_key
+        if name:
+            key = os.getenv(f"LLM_API_KEY_{name.upper()}", api_key)
+        backends.append(Backend(model.strip(), url=url.strip() or DEFAULT_URL, api_key=key,
+                                name=name, stream=stream))
+    return backends
@@ -0,0 +1,304 @@
+"""
+Filtro delle richieste di rete per il browser headless
+
+Blocca le risorse che non compaiono mai nello screenshot del grafico
+(pubblicità, tracking, video, widget social) per ridurre banda e tempo
+di caricamento di ogni goto. Include una modalità "learn" che registra
+quali domini servono davvero al grafico, per restringere le liste in sicurezza.
+
+Attenzione: con un routing attivo sul contesto Playwright disattiva la cache
+HTTP del browser. Le pagine riutilizzate (goto sequenziali, pagine worker, tab
+live) riscaricano quindi a ogni ciclo gli asset statici di TradingView, che
+senza filtro arriverebbero dalla cache: il risparmio sulle risorse bloccate può
+essere inferiore ai byte persi. Per questo il filtro è disattivato di default;
+va attivato dopo averlo misurato, meglio insieme alla cache asset su disco di
+BrowserState (BROWSER_STATE_DIR) che serve gli asset statici anche col routing.
+
+I byte delle richieste bloccate non vengono mai scaricati: sono stimati dalla
+dimensione media per dominio registrata in modalità learn (file dei domini
+appresi), e le richieste bloccate senza una stima sono contate a parte.
+"""
+import json
+import os
+import threading
+from urllib.parse import urlparse
+
+
+# Tipi di risorsa bloccati di default (Playwright resource_type)
+DEFAULT_BLOCKED_TYPES = ("media",)
+
+# Domini di pubblicità/tracking/social bloccati di default (inclusi i sottodomini)
+DEFAULT_BLOCKED_DOMAINS = (
+    "doubleclick.net",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "google-analytics.com",
+    "googletagmanager.com",
+    "facebook.net",
+    "facebook.com",
+    "twitter.com",
+    "twimg.com",
+    "youtube.com",
+    "ytimg.com",
+    "hotjar.com",
+    "scorecardresearch.com",
+    "quantserve.com",
+    "adnxs.com",
+    "criteo.com",
+    "taboola.com",
+    "outbrain.com",
+    "sentry.io",
+    "telemetry.tradingview.com",
+)
+
+MODES = ("off", "on", "learn", "strict")
+
+
+def _domain_matches(host, domains):
+    """Verifica se host coincide con uno dei domini o ne è un sottodominio"""
+    return any(host == domain or host.endswith("." + domain) for domain in domains)
+
+
+class NetworkFilter:
+    """Livello di routing delle richieste con liste allow/block e contatori"""
+    
+    def __init__(self, mode="off", blocked_types=DEFAULT_BLOCKED_TYPES,
+                 blocked_domains=DEFAULT_BLOCKED_DOMAINS, allowed_domains=(),
+                 learn_file="network_learned.json"):
+        """
+        Inizializza il filtro
+        
+        Args:
+            mode: "off" (nessun filtro), "on" (block list), "learn" (nessun blocco,
+                  registra i domini usati), "strict" (solo domini appresi o allow list)
+            blocked_types: Tipi di risorsa da bloccare (es. media, font, image)
+            blocked_domains: Domini da bloccare (inclusi i sottodomini)
+            allowed_domains: Domini sempre ammessi, hanno la precedenza sulla block list
+            learn_file: File JSON con i domini appresi in modalità learn
+        """
+        if mode not in MODES:
+            raise ValueError(f"Modalità filtro non valida: {mode} (valide: {', '.join(MODES)})")
+        
+        self.mode = mode
+        self.blocked_types = set(blocked_types)
+        self.blocked_domains = tuple(blocked_domains)
+        self.allowed_domains = tuple(allowed_domains)
+        self.learn_file = learn_file
+        
+        # Domini appresi {domain: {"requests": n, "bytes": b, "types": {type: n}}}
+        known = self._load_learned(warn=mode == "strict") if mode in ("on", "strict") else {}
+        self.learned = known if mode == "strict" else {}
+        
+        # Byte medi per richiesta di ogni dominio, per stimare i byte bloccati
+        self.average_bytes = {host: entry["bytes"] / entry["requests"]
+                              for host, entry in known.items() if entry.get("requests")}
+        
+        self._lock = threading.Lock()
+        self.counters = {
+            "allowed_requests": 0,
+            "blocked_requests": 0,
+            "allowed_bytes": 0,
+            "blocked_bytes_estimated": 0,
+            "blocked_unsized_requests": 0,
+            "blocked_by_type": {},
+            "blocked_by_domain": {},
+        }
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea il filtro dalle variabili d'ambiente
+        
+        NET_FILTER: off/on/learn/strict (default: off, vedi la nota sulla cache HTTP)
+        NET_FILTER_BLOCK_TYPES: tipi aggiuntivi da bloccare, separati da virgola
+        NET_FILTER_BLOCK_DOMAINS: domini aggiuntivi da bloccare, separati da virgola
+        NET_FILTER_ALLOW_DOMAINS: domini sempre ammessi, separati da virgola
+        NET_FILTER_LEARN_FILE: file dei domini appresi
+        
+        Returns:
+            NetworkFilter, oppure None se NET_FILTER=off
+        """
+        mode = os.getenv("NET_FILTER", "off").lower()
+        if mode == "off":
+            return None
+        
+        def env_list(name):
+            return [item.strip() for item in os.getenv(name, "").split(",") if item.strip()]
+        
+        return cls(
+            mode=mode,
+            blocked_types=list(DEFAULT_BLOCKED_TYPES) + env_list("NET_FILTER_BLOCK_TYPES"),
+            blocked_domains=list(DEFAULT_BLOCKED_DOMAINS) + env_list("NET_FILTER_BLOCK_DOMAINS"),
+            allowed_domains=env_list("NET_FILTER_ALLOW_DOMAINS"),
+            learn_file=os.getenv("NET_FILTER_LEARN_FILE", "network_learned.json")
+        )
+    
+    def _load_learned(self, warn=True):
+        """Carica i domini appresi dal file JSON (vuoto se assente)"""
+        try:
+            with open(self.learn_file, "r", encoding="utf-8") as f:
+                return json.load(f).get("domains", {})
+        except FileNotFoundError:
+            if warn:
+                print(f"⚠️  File {self.learn_file} non trovato: modalità strict senza domini appresi")
+            return {}
+    
+    def install(self, context):
+        """
+        Installa il filtro su un contesto browser (API sync di Playwright)
+        
+        Il routing disattiva la cache HTTP del contesto (vedi la nota del modulo).
+        
+        Args:
+            context: BrowserContext Playwright
+        """
+        if self.mode == "off":
+            return
+        
+        context.route("**/*", self._handle_route)
+        context.on("response", self._on_response)
+    
+    async def install_async(self, context):
+        """
+        Installa il filtro su un contesto browser (API async di Playwright)
+        
+        Args:
+            context: BrowserContext di playwright.async_api
+        """
+        if self.mode == "off":
+            return
+        
+        await context.route("**/*", self._handle_route_async)
+        context.on("response", self._on_response)
+    
+    def _should_block(self, host, resource_type):
+        """
+        Decide se bloccare una richiesta
+        
+        Args:
+            host: Hostname della richiesta
+            resource_type: Tipo di risorsa Playwright
+        
+        Returns:
+            Motivo del blocco ("type" o "domain") oppure None
+        """
+        # Il documento principale non viene mai bloccato
+        if resource_type == "document" or self.mode == "learn":
+            return None
+        if _domain_matches(host, self.allowed_domains):
+            return None
+        if resource_type in self.blocked_types:
+            return "type"
+        if _domain_matches(host, self.blocked_domains):
+            return "domain"
+        if self.mode == "strict" and host not in self.learned:
+            return "domain"
+        return None
+    
+    def _handle_route(self, route):
+        """Handler di routing: blocca o lascia proseguire la richiesta"""
+        if self._decide(route):
+            route.abort()
+        else:
+            # fallback() lascia la richiesta ad eventuali altri handler di routing
+            route.fallback()
+    
+    async def _handle_route_async(self, route):
+        """Handler di routing per l'API async (stessa logica di _handle_route)"""
+        if self._decide(route):
+            await route.abort()
+        else:
+            await route.fallback()
+    
+    def _decide(self, route):
+        """
+        Decide il destino di una richiesta e aggiorna i contatori
+        
+        Args:
+            route: Route Playwright intercettata
+            
+        Returns:
+            Motivo del blocco o None se la richiesta è ammessa
+        """
+        request = route.request
+        host = urlparse(request.url).hostname or ""
+        resource_type = request.resource_type
+        reason = self._should_block(host, resource_type)
+        
+        with self._lock:
+            if reason:
+                self.counters["blocked_requests"] += 1
+                by_type = self.counters["blocked_by_type"]
+                by_type[resource_type] = by_type.get(resource_type, 0) + 1
+                by_domain = self.counters["blocked_by_domain"]
+                by_domain[host] = by_domain.get(host, 0) + 1
+                if host in self.average_bytes:
+                    self.counters["blocked_bytes_estimated"] += self.average_bytes[host]
+                else:
+                    self.counters["blocked_unsized_requests"] += 1
+            else:
+                self.counters["allowed_requests"] += 1
+                if self.mode == "learn":
+                    entry = self.learned.setdefault(host, {"requests": 0, "bytes": 0, "types": {}})
+                    entry["requests"] += 1
+                    entry["types"][resource_type] = entry["types"].get(resource_type, 0) + 1
+        
+        return reason
+    
+    def _on_response(self, response):
+        """Conta i byte delle risposte ammesse (da Content-Length, se presente)"""
+        try:
+            size = int(response.headers.get("content-length", 0))
+        except ValueError:
+            size = 0
+        
+        with self._lock:
+            self.counters["allowed_bytes"] += size
+            if self.mode == "learn":
+                host = urlparse(response.url).hostname or ""
+                if host in self.learned:
+                    self.learned[host]["bytes"] += size
+    
+    def stats(self):
+        """
+        Restituisce una copia dei contatori
+        
+        Returns:
+            Dizionario con richieste ammesse/bloccate, byte scaricati, stima dei
+            byte bloccati e i 10 domini più bloccati
+        """
+        with self._lock:
+            top_blocked = sorted(self.counters["blocked_by_domain"].items(), key=lambda item: -item[1])[:10]
+            return {
+                "mode": self.mode,
+                "allowed_requests": self.counters["allowed_requests"],
+                "blocked_requests": self.counters["blocked_requests"],
+                "allowed_mb": round(self.counters["allowed_bytes"] / 1024 / 1024, 2),
+                "blocked_mb_estimated": round(self.counters["blocked_bytes_estimated"] / 1024 / 1024, 2),
+                "blocked_unsized_requests": self.counters["blocked_unsized_requests"],
+                "blocked_by_type": dict(self.counters["blocked_by_type"]),
+                "top_blocked_domains": dict(top_blocked),
+            }
+    
+    def save_learned(self):
+        """Salva su file i domini appresi (solo in modalità learn)"""
+        if self.mode != "learn":
+            return
+        
+        with self._lock:
+            data = {"domains": dict(sorted(self.learned.items(), key=lambda item: -item[1]["requests"]))}
+        
+        with open(self.learn_file, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+    
+    def report(self):
+        """Stampa i contatori e aggiorna il file dei domini appresi"""
+        stats = self.stats()
+        print(f"🌐 Filtro rete ({stats['mode']}): "
+              f"{stats['allowed_requests']} ammesse ({stats['allowed_mb']} MB), "
+              f"{stats['blocked_requests']} bloccate (~{stats['blocked_mb_estimated']} MB stimati, "
+              f"{stats['blocked_unsized_requests']} senza stima)")
+        
+        if self.mode == "learn":
+            self.save_learned()
+            print(f"   📝 Domini appresi: {len(self.learned)} (salvati in {self.learn_file})")
@@ -0,0 +1,301 @@
+"""
+Più simboli nello stesso processo, su browser e analizzatore condivisi
+
+Ogni simbolo ha intervallo, timeframe e variante del prompt propri, con uno
+scheduler allineato alle sue candele. Il thread del browser cattura insieme
+tutti i simboli il cui slot è arrivato (ScraperPool, un solo Chromium) e
+consegna i grafici alla pipeline di analisi, condivisa con lo stesso
+analizzatore (connessioni keep-alive, limitatore e cache). Stato ed errori
+sono tenuti per simbolo: un simbolo che fallisce non ferma gli altri.
+
+I simboli si configurano con una lista compatta o con un file JSON:
+
+    XAUUSD,US30:EIGHTCAP@15,EURUSD:OANDA@5
+
+    [{"symbol": "XAUUSD", "broker": "EIGHTCAP", "interval": 10,
+      "timeframes": ["60min", "15min", "1min"], "prompt": "XAUUSD"}]
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+from analysis_pipeline import AnalysisPipeline
+from scheduler import CandleScheduler, MAX_SLEEP
+from scraper_pool import TIMEFRAMES, parse_timeframes
+
+
+class SymbolConfig:
+    """Configurazione di un simbolo"""
+    
+    def __init__(self, symbol, broker="EIGHTCAP", interval=10, timeframes=None, prompt=None):
+        """
+        Args:
+            symbol: Simbolo del CFD (es. XAUUSD)
+            broker: Broker (es. EIGHTCAP)
+            interval: Intervallo in minuti tra le analisi, allineato alle candele
+            timeframes: Timeframe da catturare {nome: minuti} (default: TIMEFRAMES)
+            prompt: Variante del prompt (prompt_<NOME>.txt, default: quella del simbolo)
+        """
+        self.symbol = symbol.upper()
+        self.broker = broker.upper()
+        self.interval = interval
+        self.timeframes = dict(timeframes or TIMEFRAMES)
+        self.prompt = prompt
+    
+    @classmethod
+    def from_dict(cls, data, broker="EIGHTCAP", interval=10):
+        """Configurazione da un oggetto JSON (broker e intervallo mancanti dai default)"""
+        if not data.get("symbol"):
+            raise ValueError(f"Simbolo mancante nella configurazione: {data}")
+        timeframes = data.get("timeframes")
+        return cls(
+            data["symbol"],
+            broker=data.get("broker", broker),
+            interval=int(data.get("interval", interval)),
+            timeframes=parse_timeframes(timeframes) if timeframes else None,
+            prompt=data.get("prompt")
+        )
+
+
+def load_symbol_configs(spec, broker="EIGHTCAP", interval=10):
+    """
+    Legge la configurazione dei simboli
+    
+    Args:
+        spec: Percorso di un file JSON (lista di oggetti) o lista SIMBOLO[:BROKER][@MINUTI]
+              separata da virgole
+        broker: Broker dei simboli che non lo indicano
+        interval: Intervallo (minuti) dei simboli che non lo indicano
+    
+    Returns:
+        Lista di SymbolConfig
+    
+    Raises:
+        ValueError: Se la configurazione non è valida o un simbolo è ripetuto
+    """
+    if spec.strip().endswith(".json") or os.path.isfile(spec):
+        with open(spec, "r", encoding="utf-8") as f:
+            configs = [SymbolConfig.from_dict(item, broker, interval) for item in json.load(f)]
+    else:
+        configs = []
+        for item in filter(None, (part.strip() for part in spec.split(","))):
+            item, _, minutes = item.partition("@")
+            symbol, _, item_broker = item.partition(":")
+            configs.append(SymbolConfig(symbol, broker=item_broker or broker,
+                                        interval=int(minutes) if minutes else interval))
+    
+    if not configs:
+        raise ValueError("Nessun simbolo configurato")
+    symbols = [config.symbol for config in configs]
+    duplicates = sorted({symbol for symbol in symbols if symbols.count(symbol) > 1})
+    if duplicates:
+        raise ValueError(f"Simboli ripetuti: {', '.join(duplicates)}")
+    return configs
+
+
+class SymbolState:
+    """Stato di un simbolo (per /api/status)"""
+    
+    def __init__(self, config, scheduler):
+        self.config = config
+        self.scheduler = scheduler
+        self.runs = 0
+        self.signals = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.pending = 0
+        self.last_run = None
+        self.last_price = None
+        self.last_signal = None
+        self.last_signal_at = None
+        self.last_error = None
+    
+    def stats(self):
+        return {
+            "broker": self.config.broker,
+            "interval_min": self.config.interval,
+            "timeframes": list(self.config.timeframes),
+            "prompt": self.config.prompt or self.config.symbol,
+            "runs": self.runs,
+            "signals": self.signals,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "pending_analyses": self.pending,
+            "last_run": self.last_run,
+            "current_price": self.last_price,
+            "last_signal": self.last_signal,
+            "last_signal_at": self.last_signal_at,
+            "last_error": self.last_error,
+            "scheduler": self.scheduler.stats(),
+        }
+
+
+class MultiSymbolOrchestrator:
+    """Cicli di cattura e analisi per più simboli su risorse condivise"""
+    
+    def __init__(self, configs, pool, analyzer, publish, screenshots_dir="screenshots", offset=5.0,
+                 overrun="skip", infer_workers=2, queue_size=2):
+        """
+        Inizializza l'orchestratore
+        
+        Args:
+            configs: Lista di SymbolConfig
+            pool: ScraperPool condiviso (un solo browser per tutti i simboli)
+            analyzer: DeepSeekAnalyzer condiviso
+            publish: Funzione chiamata con ogni AnalysisJob concluso con un segnale
+            screenshots_dir: Directory degli screenshot
+            offset: Secondi dopo la chiusura della candela a cui avviare la cattura
+            overrun: Politica per gli slot persi ("skip" o "coalesce")
+            infer_workers: Analisi AI in corso contemporaneamente
+            queue_size: Analisi al massimo in attesa davanti a ogni stadio della pipeline
+        """
+        self.pool = pool
+        self.analyzer = analyzer
+        self.publish = publish
+        self.screenshots_dir = screenshots_dir
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        
+        self.states = {}
+        for config in configs:
+            pool.add_symbol(config.symbol, broker=config.broker, timeframes=config.timeframes)
+            scheduler = CandleScheduler(config.interval, offset=offset, overrun=overrun, name=config.symbol)
+            self.states[config.symbol] = SymbolState(config, scheduler)
+        
+        self.pipeline = AnalysisPipeline(analyzer, self._publish, infer_workers=infer_workers,
+                                         queue_size=queue_size, on_complete=self._on_complete)
+    
+    def _due_runs(self):
+        """Slot arrivati {symbol: ScheduledRun}, senza attendere"""
+        runs = {}
+        for symbol, state in self.states.items():
+            run = state.scheduler.wait_next(block=False)
+            if run is not None:
+                runs[symbol] = run
+        return runs
+    
+    def _sleep_time(self):
+        """Secondi fino al primo slot in arrivo (al massimo MAX_SLEEP)"""
+        slots = [state.scheduler.next_slot for state in self.states.values() if state.scheduler.next_slot]
+        if not slots:
+            return 0.0
+        return max(0.0, min(MAX_SLEEP, min(slots) - time.time()))
+    
+    def _fail(self, state, reason):
+        with self._lock:
+            state.failures += 1
+            state.consecutive_failures += 1
+            state.last_error = reason
+        print(f"❌ [{state.config.symbol}] {reason}")
+    
+    def step(self):
+        """
+        Cattura e accoda l'analisi dei simboli il cui slot è arrivato
+        
+        Returns:
+            Numero di simboli elaborati
+        """
+        runs = self._due_runs()
+        if not runs:
+            return 0
+        
+        symbols = list(runs)
+        print(f"\n{'='*70}")
+        print(f"🔄 CICLO - {', '.join(symbols)} ({datetime.now().strftime('%H:%M:%S')})")
+        print(f"{'='*70}")
+        
+        try:
+            results = self.pool.capture(output_dir=self.screenshots_dir, symbols=symbols)
+        except Exception as e:
+            # Browser del pool inutilizzabile: si riavvia alla prossima cattura
+            print(f"❌ Errore durante la cattura: {e}")
+            self.pool.close()
+            results = {}
+        
+        for symbol in symbols:
+            state = self.states[symbol]
+            run = runs[symbol]
+            with self._lock:
+                state.runs += 1
+                state.last_run = datetime.fromtimestamp(run.started).isoformat(timespec="seconds")
+            try:
+                screenshots, price = results.get(symbol, ({}, None))
+                if price is not None:
+                    state.last_price = price
+                available = {tf: path for tf, path in screenshots.items() if path}
+                if not available:
+                    errors = self.pool.errors.get(symbol) or {}
+                    self._fail(state, "nessuno screenshot disponibile" +
+                               (f" ({'; '.join(f'{tf}: {reason}' for tf, reason in errors.items())})" if errors else ""))
+                    continue
+                with self._lock:
+                    state.pending += 1
+                self.pipeline.submit(symbol, available, current_price=price, deadline=run.deadline,
+                                     cycle=state.runs, prompt=state.config.prompt, broker=state.config.broker)
+            except Exception as e:
+                self._fail(state, f"errore nel ciclo: {e}")
+            finally:
+                state.scheduler.finish(run)
+        return len(symbols)
+    
+    def _publish(self, job):
+        state = self.states[job.symbol]
+        with self._lock:
+            state.last_signal = job.signal
+            state.last_signal_at = datetime.now().isoformat(timespec="seconds")
+        self.publish(job)
+    
+    def _on_complete(self, job):
+        state = self.states[job.symbol]
+        with self._lock:
+            state.pending = max(0, state.pending - 1)
+            if job.signal is not None and job.error is None:
+                state.signals += 1
+                state.consecutive_failures = 0
+                return
+            state.failures += 1
+            state.consecutive_failures += 1
+            if job.error is not None:
+                state.last_error = f"analisi: {job.error}"
+            elif job.prepared is not None and job.deadline is not None and time.monotonic() >= job.deadline:
+                state.last_error = "analisi scaduta prima dello slot successivo"
+            else:
+                state.last_error = "nessun segnale ricevuto"
+    
+    def run(self, once=False):
+        """
+        Esegue i cicli finché stop() non viene chiamato (dal thread che possiede il browser)
+        
+        Args:
+            once: Un solo ciclo per tutti i simboli, attendendo le analisi
+        """
+        if once:
+            self.step()
+            self.pipeline.drain()
+            return
+        while not self._stop.is_set():
+            if not self.step():
+                self._stop.wait(self._sleep_time())
+    
+    def stop(self):
+        """Interrompe il loop e le attese degli scheduler"""
+        self._stop.set()
+        for state in self.states.values():
+            state.scheduler.stop()
+    
+    def close(self, timeout=60):
+        """Attende le analisi in corso (fino a timeout) e chiude il browser condiviso"""
+        self.pipeline.close(timeout=timeout)
+        self.pool.close()
+    
+    def stats(self):
+        """
+        Stato di tutti i simboli (per /api/status)
+        
+        Returns:
+            Dizionario {symbol: stato}
+        """
+        with self._lock:
+            return {symbol: state.stats() for symbol, state in self.states.items()}
@@ -0,0 +1,225 @@
+"""
+Feed prezzi dai frame websocket di TradingView
+
+Ascolta i messaggi "qsd" (quote session data) che la pagina del grafico riceve
+sul websocket di TradingView e mantiene in memoria l'ultimo tick per simbolo,
+con timestamp e bid/ask quando disponibili. La lettura del prezzo diventa una
+lettura di dizionario invece di una scansione del DOM.
+
+Con l'API sync di Playwright gli eventi dei websocket vengono consegnati solo
+mentre il thread del browser è dentro una chiamata Playwright: il timestamp di
+ogni tick indica quanto è fresco.
+"""
+import json
+import re
+import threading
+import time
+
+
+# Separatore dei messaggi nel protocollo websocket di TradingView: ~m~<lunghezza>~m~<payload>
+FRAME_HEADER = re.compile(r"~m~(\d+)~m~")
+
+# Età massima (secondi) di un tick del feed websocket per essere usato come prezzo corrente
+PRICE_FEED_MAX_AGE = 120
+
+# Valore di un pip per simbolo (gli altri: FX 0.0001, coppie JPY 0.01, resto 1)
+PIP_SIZES = {
+    "XAUUSD": 0.1,
+    "XAGUSD": 0.01,
+}
+
+
+def pip_size(symbol):
+    """Valore di un pip per il simbolo"""
+    symbol = symbol.upper()
+    if symbol in PIP_SIZES:
+        return PIP_SIZES[symbol]
+    if len(symbol) == 6 and symbol.isalpha():
+        return 0.01 if symbol.endswith("JPY") else 0.0001
+    return 1.0
+
+
+def parse_frames(payload):
+    """
+    Divide un frame websocket di TradingView nei singoli messaggi JSON
+    
+    Args:
+        payload: Testo del frame (può contenere più messaggi concatenati)
+    
+    Returns:
+        Lista di messaggi decodificati (heartbeat e messaggi non JSON esclusi)
+    """
+    messages = []
+    pos = 0
+    while True:
+        match = FRAME_HEADER.match(payload, pos)
+        if not match:
+            break
+        start = match.end()
+        end = start + int(match.group(1))
+        body = payload[start:end]
+        pos = end
+        if body.startswith("~h~"):
+            continue
+        try:
+            messages.append(json.loads(body))
+        except ValueError:
+            continue
+    return messages
+
+
+def _symbol_key(name):
+    """
+    Normalizza il nome simbolo di una quote session (es. eightcap:xauusd → EIGHTCAP:XAUUSD)
+    
+    Il broker resta nella chiave: lo stesso ticker di due broker ha quotazioni diverse.
+    Le sessioni con impostazioni aggiuntive usano un nome del tipo ={"symbol":"EIGHTCAP:XAUUSD",...}
+    """
+    if name.startswith("="):
+        try:
+            name = json.loads(name[1:]).get("symbol", name)
+        except (ValueError, AttributeError):
+            pass
+    return name.upper()
+
+
+# Campi numerici della quote {campo qsd: campo del tick}
+PRICE_FIELDS = (("lp", "price"), ("bid", "bid"), ("ask", "ask"))
+
+
+class PriceFeed:
+    """Cache in memoria dell'ultimo tick per simbolo, alimentata dai websocket delle pagine"""
+    
+    def __init__(self):
+        """Inizializza il feed"""
+        self._lock = threading.Lock()
+        self._ticks = {}
+    
+    def attach(self, page):
+        """
+        Collega il feed ai websocket di una pagina
+        
+        Args:
+            page: Pagina Playwright del grafico
+        """
+        page.on("websocket", self._on_websocket)
+    
+    def _on_websocket(self, websocket):
+        """Registra l'handler dei frame sui websocket dati di TradingView"""
+        if "tradingview.com" in websocket.url:
+            websocket.on("framereceived", self._on_frame)
+    
+    def _on_frame(self, payload):
+        """Aggiorna la cache con i messaggi qsd contenuti nel frame"""
+        if isinstance(payload, bytes):
+            payload = payload.decode("utf-8", errors="ignore")
+        if "qsd" not in payload:
+            return
+        
+        for message in parse_frames(payload):
+            if not isinstance(message, dict) or message.get("m") != "qsd":
+                continue
+            try:
+                data = message["p"][1]
+                values = data.get("v", {})
+                name = data["n"]
+            except (KeyError, IndexError, TypeError, AttributeError):
+                continue
+            if not isinstance(values, dict):
+                continue
+            self.update(_symbol_key(name), values, source=name)
+    
+    def update(self, key, values, source=None):
+        """
+        Aggiorna il tick di un simbolo (i messaggi qsd contengono solo i campi cambiati)
+        
+        Chiamato dall'handler dei websocket di Playwright: i valori non numerici
+        vengono ignorati invece di sollevare eccezioni.
+        
+        Args:
+            key: Simbolo con il broker (es. EIGHTCAP:XAUUSD)
+            values: Campi della quote (lp, bid, ask, lp_time, ...)
+            source: Nome completo del simbolo nella sessione
+        """
+        broker, _, symbol = key.rpartition(":")
+        numbers = {}
+        for field, name in PRICE_FIELDS:
+            if field not in values:
+                continue
+            try:
+                numbers[name] = float(values[field])
+            except (TypeError, ValueError):
+                continue
+        
+        with self._lock:
+            tick = self._ticks.setdefault(key, {
+                "symbol": symbol,
+                "broker": broker or None,
+                "source": source,
+                "price": None,
+                "bid": None,
+                "ask": None,
+                "exchange_time": None,
+                "timestamp": None,
+            })
+            tick.update(numbers)
+            if "lp_time" in values:
+                tick["exchange_time"] = values["lp_time"]
+            if numbers:
+                tick["timestamp"] = time.time()
+    
+    def last(self, symbol, max_age=None, broker=None):
+        """
+        Restituisce l'ultimo tick di un simbolo
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD)
+            max_age: Età massima in secondi (None = qualsiasi)
+            broker: Broker del simbolo (es. EIGHTCAP); senza broker il tick più recente
+                    tra quelli del simbolo
+        
+        Returns:
+            Copia del tick o None se assente o troppo vecchio
+        """
+        symbol = symbol.upper()
+        with self._lock:
+            if broker:
+                tick = self._ticks.get(f"{broker.upper()}:{symbol}")
+            else:
+                ticks = [tick for tick in self._ticks.values()
+                         if tick["symbol"] == symbol and tick["price"] is not None]
+                tick = max(ticks, key=lambda tick: tick["timestamp"] or 0, default=None)
+            if tick is None or tick["price"] is None:
+                return None
+            if max_age is not None and time.time() - tick["timestamp"] > max_age:
+                return None
+            return dict(tick)
+    
+    def price(self, symbol, max_age=None, broker=None):
+        """
+        Restituisce l'ultimo prezzo di un simbolo
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD)
+            max_age: Età massima in secondi (None = qualsiasi)
+            broker: Broker del simbolo (default: il tick più recente tra i broker)
+        
+        Returns:
+            Prezzo o None
+        """
+        tick = self.last(symbol, max_age=max_age, broker=broker)
+        return tick["price"] if tick else None
+    
+    def snapshot(self):
+        """
+        Copia di tutti i tick in cache (per /api/status)
+        
+        Returns:
+            Dizionario {BROKER:SIMBOLO: tick} con l'età del tick in secondi
+        """
+        now = time.time()
+        with self._lock:
+            return {
+                symbol: dict(tick, age=round(now - tick["timestamp"], 1) if tick["timestamp"] else None)
+                for symbol, tick in self._ticks.items()
+            }
@@ -0,0 +1,235 @@
+"""
+Analisi attivate dal movimento del prezzo invece che a intervallo fisso
+
+Tra un'analisi e l'altra il trigger legge i tick del PriceFeed (websocket di
+TradingView, nessuna cattura) e avvia il ciclo quando il prezzo si sposta di
+più di N pips dall'ultima analisi o quando la volatilità realizzata supera una
+soglia. Una spaziatura minima evita raffiche di chiamate al modello nei mercati
+agitati, una massima garantisce comunque un'analisi anche a mercato fermo.
+
+Con l'API sync di Playwright i frame websocket arrivano solo mentre il thread
+del browser è dentro una chiamata Playwright: l'attesa passa quindi per una
+funzione di "pompaggio" degli eventi (TradingViewScraper.pump_events).
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from price_feed import pip_size
+
+
+# Età massima (secondi) di un tick per essere considerato
+TICK_MAX_AGE = 120
+
+
+class TriggerEvent:
+    """Motivo e contesto di un'analisi attivata"""
+    
+    def __init__(self, reason, price, move_pips, volatility_pips, max_spacing):
+        self.reason = reason
+        self.price = price
+        self.move_pips = move_pips
+        self.volatility_pips = volatility_pips
+        self.started = time.time()
+        # Scadenza del ciclo (time.monotonic): al più tardi parte l'analisi successiva
+        self.deadline = time.monotonic() + max_spacing
+
+
+class PriceTrigger:
+    """Trigger su movimento di prezzo e volatilità, con spaziatura minima e massima"""
+    
+    def __init__(self, price_feed, symbol, pips=0.0, volatility=0.0, window=300, min_spacing=60,
+                 max_spacing=600, pip=None, poll=1.0, broker=None):
+        """
+        Inizializza il trigger
+        
+        Args:
+            price_feed: PriceFeed da cui leggere i tick
+            symbol: Simbolo osservato (es. XAUUSD)
+            pips: Movimento dall'ultima analisi (pips) che avvia un ciclo (0 = disattivato)
+            volatility: Volatilità realizzata nella finestra (pips) che avvia un ciclo (0 = disattivato)
+            window: Finestra (secondi) per la volatilità realizzata
+            min_spacing: Secondi minimi tra due analisi
+            max_spacing: Secondi massimi tra due analisi (anche senza movimento)
+            pip: Valore di un pip (default: da pip_size)
+            poll: Secondi tra due letture del feed
+            broker: Broker del simbolo nel feed (default: il tick più recente tra i broker)
+        """
+        self.price_feed = price_feed
+        self.symbol = symbol
+        self.broker = broker
+        self.pips = pips
+        self.volatility = volatility
+        self.window = window
+        self.min_spacing = min_spacing
+        self.max_spacing = max(max_spacing, min_spacing)
+        self.pip = pip or pip_size(symbol)
+        self.poll = poll
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        
+        # Campioni (time.monotonic, prezzo) della finestra di volatilità
+        self._samples = deque()
+        self.anchor = None
+        self.last_run = None
+        self.last_price = None
+        self.runs = 0
+        self.by_reason = {}
+        self.started_at = time.monotonic()
+    
+    @classmethod
+    def from_env(cls, price_feed, symbol, interval_minutes, broker=None):
+        """
+        Crea il trigger dalle variabili d'ambiente (None se nessuna soglia è impostata)
+        
+        TRIGGER_PIPS (0), TRIGGER_VOLATILITY (0), TRIGGER_WINDOW (300 secondi),
+        TRIGGER_MIN_SPACING (60 secondi), TRIGGER_MAX_SPACING (intervallo)
+        """
+        pips = float(os.getenv("TRIGGER_PIPS", "0"))
+        volatility = float(os.getenv("TRIGGER_VOLATILITY", "0"))
+        if pips <= 0 and volatility <= 0:
+            return None
+        return cls(
+            price_feed,
+            symbol,
+            pips=pips,
+            volatility=volatility,
+            window=float(os.getenv("TRIGGER_WINDOW", "300")),
+            min_spacing=float(os.getenv("TRIGGER_MIN_SPACING", "60")),
+            max_spacing=float(os.getenv("TRIGGER_MAX_SPACING", str(interval_minutes * 60))),
+            broker=broker
+        )
+    
+    def sample(self):
+        """Legge l'ultimo tick e lo aggiunge alla finestra; restituisce il prezzo o None se non fresco"""
+        price = self.price_feed.price(self.symbol, max_age=TICK_MAX_AGE, broker=self.broker)
+        now = time.monotonic()
+        with self._lock:
+            if price is not None:
+                self.last_price = price
+                self._samples.append((now, price))
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+        return price
+    
+    def move_pips(self):
+        """Movimento (pips) dell'ultimo prezzo rispetto all'ultima analisi"""
+        with self._lock:
+            if self.anchor is None or self.last_price is None:
+                return 0.0
+            return abs(self.last_price - self.anchor) / self.pip
+    
+    def volatility_pips(self):
+        """
+        Volatilità realizzata nella finestra: radice della somma dei quadrati delle variazioni, in pips
+        
+        Contano solo le variazioni dall'ultima analisi: un movimento che ha già
+        avviato un ciclo non lo riavvia allo scadere della spaziatura minima.
+        """
+        with self._lock:
+            prices = [price for t, price in self._samples if self.last_run is None or t >= self.last_run]
+        squares = sum((b - a) ** 2 for a, b in zip(prices, prices[1:]))
+        return math.sqrt(squares) / self.pip
+    
+    def check(self):
+        """
+        Verifica le condizioni di avvio
+        
+        Returns:
+            Motivo dell'avvio o None
+        """
+        if self.last_run is None:
+            return "avvio"
+        elapsed = time.monotonic() - self.last_run
+        if elapsed < self.min_spacing:
+            return None
+        if elapsed >= self.max_spacing:
+            return "intervallo massimo"
+        if self.pips > 0 and self.move_pips() >= self.pips:
+            return "movimento"
+        if self.volatility > 0 and self.volatility_pips() >= self.volatility:
+            return "volatilità"
+        return None
+    
+    def wait(self, pump=None):
+        """
+        Attende la prossima condizione di avvio
+        
+        Args:
+            pump: Funzione pump(secondi) che lascia lavorare il browser mentre si attende
+                  (default: semplice attesa, il feed si aggiorna solo se alimentato altrove)
+        
+        Returns:
+            TriggerEvent, None se il trigger è stato fermato
+        """
+        while True:
+            self.sample()
+            reason = self.check()
+            if reason is not None:
+                break
+            if pump is not None:
+                pump(self.poll)
+                if self._stop.is_set():
+                    return None
+            elif self._stop.wait(self.poll):
+                return None
+        
+        event = TriggerEvent(reason, self.last_price, self.move_pips(), self.volatility_pips(), self.max_spacing)
+        with self._lock:
+            previous = self.anchor
+            self.anchor = self.last_price if self.last_price is not None else self.anchor
+            self.last_run = time.monotonic()
+            # La finestra riparte dall'ultimo prezzo: le variazioni già usate non contano più
+            self._samples.clear()
+            if self.last_price is not None:
+                self._samples.append((self.last_run, self.last_price))
+            self.runs += 1
+            self.by_reason[reason] = self.by_reason.get(reason, 0) + 1
+        if reason == "movimento":
+            print(f"⚡ Trigger: movimento di {event.move_pips:.1f} pips ({previous} → {event.price})")
+        elif reason == "volatilità":
+            print(f"⚡ Trigger: volatilità {event.volatility_pips:.1f} pips negli ultimi {self.window:g}s")
+        elif reason == "intervallo massimo":
+            print(f"⏰ Trigger: nessun movimento rilevante da {self.max_spacing:g}s")
+        return event
+    
+    def next_forced(self):
+        """Orario (epoch) entro cui parte comunque la prossima analisi"""
+        if self.last_run is None:
+            return time.time()
+        return time.time() + max(0.0, self.max_spacing - (time.monotonic() - self.last_run))
+    
+    def stop(self):
+        """Interrompe l'attesa in corso"""
+        self._stop.set()
+    
+    def stats(self):
+        """
+        Stato del trigger (per /api/status)
+        
+        Returns:
+            Dizionario con soglie, movimento e volatilità attuali, avvii per motivo
+        """
+        elapsed = time.monotonic() - self.started_at
+        with self._lock:
+            summary = {
+                "symbol": self.symbol,
+                "pip": self.pip,
+                "pips_threshold": self.pips or None,
+                "volatility_threshold": self.volatility or None,
+                "min_spacing_s": self.min_spacing,
+                "max_spacing_s": self.max_spacing,
+                "anchor_price": self.anchor,
+                "last_price": self.last_price,
+                "runs": self.runs,
+                "by_reason": dict(self.by_reason),
+                # Analisi che un intervallo fisso pari alla spaziatura massima avrebbe eseguito
+                "fixed_interval_runs": int(elapsed // self.max_spacing) + 1,
+            }
+        summary["move_pips"] = round(self.move_pips(), 1)
+        summary["volatility_pips"] = round(self.volatility_pips(), 1)
+        summary["next_forced"] = datetime.fromtimestamp(self.next_forced()).isoformat(timespec="seconds")
+        return summary
@@ -0,0 +1,160 @@
+"""
+Cache del prompt e template pre-serializzato della richiesta all'API
+
+Il prompt viene letto da disco una sola volta e ricaricato solo quando cambia
+l'mtime del file; ogni simbolo può avere una variante prompt_<SIMBOLO>.txt.
+Le parti statiche del corpo JSON (parametri del modello, prompt già codificato)
+sono serializzate in anticipo: per ogni richiesta si accodano solo storico,
+prezzo e immagini, queste ultime codificate in streaming (request_body).
+"""
+import json
+import os
+import threading
+
+from request_body import RequestBody
+
+
+class PromptCache:
+    """Prompt per simbolo letti da disco e ricaricati al cambio di mtime"""
+    
+    def __init__(self, directory, fallback=""):
+        """
+        Inizializza la cache
+        
+        Args:
+            directory: Directory che contiene prompt.txt e le varianti prompt_<SIMBOLO>.txt
+            fallback: Prompt da usare se nessun file è disponibile
+        """
+        self.directory = directory
+        self.fallback = fallback
+        self._lock = threading.Lock()
+        
+        # {percorso: (mtime, testo, testo_serializzato)}
+        self._files = {}
+        self._warned = set()
+    
+    def _candidates(self, symbol):
+        """File da cercare per un simbolo, dal più specifico"""
+        names = [f"prompt_{symbol}.txt", "prompt.txt"] if symbol else ["prompt.txt"]
+        return [os.path.join(self.directory, name) for name in names]
+    
+    def _load(self, path):
+        """
+        Restituisce la voce in cache del file, ricaricandola se l'mtime è cambiato
+        
+        Returns:
+            Tupla (mtime, testo, testo_serializzato) o None se il file non esiste
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached
+        
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        entry = (mtime, text, json.dumps(text))
+        with self._lock:
+            reloaded = path in self._files
+            self._files[path] = entry
+        print(f"   📝 Prompt {'ricaricato' if reloaded else 'caricato'}: {os.path.basename(path)}")
+        return entry
+    
+    def _entry(self, symbol):
+        """Voce del prompt per un simbolo (variante, generico o fallback)"""
+        for path in self._candidates(symbol):
+            entry = self._load(path)
+            if entry is not None:
+                return entry
+        
+        if symbol not in self._warned:
+            self._warned.add(symbol)
+            print(f"⚠️  File prompt.txt non trovato in {self.directory}")
+            print("   Uso prompt di default...")
+        return (None, self.fallback, json.dumps(self.fallback))
+    
+    def get(self, symbol=None):
+        """
+        Testo del prompt per un simbolo
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD); cerca prima prompt_<SIMBOLO>.txt
+        
+        Returns:
+            Testo del prompt
+        """
+        return self._entry(symbol)[1]
+    
+    def get_serialized(self, symbol=None):
+        """Prompt per un simbolo già codificato come stringa JSON (con virgolette)"""
+        return self._entry(symbol)[2]
+
+
+class RequestTemplate:
+    """Corpo della richiesta chat/completions con le parti statiche pre-serializzate"""
+    
+    def __init__(self, model, temperature=0.7, max_tokens=2000, stream=False):
+        """
+        Inizializza il template
+        
+        Args:
+            model: Modello Fireworks AI
+            temperature: Temperatura di campionamento
+            max_tokens: Token massimi della risposta
+            stream: Risposta in streaming
+        """
+        self.model = model
+        head = json.dumps({
+            "model": model,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": stream,
+        })
+        # '{"model": ..., "stream": ...' + ', "messages": [' ... ']}'
+        self._prefix = (head[:-1] + ', "messages": [').encode("utf-8")
+        self._suffix = b"]}"
+        self._user_open = b'{"role": "user", "content": [{"type": "text", "text": '
+        self._user_close = b"]}"
+    
+    def parts(self, history, prompt_json, price_line, images):
+        """
+        Parti del corpo della richiesta, nell'ordine
+        
+        Args:
+            history: Messaggi precedenti (solo testo)
+            prompt_json: Prompt già serializzato come stringa JSON (PromptCache.get_serialized)
+            price_line: Testo da accodare al prompt (es. riga del prezzo), anche vuoto
+            images: Sorgenti base64 delle immagini (Base64File, Base64Buffer)
+        
+        Returns:
+            Lista di bytes e sorgenti base64, nell'ordine del corpo
+        """
+        parts = [self._prefix]
+        for message in history:
+            parts.append(json.dumps(message).encode("utf-8"))
+            parts.append(b", ")
+        
+        # Due stringhe JSON si uniscono togliendo la virgoletta di chiusura e quella di apertura
+        text = prompt_json[:-1] + json.dumps(price_line)[1:] if price_line else prompt_json
+        parts.append(self._user_open)
+        parts.append(text.encode("utf-8"))
+        parts.append(b"}")
+        
+        for image in images:
+            parts.append(b', {"type": "image_url", "image_url": {"url": "data:')
+            parts.append(image.mime_type.encode("ascii"))
+            parts.append(b";base64,")
+            parts.append(image)
+            parts.append(b'"}}')
+        
+        parts.append(self._user_close)
+        parts.append(self._suffix)
+        return parts
+    
+    def build(self, history, prompt_json, price_line, images):
+        """Corpo della richiesta in streaming (RequestBody, con lunghezza nota)"""
+        return RequestBody(self.parts(history, prompt_json, price_line, images))
@@ -0,0 +1,197 @@
+"""
+Limitatore di richieste verso l'API condiviso da tutto il processo
+
+Due token bucket (richieste al minuto e token al minuto) più una concorrenza
+adattiva AIMD: il numero di richieste in volo cresce di uno dopo una serie di
+successi e si dimezza a ogni 429, con una pausa globale pari al Retry-After.
+Tutti gli analizzatori del processo usano la stessa istanza (shared_limiter),
+quindi più simboli in parallelo non superano i limiti del provider.
+"""
+import os
+import threading
+import time
+
+
+# Stima dei token visivi di uno screenshot (dipende da risoluzione e modello)
+IMAGE_TOKENS = 1500
+
+
+class TokenBucket:
+    """Token bucket con ricarica continua (non thread-safe: lo protegge RateLimiter)"""
+    
+    def __init__(self, per_minute):
+        """
+        Args:
+            per_minute: Capacità ricaricata ogni minuto (0 = illimitato)
+        """
+        self.per_minute = per_minute
+        self.capacity = float(per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_minute / 60.0)
+        self.updated = now
+    
+    def wait_time(self, amount, now):
+        """Secondi prima che amount token siano disponibili (0 = subito)"""
+        if not self.per_minute:
+            return 0.0
+        self._refill(now)
+        # Una richiesta più grande della capacità passa quando il bucket è pieno
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.per_minute
+    
+    def take(self, amount):
+        if self.per_minute:
+            self.tokens -= min(amount, self.capacity)
+
+
+class RateLimiter:
+    """Limiti RPM/TPM e concorrenza adattiva (AIMD) per le richieste all'API"""
+    
+    def __init__(self, rpm=60, tpm=0, max_concurrency=4, min_concurrency=1):
+        """
+        Inizializza il limitatore
+        
+        Args:
+            rpm: Richieste al minuto (0 = illimitate)
+            tpm: Token al minuto, stimati prima dell'invio (0 = illimitati)
+            max_concurrency: Richieste in volo al massimo
+            min_concurrency: Richieste in volo al minimo dopo i 429
+        """
+        self.requests_bucket = TokenBucket(rpm)
+        self.tokens_bucket = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self._cond = threading.Condition()
+        
+        # Si parte a metà e si sale con i successi
+        self.limit = max(min_concurrency, max_concurrency // 2)
+        self.in_flight = 0
+        self._successes = 0
+        self._paused_until = 0.0
+        
+        self.waits = 0
+        self.wait_time_total = 0.0
+        self.throttled = 0
+        self.rejected = 0
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea il limitatore dalle variabili d'ambiente
+        
+        LLM_RPM (60), LLM_TPM (0 = illimitati), LLM_MAX_CONCURRENCY (4)
+        """
+        return cls(
+            rpm=int(os.getenv("LLM_RPM", "60")),
+            tpm=int(os.getenv("LLM_TPM", "0")),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+        )
+    
+    def acquire(self, tokens=0, deadline=None):
+        """
+        Attende uno slot per una richiesta
+        
+        Args:
+            tokens: Token stimati della richiesta
+            deadline: Istante (time.monotonic) oltre il quale si rinuncia
+        
+        Returns:
+            True se lo slot è stato ottenuto (va restituito con release), False alla scadenza
+        """
+        start = time.monotonic()
+        waited = False
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.in_flight >= self.limit:
+                    wait = None  # si attende una release
+                else:
+                    wait = max(self.requests_bucket.wait_time(1, now),
+                               self.tokens_bucket.wait_time(tokens, now))
+                    if wait == 0:
+                        self.requests_bucket.take(1)
+                        self.tokens_bucket.take(tokens)
+                        self.in_flight += 1
+                        if waited:
+                            self.wait_time_total += now - start
+                        return True
+                
+                remaining = deadline - now if deadline is not None else None
+                if remaining is not None and (remaining <= 0 or (wait is not None and wait > remaining)):
+                    self.rejected += 1
+                    return False
+                
+                if not waited:
+                    waited = True
+                    self.waits += 1
+                timeouts = [t for t in (wait, remaining) if t is not None]
+                self._cond.wait(min(timeouts) if timeouts else None)
+    
+    def release(self):
+        """Restituisce lo slot di una richiesta terminata"""
+        with self._cond:
+            self.in_flight = max(0, self.in_flight - 1)
+            self._cond.notify_all()
+    
+    def on_success(self):
+        """Risposta ricevuta: dopo limit successi consecutivi la concorrenza sale di uno"""
+        with self._cond:
+            self._successes += 1
+            if self._successes >= self.limit and self.limit < self.max_concurrency:
+                self.limit += 1
+                self._successes = 0
+                self._cond.notify_all()
+    
+    def on_throttle(self, retry_after=None):
+        """
+        Risposta 429: concorrenza dimezzata e pausa globale
+        
+        Args:
+            retry_after: Secondi indicati dal provider (default: 1)
+        """
+        pause = retry_after if retry_after is not None else 1.0
+        with self._cond:
+            self.throttled += 1
+            self._successes = 0
+            self.limit = max(self.min_concurrency, self.limit // 2)
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        print(f"   🚦 Limite del provider raggiunto (429): concorrenza {self.limit}, pausa {pause:.1f}s")
+    
+    def stats(self):
+        """
+        Contatori del limitatore (per /api/status)
+        
+        Returns:
+            Dizionario con concorrenza attuale, richieste in volo, attese e 429
+        """
+        with self._cond:
+            return {
+                "concurrency_limit": self.limit,
+                "in_flight": self.in_flight,
+                "rpm": self.requests_bucket.per_minute or None,
+                "tpm": self.tokens_bucket.per_minute or None,
+                "waits": self.waits,
+                "wait_time_s": round(self.wait_time_total, 1),
+                "throttled": self.throttled,
+                "rejected": self.rejected,
+            }
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_limiter():
+    """Limitatore unico del processo, creato alla prima chiamata dalle variabili d'ambiente"""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = RateLimiter.from_env()
+        return _shared
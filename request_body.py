@@ -0,0 +1,88 @@
+"""
+Corpo della richiesta in streaming, senza copie delle immagini in memoria
+
+Le immagini vengono codificate in base64 a blocchi direttamente dal file (o da
+un buffer) mentre il trasporto invia il corpo: in memoria resta un blocco alla
+volta invece della stringa base64 completa, del JSON e della sua codifica.
+La lunghezza è calcolata in anticipo, quindi la richiesta usa Content-Length
+e non il chunked transfer encoding; il corpo si può iterare più volte (retry,
+più backend) rileggendo i file.
+"""
+import base64
+import os
+
+
+# Multiplo di 3: ogni blocco si codifica in base64 senza padding intermedio
+CHUNK_SIZE = 3 * 16 * 1024
+
+
+def base64_length(size):
+    """Lunghezza in base64 (con padding) di size byte"""
+    return (size + 2) // 3 * 4
+
+
+class Base64File:
+    """Immagine su disco codificata in base64 a blocchi"""
+    
+    def __init__(self, path, mime_type):
+        """
+        Args:
+            path: Percorso dell'immagine
+            mime_type: MIME type (es. image/jpeg)
+        """
+        self.path = path
+        self.mime_type = mime_type
+        self.size = os.path.getsize(path)
+    
+    def __len__(self):
+        return base64_length(self.size)
+    
+    def __iter__(self):
+        with open(self.path, "rb") as f:
+            while True:
+                chunk = f.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield base64.b64encode(chunk)
+
+
+class Base64Buffer:
+    """Immagine in memoria codificata in base64 a blocchi"""
+    
+    def __init__(self, data, mime_type):
+        """
+        Args:
+            data: Byte dell'immagine (bytes, bytearray o memoryview)
+            mime_type: MIME type (es. image/png)
+        """
+        self.data = memoryview(data)
+        self.mime_type = mime_type
+    
+    def __len__(self):
+        return base64_length(len(self.data))
+    
+    def __iter__(self):
+        for offset in range(0, len(self.data), CHUNK_SIZE):
+            yield base64.b64encode(self.data[offset:offset + CHUNK_SIZE])
+
+
+class RequestBody:
+    """Sequenza di parti (bytes o sorgenti base64) con lunghezza nota, iterabile più volte"""
+    
+    def __init__(self, parts):
+        """
+        Args:
+            parts: Lista di bytes e di oggetti iterabili con __len__ (Base64File, Base64Buffer)
+        """
+        self.parts = parts
+        self._length = sum(len(part) for part in parts)
+    
+    def __len__(self):
+        return self._length
+    
+    def __iter__(self):
+        for part in self.parts:
+            if isinstance(part, bytes):
+                yield part
+            else:
+                yield from part
@@ -0,0 +1,201 @@
+"""
+Retry con scadenza e circuit breaker per le chiamate all'API
+
+I tentativi sono limitati dal tempo che resta nel ciclo, non da un numero fisso
+di attese: un'analisi non blocca mai il bot oltre la scadenza. Su 429/503 si
+rispetta l'header Retry-After. Dopo troppi errori consecutivi il circuit breaker
+si apre e le richieste falliscono subito fino al periodo di prova.
+"""
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from http_transport import HttpError, TRANSIENT_ERRORS
+
+
+# Status HTTP per cui ha senso riprovare
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Scadenza del ciclo raggiunta prima della risposta
+    
+    Non deriva da OSError/TimeoutError: non è un errore transitorio del backend,
+    quindi non si riprova e non conta per il circuit breaker.
+    """
+
+
+def retry_after_seconds(headers):
+    """
+    Secondi indicati dall'header Retry-After (numero o data HTTP)
+    
+    Returns:
+        Secondi di attesa o None se l'header manca o non è valido
+    """
+    value = next((v for k, v in (headers or {}).items() if k.lower() == "retry-after"), None)
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    """Quali errori riprovare e quanto attendere tra i tentativi"""
+    
+    def __init__(self, max_attempts=3, base_delay=2.0, max_delay=30.0):
+        """
+        Inizializza la politica
+        
+        Args:
+            max_attempts: Tentativi massimi per richiesta (la scadenza può fermarli prima)
+            base_delay: Attesa (secondi) dopo il primo errore, raddoppiata a ogni tentativo
+            max_delay: Attesa massima tra due tentativi
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea la politica dalle variabili d'ambiente
+        
+        LLM_MAX_ATTEMPTS (3), LLM_RETRY_BASE_DELAY (2), LLM_RETRY_MAX_DELAY (30)
+        """
+        return cls(
+            max_attempts=int(os.getenv("LLM_MAX_ATTEMPTS", "3")),
+            base_delay=float(os.getenv("LLM_RETRY_BASE_DELAY", "2")),
+            max_delay=float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+        )
+    
+    def retryable(self, error):
+        """True per errori transitori (rete, timeout, 408/429/5xx)"""
+        if isinstance(error, HttpError):
+            return error.code in RETRY_STATUS
+        return isinstance(error, TRANSIENT_ERRORS)
+    
+    def delay(self, attempt, error=None):
+        """
+        Attesa prima del tentativo successivo
+        
+        Args:
+            attempt: Numero del tentativo appena fallito (da 1)
+            error: Errore ricevuto (per Retry-After)
+        
+        Returns:
+            Secondi di attesa
+        """
+        if isinstance(error, HttpError) and error.code in (429, 503):
+            retry_after = retry_after_seconds(error.headers)
+            if retry_after is not None:
+                return retry_after
+        # Backoff esponenziale con jitter, per non riprovare tutti nello stesso istante
+        backoff = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return backoff * random.uniform(0.8, 1.2)
+
+
+class CircuitBreaker:
+    """Circuit breaker a tre stati: closed, open, half_open"""
+    
+    def __init__(self, failure_threshold=5, reset_timeout=60.0):
+        """
+        Inizializza il breaker
+        
+        Args:
+            failure_threshold: Errori consecutivi che aprono il circuito
+            reset_timeout: Secondi dopo cui un circuito aperto ammette una richiesta di prova
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea il breaker dalle variabili d'ambiente
+        
+        LLM_BREAKER_FAILURES (5), LLM_BREAKER_RESET (60 secondi)
+        """
+        return cls(
+            failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+            reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "60"))
+        )
+    
+    def allow(self):
+        """
+        True se una richiesta può partire
+        
+        A circuito aperto, trascorso reset_timeout, ammette una sola richiesta di prova.
+        """
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+    
+    def record_success(self):
+        """Una risposta è arrivata: il circuito si chiude"""
+        with self._lock:
+            if self.state != "closed":
+                print("   🟢 Circuito chiuso: l'API risponde di nuovo")
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+    
+    def record_failure(self):
+        """Errore dell'API: oltre la soglia (o se la prova fallisce) il circuito si apre"""
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    print(f"   🔴 Circuito aperto dopo {self.consecutive_failures} errori consecutivi: "
+                          f"nuove richieste rifiutate per {self.reset_timeout:g}s")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+    
+    def release(self):
+        """Richiesta annullata senza esito: libera l'eventuale slot di prova"""
+        with self._lock:
+            self._trial_in_flight = False
+    
+    def stats(self):
+        """
+        Stato del circuito (per /api/status)
+        
+        Returns:
+            Dizionario con stato, errori consecutivi, aperture e richieste rifiutate
+        """
+        with self._lock:
+            retry_in = None
+            if self.state == "open":
+                retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "times_opened": self.times_opened,
+                "rejected": self.rejected,
+                "retry_in_s": retry_in,
+            }
@@ -0,0 +1,275 @@
+"""
+Cache delle risposte dell'AI per grafici (quasi) identici
+
+A mercato chiuso o fermo gli screenshot cambiano poco o nulla da un ciclo
+all'altro: invece di ripetere la chiamata al modello si riusa l'ultimo segnale
+validato. La chiave è l'hash percettivo (dHash) di ogni timeframe più il prezzo
+arrotondato a una griglia in pips del simbolo; due grafici corrispondono se la
+distanza di Hamming tra gli hash resta sotto la soglia configurata. Un segnale
+in cache viene riusato solo se è ancora valido rispetto al prezzo attuale.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from PIL import Image
+
+from price_feed import pip_size
+
+
+def dhash(image_path, hash_size=8):
+    """
+    Hash percettivo per differenza (dHash) di un'immagine
+    
+    L'immagine viene ridotta a (hash_size + 1) x hash_size in scala di grigi;
+    ogni bit indica se un pixel è più chiaro del vicino a destra.
+    
+    Args:
+        image_path: Percorso dell'immagine
+        hash_size: Lato della griglia (8 = hash a 64 bit)
+    
+    Returns:
+        Hash come intero
+    """
+    with Image.open(image_path) as image:
+        pixels = list(image.convert("L").resize((hash_size + 1, hash_size), Image.BILINEAR).getdata())
+    
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming(a, b):
+    """Numero di bit diversi tra due hash"""
+    return bin(a ^ b).count("1")
+
+
+class ResponseCache:
+    """Segnali validati per (simbolo, prezzo arrotondato, hash dei grafici) con TTL e LRU"""
+    
+    def __init__(self, path=None, ttl=900, max_entries=128, max_distance=4, price_pips=5, price_step=None):
+        """
+        Inizializza la cache
+        
+        Args:
+            path: File JSON in cui persistere la cache tra i riavvii (None = solo in memoria)
+            ttl: Validità (secondi) di un segnale in cache (0 = cache disattivata)
+            max_entries: Numero massimo di segnali conservati
+            max_distance: Distanza di Hamming massima (su 64 bit) per considerare simili due grafici
+            price_pips: Ampiezza della griglia del prezzo in pips del simbolo
+                        (5 = 0.5 su XAUUSD, 0.0005 su EURUSD)
+            price_step: Ampiezza assoluta della griglia, uguale per tutti i simboli (sostituisce price_pips)
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_distance = max_distance
+        self.price_pips = price_pips
+        self.price_step = price_step
+        self._lock = threading.Lock()
+        
+        # {id: {"symbol", "bucket", "hashes", "signal", "created"}}
+        self.entries = OrderedDict()
+        self._next_id = 0
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.rejected = 0
+        
+        if self.path:
+            self._load()
+    
+    @classmethod
+    def from_env(cls):
+        """
+        Crea la cache dalle variabili d'ambiente
+        
+        LLM_CACHE_TTL (900 secondi, 0 = disattivata), LLM_CACHE_MAX_DISTANCE (4),
+        LLM_CACHE_PRICE_PIPS (5), LLM_CACHE_PRICE_STEP (vuoto = da LLM_CACHE_PRICE_PIPS),
+        LLM_CACHE_FILE (vuoto = solo in memoria)
+        """
+        price_step = os.getenv("LLM_CACHE_PRICE_STEP", "")
+        return cls(
+            path=os.getenv("LLM_CACHE_FILE", "") or None,
+            ttl=float(os.getenv("LLM_CACHE_TTL", "900")),
+            max_distance=int(os.getenv("LLM_CACHE_MAX_DISTANCE", "4")),
+            price_pips=float(os.getenv("LLM_CACHE_PRICE_PIPS", "5")),
+            price_step=float(price_step) if price_step else None
+        )
+    
+    @property
+    def enabled(self):
+        return self.ttl > 0
+    
+    def _bucket(self, symbol, price):
+        """Prezzo arrotondato alla griglia del simbolo (None se la griglia è disattivata)"""
+        step = self.price_step or self.price_pips * pip_size(symbol)
+        if not step:
+            return None
+        return int(round(price / step))
+    
+    def fingerprint(self, screenshots):
+        """
+        Hash percettivi degli screenshot
+        
+        Args:
+            screenshots: Dizionario {timeframe: path}
+        
+        Returns:
+            Dizionario {timeframe: hash} o None se un'immagine non è leggibile
+        """
+        try:
+            return {tf: dhash(path) for tf, path in screenshots.items() if path}
+        except OSError as e:
+            print(f"   ⚠️  Hash dei grafici non calcolabile: {e}")
+            return None
+    
+    def get(self, symbol, fingerprint, price=None, now=None, validate=None):
+        """
+        Cerca un segnale per grafici simili allo stesso livello di prezzo
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD)
+            fingerprint: Hash dei grafici (ResponseCache.fingerprint)
+            price: Prezzo attuale (senza prezzo la cache non viene consultata)
+            now: Istante attuale (default: time.time())
+            validate: Funzione validate(segnale, prezzo) -> bool; un segnale non più
+                      valido al prezzo attuale non viene riusato
+        
+        Returns:
+            Copia del segnale o None (miss)
+        """
+        # Senza prezzo il segnale non è rivalidabile e la griglia non distingue i livelli
+        if not self.enabled or not fingerprint or price is None:
+            return None
+        
+        now = now or time.time()
+        bucket = self._bucket(symbol, price)
+        with self._lock:
+            self._expire(now)
+            # Dal più recente: a parità di somiglianza vince l'ultimo segnale
+            for entry_id in reversed(self.entries):
+                entry = self.entries[entry_id]
+                if entry["symbol"] != symbol or entry["bucket"] != bucket:
+                    continue
+                if entry["hashes"].keys() != fingerprint.keys():
+                    continue
+                distance = max(hamming(entry["hashes"][tf], fingerprint[tf]) for tf in fingerprint)
+                if distance > self.max_distance:
+                    continue
+                if validate is not None and not validate(dict(entry["signal"]), price):
+                    # SL/TP ormai dal lato sbagliato del mercato: si cerca tra i segnali più vecchi
+                    self.rejected += 1
+                    continue
+                self.entries.move_to_end(entry_id)
+                self.hits += 1
+                age = now - entry["created"]
+                print(f"   ♻️  Grafici invariati (distanza {distance}/64, segnale di {age:.0f}s fa): risposta dalla cache")
+                return dict(entry["signal"])
+            self.misses += 1
+        return None
+    
+    def put(self, symbol, fingerprint, price, signal, now=None):
+        """
+        Registra un segnale validato
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD)
+            fingerprint: Hash dei grafici analizzati
+            price: Prezzo al momento dell'analisi (senza prezzo il segnale non viene registrato)
+            signal: Segnale restituito dal modello
+            now: Istante dell'analisi (default: time.time())
+        """
+        if not self.enabled or not fingerprint or price is None:
+            return
+        
+        with self._lock:
+            self.entries[self._next_id] = {
+                "symbol": symbol,
+                "bucket": self._bucket(symbol, price),
+                "hashes": dict(fingerprint),
+                "signal": dict(signal),
+                "created": now or time.time(),
+            }
+            self._next_id += 1
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        self._save()
+    
+    def _expire(self, now):
+        """Rimuove i segnali scaduti (da chiamare con il lock)"""
+        for entry_id in [i for i, e in self.entries.items() if now - e["created"] > self.ttl]:
+            del self.entries[entry_id]
+            self.evictions += 1
+    
+    def _load(self):
+        """Carica la cache da disco scartando i segnali scaduti"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Cache risposte non leggibile ({e}), riparto da zero")
+            return
+        
+        now = time.time()
+        for entry in data.get("entries", []):
+            if now - entry["created"] > self.ttl:
+                continue
+            # In JSON le chiavi sono stringhe e gli hash a 64 bit sono salvati in esadecimale
+            entry["hashes"] = {tf: int(h, 16) for tf, h in entry["hashes"].items()}
+            self.entries[self._next_id] = entry
+            self._next_id += 1
+        if self.entries:
+            print(f"♻️  Cache risposte: {len(self.entries)} segnali ancora validi da {self.path}")
+    
+    def _save(self):
+        """Scrive la cache su disco (scrittura atomica)"""
+        if not self.path:
+            return
+        
+        with self._lock:
+            entries = [dict(entry, hashes={tf: f"{h:016x}" for tf, h in entry["hashes"].items()})
+                       for entry in self.entries.values()]
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": entries}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️  Salvataggio cache risposte fallito: {e}")
+    
+    def clear(self):
+        """Svuota la cache (anche su disco)"""
+        with self._lock:
+            self.entries.clear()
+        self._save()
+    
+    def stats(self):
+        """
+        Contatori della cache (per /api/status)
+        
+        Returns:
+            Dizionario con hit, miss, evizioni, segnali scartati alla rivalidazione,
+            hit rate e segnali presenti
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "rejected": self.rejected,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            "entries": len(self.entries),
+        }
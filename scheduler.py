@@ -0,0 +1,226 @@
+"""
+Pianificazione dei cicli allineata alla chiusura delle candele
+
+I cicli partono su confini dell'orologio multipli dell'intervallo (es. ogni
+:00/:10 con intervallo 10), più un offset in secondi che lascia a TradingView
+il tempo di disegnare la candela appena chiusa. I confini sono calcolati
+dall'epoch UTC, come le barre intraday di TradingView, quindi la durata del
+ciclo non sposta mai gli avvii successivi.
+
+Se un ciclo sfora oltre lo slot successivo, gli slot persi non si accodano:
+con "skip" si attende il prossimo confine, con "coalesce" si esegue subito un
+solo ciclo al posto di tutti quelli persi. Ogni avvio registra il ritardo tra
+orario previsto ed effettivo.
+"""
+import math
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+OVERRUN_POLICIES = ("skip", "coalesce")
+
+# Attesa massima tra due controlli dell'orologio (segue le correzioni NTP)
+MAX_SLEEP = 1.0
+
+# Frazione minima del periodo concessa al ciclo d'avvio prima del primo confine
+STARTUP_MIN_BUDGET = 0.5
+
+
+class ScheduledRun:
+    """Un avvio pianificato"""
+    
+    def __init__(self, index, scheduled, started, next_slot, missed=0):
+        self.index = index
+        # Orari (epoch) previsto ed effettivo; scheduled è None per il ciclo d'avvio
+        self.scheduled = scheduled
+        self.started = started
+        self.next_slot = next_slot
+        # Slot persi e assorbiti da questo avvio
+        self.missed = missed
+        self.lag = started - scheduled if scheduled is not None else 0.0
+        # Scadenza del ciclo (time.monotonic): l'inizio dello slot successivo
+        self.deadline = time.monotonic() + (next_slot - started)
+        self.duration = None
+
+
+class CandleScheduler:
+    """Scheduler senza deriva allineato alle chiusure delle candele"""
+    
+    def __init__(self, interval_minutes, offset=5.0, overrun="skip", grace=30.0, window=200, name=None):
+        """
+        Inizializza lo scheduler
+        
+        Args:
+            interval_minutes: Intervallo tra i cicli (minuti), allineato alle candele
+            offset: Secondi dopo la chiusura della candela a cui avviare il ciclo
+            overrun: Slot persi per un ciclo troppo lungo: "skip" (attende il prossimo) o "coalesce" (uno subito)
+            grace: Ritardo (secondi) entro cui uno slot viene ancora eseguito
+            window: Avvii conservati per le statistiche di ritardo
+            name: Etichetta nei log (es. il simbolo, con più scheduler nello stesso processo)
+        """
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError(f"Politica di sforamento non valida: {overrun} (valori: {', '.join(OVERRUN_POLICIES)})")
+        self.interval_minutes = interval_minutes
+        self.period = interval_minutes * 60.0
+        self.offset = offset % self.period
+        self.overrun = overrun
+        self.grace = min(grace, self.period / 2)
+        self._prefix = f"[{name}] " if name else ""
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        
+        self._next = None
+        self.runs = 0
+        self.skipped = 0
+        self.coalesced = 0
+        self.overruns = 0
+        self.history = deque(maxlen=window)
+    
+    @classmethod
+    def from_env(cls, interval_minutes, name=None):
+        """
+        Crea lo scheduler dalle variabili d'ambiente
+        
+        SCHEDULE_OFFSET (5 secondi), SCHEDULE_OVERRUN (skip)
+        """
+        return cls(
+            interval_minutes,
+            offset=float(os.getenv("SCHEDULE_OFFSET", "5")),
+            overrun=os.getenv("SCHEDULE_OVERRUN", "skip").lower(),
+            name=name
+        )
+    
+    def slot_after(self, t):
+        """Primo slot (epoch) strettamente successivo a t"""
+        return (math.floor((t - self.offset) / self.period) + 1) * self.period + self.offset
+    
+    @property
+    def next_slot(self):
+        """Prossimo avvio previsto (epoch), None prima del ciclo d'avvio"""
+        return self._next
+    
+    def wait_next(self, block=True):
+        """
+        Attende il prossimo slot
+        
+        Il primo ciclo parte subito; i successivi sui confini delle candele. Se il
+        primo confine è troppo vicino (meno di STARTUP_MIN_BUDGET del periodo) viene
+        saltato, così il ciclo d'avvio non nasce già scaduto.
+        
+        Args:
+            block: False per non attendere: se lo slot non è ancora arrivato restituisce None
+                   (più scheduler controllati dallo stesso thread)
+        
+        Returns:
+            ScheduledRun dell'avvio, None se lo scheduler è stato fermato (o lo slot non è arrivato)
+        """
+        now = time.time()
+        missed = 0
+        if self._next is None:
+            # Ciclo d'avvio: subito, poi allineati al primo confine
+            scheduled = None
+        else:
+            scheduled = self._next
+            latest = self.slot_after(now) - self.period
+            if latest > scheduled:
+                # Il ciclo precedente ha sforato: gli slot intermedi non si accodano
+                missed = round((latest - scheduled) / self.period)
+                scheduled = latest
+            late = now - scheduled > self.grace
+            if self.overrun == "skip" and (missed or late):
+                if late:
+                    # Anche l'ultimo slot è troppo vecchio: si attende il prossimo confine
+                    missed += 1
+                    scheduled = self.slot_after(now)
+                    self._next = scheduled
+                print(f"⏭️  {self._prefix}Ciclo in ritardo: {missed} slot saltati, prossimo alle "
+                      f"{datetime.fromtimestamp(scheduled).strftime('%H:%M:%S')}")
+                with self._lock:
+                    self.skipped += missed
+                missed = 0
+            elif missed:
+                print(f"🔗 {self._prefix}{missed} slot persi accorpati in un solo ciclo")
+                with self._lock:
+                    self.coalesced += missed
+        
+        if scheduled is not None:
+            while True:
+                remaining = scheduled - time.time()
+                if remaining <= 0:
+                    break
+                if not block:
+                    return None
+                if self._stop.wait(min(remaining, MAX_SLEEP)):
+                    return None
+        if self._stop.is_set():
+            return None
+        
+        started = time.time()
+        next_slot = self.slot_after(started)
+        if scheduled is None and next_slot - started < self.period * STARTUP_MIN_BUDGET:
+            next_slot += self.period
+        with self._lock:
+            self.runs += 1
+            run = ScheduledRun(self.runs, scheduled, started, next_slot, missed)
+            self._next = next_slot
+        if scheduled is not None:
+            print(f"⏱️  {self._prefix}Avvio alle {datetime.fromtimestamp(started).strftime('%H:%M:%S')} "
+                  f"(previsto {datetime.fromtimestamp(scheduled).strftime('%H:%M:%S')}, ritardo {run.lag:.2f}s)")
+        return run
+    
+    def finish(self, run):
+        """
+        Registra la fine di un ciclo (durata e sforamento dello slot successivo)
+        
+        Args:
+            run: ScheduledRun restituito da wait_next
+        """
+        now = time.time()
+        run.duration = now - run.started
+        overran = now > run.next_slot
+        with self._lock:
+            if overran:
+                self.overruns += 1
+            self.history.append({
+                "scheduled": run.scheduled,
+                "started": run.started,
+                "lag_s": round(run.lag, 3),
+                "duration_s": round(run.duration, 1),
+                "missed": run.missed,
+                "overran": overran,
+            })
+        if overran:
+            print(f"⚠️  {self._prefix}Ciclo durato {run.duration:.0f}s: oltre lo slot delle "
+                  f"{datetime.fromtimestamp(run.next_slot).strftime('%H:%M:%S')}")
+    
+    def stop(self):
+        """Interrompe l'attesa in corso"""
+        self._stop.set()
+    
+    def stats(self):
+        """
+        Statistiche dello scheduler (per /api/status)
+        
+        Returns:
+            Dizionario con prossimo avvio, slot saltati/accorpati, sforamenti e ritardi
+        """
+        with self._lock:
+            lags = [entry["lag_s"] for entry in self.history if entry["scheduled"] is not None]
+            durations = [entry["duration_s"] for entry in self.history]
+            return {
+                "interval_min": self.interval_minutes,
+                "offset_s": self.offset,
+                "overrun_policy": self.overrun,
+                "next_run": datetime.fromtimestamp(self._next).isoformat(timespec="seconds") if self._next else None,
+                "runs": self.runs,
+                "skipped": self.skipped,
+                "coalesced": self.coalesced,
+                "overruns": self.overruns,
+                "last_lag_s": lags[-1] if lags else None,
+                "avg_lag_s": round(sum(lags) / len(lags), 3) if lags else None,
+                "max_lag_s": max(lags) if lags else None,
+                "avg_duration_s": round(sum(durations) / len(durations), 1) if durations else None,
+            }
@@ -0,0 +1,413 @@
+"""
+Pool di cattura multi-simbolo su un unico processo Chromium
+
+Invece di un TradingViewScraper (e quindi un browser) per simbolo, il pool
+avvia un solo Chromium e distribuisce i job (simbolo, timeframe) su un numero
+limitato di pagine, ognuna nel proprio contesto isolato.
+"""
+import os
+import time
+from collections import deque
+from datetime import datetime
+from playwright.sync_api import sync_playwright
+
+from tradingview_scraper import (
+    TradingViewScraper,
+    CHART_READY_PROBE_JS,
+    PRICE_FEED_MAX_AGE,
+    launch_chromium,
+    new_chart_page,
+    pending_chart_phase,
+)
+from frame_cache import FrameCache
+
+
+TIMEFRAMES = {
+    "60min": 60,
+    "15min": 15,
+    "1min": 1
+}
+
+
+def parse_timeframes(names):
+    """
+    Timeframe da una lista di nomi nel formato <N>min (es. ["240min", "60min", "5min"])
+    
+    Returns:
+        Dizionario {nome: minuti}, dal più lungo come TIMEFRAMES
+    
+    Raises:
+        ValueError: Se un nome non è nel formato <N>min
+    """
+    timeframes = {}
+    for name in names:
+        name = name.strip()
+        if not (name.endswith("min") and name[:-3].isdigit() and int(name[:-3]) > 0):
+            raise ValueError(f"Timeframe non valido: {name} (formato: <minuti>min, es. 15min)")
+        timeframes[name] = int(name[:-3])
+    if not timeframes:
+        raise ValueError("Nessun timeframe specificato")
+    return dict(sorted(timeframes.items(), key=lambda item: -item[1]))
+
+
+# Avvia la navigazione senza attenderla: il documento nuovo non ha il marcatore
+START_NAVIGATION_JS = """
+url => {
+    window.__poolNavigating = true;
+    window.location.href = url;
+}
+"""
+
+# Vero finché la pagina mostra ancora il documento precedente
+NAVIGATION_PENDING_JS = "() => window.__poolNavigating === true"
+
+
+class ScraperPool:
+    """Pool di pagine Playwright condiviso tra più simboli"""
+    
+    def __init__(self, max_pages=4, ready_timeout=30, nav_timeout=30, network_filter=None,
+                 image_pipeline=None, price_feed=None, browser_state=None, screenshot_store=None,
+                 frame_cache=None):
+        """
+        Inizializza il pool
+        
+        Args:
+            max_pages: Numero massimo di pagine (contesti) aperte contemporaneamente
+            ready_timeout: Scadenza (secondi) per la prontezza di ogni job
+            nav_timeout: Scadenza (secondi) entro cui la navigazione deve sostituire il documento
+            network_filter: NetworkFilter applicato a ogni contesto (opzionale)
+            image_pipeline: ImagePipeline per gli screenshot (opzionale)
+            price_feed: PriceFeed condiviso da tutte le pagine del pool (opzionale)
+            browser_state: BrowserState con storage state e cache asset (opzionale)
+            screenshot_store: ScreenshotStore in cui registrare i frame catturati (opzionale)
+            frame_cache: FrameCache condivisa dai simboli del pool (default: 60min e 15min
+                         riutilizzati finché la candela è aperta)
+        """
+        self.max_pages = max(1, int(max_pages))
+        self.ready_timeout = ready_timeout
+        self.nav_timeout = nav_timeout
+        self.network_filter = network_filter
+        self.image_pipeline = image_pipeline
+        self.price_feed = price_feed
+        self.browser_state = browser_state
+        self.screenshot_store = screenshot_store
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache()
+        self.playwright = None
+        self.browser = None
+        
+        # Slot di pagine riutilizzati tra i job
+        self.slots = []
+        
+        # Scraper per simbolo (condividono il browser del pool) {symbol: TradingViewScraper}
+        self.scrapers = {}
+        
+        # Timeframe catturati per simbolo {symbol: {tf_name: minuti}}
+        self.timeframes = {}
+        
+        # Errori dell'ultima cattura {symbol: {timeframe: motivo}}
+        self.errors = {}
+    
+    def add_symbol(self, symbol, broker="EIGHTCAP", timeframes=None):
+        """
+        Registra un simbolo da catturare
+        
+        Args:
+            symbol: Simbolo del CFD (es. XAUUSD)
+            broker: Broker (es. EIGHTCAP)
+            timeframes: Timeframe del simbolo {nome: minuti} (default: TIMEFRAMES)
+        """
+        self.timeframes[symbol] = dict(timeframes or TIMEFRAMES)
+        self.scrapers[symbol] = TradingViewScraper(
+            symbol=symbol,
+            broker=broker,
+            ready_timeout=self.ready_timeout,
+            browser=self.browser,
+            network_filter=self.network_filter,
+            image_pipeline=self.image_pipeline,
+            price_feed=self.price_feed,
+            browser_state=self.browser_state,
+            frame_cache=self.frame_cache
+        )
+    
+    def _init_browser(self):
+        """Avvia Playwright, il browser condiviso e gli slot di pagine"""
+        self.playwright = sync_playwright().start()
+        self.browser = launch_chromium(self.playwright)
+        
+        for scraper in self.scrapers.values():
+            scraper.browser = self.browser
+            scraper.shared_browser = True
+        
+        print(f"    ✓ Browser condiviso avviato (max {self.max_pages} pagine)")
+    
+    def _new_slot_page(self):
+        """Crea una pagina in un contesto dedicato per uno slot"""
+        return new_chart_page(self.browser, self.network_filter, self.price_feed, self.browser_state)
+    
+    def _reset_slot(self, slot):
+        """
+        Sostituisce la pagina di uno slot (es. dopo un job bloccato)
+        
+        Args:
+            slot: Slot da ripristinare
+        
+        Returns:
+            False se non è stato possibile aprire una pagina nuova (lo slot resta senza pagina)
+        """
+        try:
+            slot["page"].context.close()
+        except Exception:
+            pass
+        slot["page"] = self._open_slot_page()
+        return slot["page"] is not None
+    
+    def _open_slot_page(self):
+        """
+        Apre la pagina di uno slot senza propagare gli errori
+        
+        Returns:
+            Pagina o None se il browser non riesce ad aprirla (lo slot resta inutilizzabile)
+        """
+        try:
+            return self._new_slot_page()
+        except Exception as e:
+            print(f"  ⚠️  Impossibile aprire la pagina di uno slot: {str(e)[:80]}")
+            return None
+    
+    def _next_job(self, queues, order):
+        """
+        Estrae il prossimo job con scheduling round-robin tra i simboli
+        
+        Args:
+            queues: Code di job per simbolo {symbol: deque[(tf_name, tf_value)]}
+            order: Coda dei simboli nell'ordine di turno
+        
+        Returns:
+            Tupla (symbol, tf_name, tf_value) o None se non ci sono job
+        """
+        for _ in range(len(order)):
+            symbol = order[0]
+            order.rotate(-1)
+            if queues[symbol]:
+                tf_name, tf_value = queues[symbol].popleft()
+                return symbol, tf_name, tf_value
+        return None
+    
+    def capture(self, output_dir="screenshots", symbols=None):
+        """
+        Cattura tutti i timeframe dei simboli registrati
+        
+        Le navigazioni partono senza attendere il caricamento e la prontezza di
+        ogni slot si controlla a turno: un job lento o bloccato occupa solo il
+        proprio slot fino alla scadenza, gli altri continuano a caricare e
+        fotografare gli altri simboli.
+        
+        Args:
+            output_dir: Directory dove salvare gli screenshot
+            symbols: Sottoinsieme di simboli da catturare (default: tutti)
+        
+        Returns:
+            Dizionario {symbol: (screenshots_dict, current_price)} come
+            TradingViewScraper.capture_all_timeframes; i motivi dei fallimenti
+            sono in self.errors
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        
+        if self.browser is None:
+            self._init_browser()
+        
+        symbols = list(symbols or self.scrapers.keys())
+        now = time.time()
+        timestamp = datetime.fromtimestamp(now).strftime("%Y%m%d_%H%M%S")
+        extension = self.image_pipeline.extension if self.image_pipeline else ".png"
+        
+        queues = {symbol: deque() for symbol in symbols}
+        order = deque(symbols)
+        results = {symbol: ({tf_name: None for tf_name in self.timeframes[symbol]}, None) for symbol in symbols}
+        # Il prezzo si legge dalla pagina del timeframe più breve
+        price_timeframe = {symbol: min(self.timeframes[symbol], key=self.timeframes[symbol].get) for symbol in symbols}
+        captured = {symbol: set() for symbol in symbols}
+        self.errors = {symbol: {} for symbol in symbols}
+        
+        # Solo i timeframe senza un frame valido per la candela corrente vanno caricati
+        for symbol in symbols:
+            reference_price = None
+            if self.price_feed is not None:
+                reference_price = self.price_feed.price(symbol, max_age=PRICE_FEED_MAX_AGE, broker=self.scrapers[symbol].broker)
+            for tf_name, tf_value in self.timeframes[symbol].items():
+                cached_path = self.frame_cache.get(symbol, tf_name, tf_value, reference_price, now)
+                if cached_path:
+                    results[symbol][0][tf_name] = cached_path
+                else:
+                    queues[symbol].append((tf_name, tf_value))
+        
+        # Gli slot rimasti senza pagina (ripristino fallito) si riaprono; un errore lascia
+        # lo slot senza pagina e i job falliscono solo se non resta nessuno slot utilizzabile
+        for slot in self.slots:
+            if slot["page"] is None:
+                slot["page"] = self._open_slot_page()
+        while len(self.slots) < self.max_pages:
+            self.slots.append({"page": self._open_slot_page(), "job": None})
+        
+        print("="*70)
+        print(f"🚀 CATTURA POOL - {len(symbols)} simboli, {self.max_pages} pagine")
+        print("="*70)
+        
+        def fail(slot, reason):
+            symbol, tf_name = slot["job"][0], slot["job"][1]
+            print(f"  ❌ [{symbol} {tf_name}] {reason}")
+            self.errors[symbol][tf_name] = reason
+            slot["job"] = None
+        
+        while True:
+            # Avvia i nuovi job sugli slot liberi senza attendere la navigazione
+            for slot in self.slots:
+                if slot["job"] is not None or slot["page"] is None:
+                    continue
+                job = self._next_job(queues, order)
+                if job is None:
+                    break
+                symbol, tf_name, tf_value = job
+                url = self.scrapers[symbol]._build_url_with_studies(tf_value)
+                started = time.monotonic()
+                slot["job"] = (symbol, tf_name, started + self.ready_timeout, started + self.nav_timeout)
+                try:
+                    slot["page"].evaluate(START_NAVIGATION_JS, url)
+                except Exception as e:
+                    # Il documento può essere sostituito prima che evaluate risponda
+                    if "context was destroyed" not in str(e).lower():
+                        fail(slot, f"errore navigazione: {str(e)[:80]}")
+                        self._reset_slot(slot)
+            
+            busy = [slot for slot in self.slots if slot["job"] is not None]
+            if not busy:
+                if any(queues.values()) and not any(slot["page"] is not None for slot in self.slots):
+                    # Nessuno slot utilizzabile (browser chiuso): i job rimasti falliscono
+                    for symbol, queue in queues.items():
+                        while queue:
+                            tf_name, _ = queue.popleft()
+                            print(f"  ❌ [{symbol} {tf_name}] browser non disponibile")
+                            self.errors[symbol][tf_name] = "browser non disponibile"
+                break
+            
+            # Controlla lo stato di ogni job in corso senza bloccare gli altri
+            progressed = False
+            for slot in busy:
+                symbol, tf_name, deadline, nav_deadline = slot["job"]
+                page = slot["page"]
+                try:
+                    if page.evaluate(NAVIGATION_PENDING_JS):
+                        # Ancora il documento precedente: la navigazione non ha risposto
+                        if time.monotonic() >= nav_deadline:
+                            fail(slot, f"navigazione non avviata entro {self.nav_timeout}s")
+                            self._reset_slot(slot)
+                            progressed = True
+                        continue
+                    state = page.evaluate(CHART_READY_PROBE_JS)
+                except Exception as e:
+                    # Durante la navigazione il contesto JS può non esistere ancora
+                    if time.monotonic() >= deadline:
+                        fail(slot, f"sonda fallita: {str(e)[:80]}")
+                        self._reset_slot(slot)
+                        progressed = True
+                    continue
+                
+                if state.get("error"):
+                    fail(slot, state["error"])
+                    progressed = True
+                    continue
+                
+                phase = pending_chart_phase(state)
+                if phase is not None:
+                    if time.monotonic() >= deadline:
+                        fail(slot, f"fase '{phase}' non completata entro {self.ready_timeout}s")
+                        self._reset_slot(slot)
+                        progressed = True
+                    continue
+                
+                scraper = self.scrapers[symbol]
+                output_path = os.path.join(output_dir, f"{timestamp}_{symbol}_{tf_name}{extension}")
+                try:
+                    scraper._clean_interface(page)
+                    scraper._take_screenshot(page, output_path)
+                    if self.screenshot_store is not None:
+                        output_path = self.screenshot_store.put(symbol, tf_name, output_path)
+                    results[symbol][0][tf_name] = output_path
+                    captured[symbol].add(tf_name)
+                    print(f"  ✅ [{symbol} {tf_name}] Salvato: {output_path}")
+                    
+                    if tf_name == price_timeframe[symbol]:
+                        price = None
+                        if self.price_feed is not None:
+                            price = self.price_feed.price(symbol, max_age=PRICE_FEED_MAX_AGE, broker=self.scrapers[symbol].broker)
+                        if price is None:
+                            price = scraper._extract_current_price(page)
+                        results[symbol] = (results[symbol][0], price)
+                    slot["job"] = None
+                except Exception as e:
+                    fail(slot, f"errore screenshot: {str(e)[:80]}")
+                    self._reset_slot(slot)
+                progressed = True
+            
+            if not progressed:
+                time.sleep(0.25)
+        
+        # I frame nuovi restano validi fino alla chiusura della loro candela
+        for symbol in symbols:
+            screenshots, price = results[symbol]
+            for tf_name in captured[symbol]:
+                self.frame_cache.put(symbol, tf_name, self.timeframes[symbol][tf_name], screenshots[tf_name], price, now)
+        
+        # Riepilogo per simbolo
+        print("="*70)
+        for symbol in symbols:
+            screenshots, price = results[symbol]
+            ok = sum(1 for path in screenshots.values() if path)
+            print(f"   {symbol:10s} {ok}/{len(screenshots)} screenshot, prezzo: {price}")
+        if self.network_filter is not None:
+            self.network_filter.report()
+        if self.image_pipeline is not None:
+            self.image_pipeline.report()
+        pages = [slot["page"] for slot in self.slots if slot["page"] is not None]
+        if self.browser_state is not None and pages:
+            self.browser_state.save(pages[0].context)
+        print("="*70)
+        
+        return results
+    
+    def close(self):
+        """Chiude il browser condiviso e Playwright"""
+        if self.browser:
+            try:
+                self.browser.close()
+            except:
+                pass
+        
+        if self.playwright:
+            try:
+                self.playwright.stop()
+            except:
+                pass
+        
+        self.browser = None
+        self.slots = []
+
+
+if __name__ == "__main__":
+    # Test del modulo
+    pool = ScraperPool(max_pages=4)
+    for symbol in ["XAUUSD", "EURUSD", "US30"]:
+        pool.add_symbol(symbol, broker="EIGHTCAP")
+    
+    try:
+        results = pool.capture()
+        
+        for symbol, (screenshots, price) in results.items():
+            print(f"\n{symbol} (prezzo: {price}):")
+            for tf, path in screenshots.items():
+                if path:
+                    print(f"  ✅ {tf}: {path}")
+                else:
+                    print(f"  ❌ {tf}: {pool.errors[symbol].get(tf, 'ERRORE')}")
+    finally:
+        pool.close()
@@ -0,0 +1,367 @@
+"""
+Archivio degli screenshot con deduplicazione, retention e compattazione
+
+Gli screenshot vengono salvati per contenuto (objects/<hash[:2]>/<hash><ext>):
+due frame identici occupano lo stesso file. Un indice in memoria (persistito in
+index.json) tiene l'ultimo frame per (simbolo, timeframe), leggibile in O(1).
+Un thread in background sposta i frame più vecchi in archivi zip giornalieri e
+applica la retention per età e dimensione totale.
+"""
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+from datetime import datetime
+
+
+class ScreenshotStore:
+    """Archivio content-addressed degli screenshot con indice dell'ultimo frame"""
+    
+    def __init__(self, root_dir, retention_hours=48, max_size_mb=1000, archive_after_hours=6,
+                 compact_interval=600):
+        """
+        Inizializza l'archivio
+        
+        Args:
+            root_dir: Directory radice (es. /app/screenshots)
+            retention_hours: Età massima dei frame, archiviati compresi (0 = illimitata)
+            max_size_mb: Dimensione massima totale di frame e archivi (0 = illimitata)
+            archive_after_hours: Età oltre la quale un frame viene spostato negli archivi
+            compact_interval: Secondi tra due passate di compattazione in background
+        """
+        self.root_dir = root_dir
+        self.objects_dir = os.path.join(root_dir, "objects")
+        self.archives_dir = os.path.join(root_dir, "archives")
+        self.index_path = os.path.join(root_dir, "index.json")
+        self.retention_hours = retention_hours
+        self.max_size_mb = max_size_mb
+        self.archive_after_hours = archive_after_hours
+        self.compact_interval = compact_interval
+        
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        
+        # Frame registrati, in ordine di cattura: {symbol, timeframe, timestamp, object, archive}
+        self.entries = []
+        
+        # Ultimo frame per simbolo e timeframe {(symbol, timeframe): entry}
+        self.latest = {}
+        
+        self.dedup_hits = 0
+        self.bytes_saved = 0
+        
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.archives_dir, exist_ok=True)
+        self._load_index()
+        
+        # Byte occupati da oggetti e archivi: aggiornati a ogni scrittura, ricalcolati da compact()
+        self.disk_bytes = self._disk_usage()
+    
+    @classmethod
+    def from_env(cls, root_dir):
+        """
+        Crea l'archivio dalle variabili d'ambiente
+        
+        SCREENSHOT_RETENTION_HOURS (48), SCREENSHOT_MAX_MB (1000),
+        SCREENSHOT_ARCHIVE_AFTER_HOURS (6)
+        
+        Args:
+            root_dir: Directory radice degli screenshot
+        """
+        return cls(
+            root_dir,
+            retention_hours=float(os.getenv("SCREENSHOT_RETENTION_HOURS", "48")),
+            max_size_mb=int(os.getenv("SCREENSHOT_MAX_MB", "1000")),
+            archive_after_hours=float(os.getenv("SCREENSHOT_ARCHIVE_AFTER_HOURS", "6"))
+        )
+    
+    def _load_index(self):
+        """Carica l'indice da disco (un indice illeggibile viene ricostruito vuoto)"""
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("entries", [])
+        except (OSError, ValueError):
+            self.entries = []
+        
+        self.latest = {}
+        for entry in self.entries:
+            self.latest[(entry["symbol"], entry["timeframe"])] = entry
+    
+    def _save_index(self):
+        """Scrive l'indice in modo atomico"""
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"entries": self.entries}, f)
+        os.replace(tmp_path, self.index_path)
+    
+    def _object_path(self, name):
+        """Percorso di un oggetto nell'archivio (name = hash + estensione)"""
+        return os.path.join(self.objects_dir, name[:2], name)
+    
+    def put(self, symbol, timeframe, source_path, timestamp=None):
+        """
+        Registra uno screenshot appena catturato
+        
+        Il file sorgente viene spostato nell'archivio (o eliminato se un frame
+        identico è già presente).
+        
+        Args:
+            symbol: Simbolo (es. XAUUSD)
+            timeframe: Nome del timeframe (es. 15min)
+            source_path: Percorso dello screenshot appena scritto
+            timestamp: Istante della cattura (default: ora)
+        
+        Returns:
+            Percorso definitivo del frame nell'archivio
+        """
+        with open(source_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        name = digest + os.path.splitext(source_path)[1]
+        object_path = self._object_path(name)
+        
+        with self._lock:
+            if os.path.exists(object_path):
+                self.bytes_saved += os.path.getsize(source_path)
+                self.dedup_hits += 1
+                os.remove(source_path)
+                print(f"   ♻️  [{timeframe}] Frame identico già in archivio (deduplicato)")
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                shutil.move(source_path, object_path)
+                self.disk_bytes += os.path.getsize(object_path)
+            
+            entry = {
+                "symbol": symbol,
+                "timeframe": timeframe,
+                "timestamp": (timestamp or datetime.now()).timestamp(),
+                "object": name,
+                "archive": None,
+            }
+            self.entries.append(entry)
+            self.latest[(symbol, timeframe)] = entry
+            self._save_index()
+        
+        return object_path
+    
+    def latest_path(self, symbol, timeframe):
+        """
+        Percorso dell'ultimo frame di un simbolo/timeframe
+        
+        Returns:
+            Percorso del file o None se assente (o già archiviato)
+        """
+        entry = self.latest.get((symbol, timeframe))
+        if entry is None or entry["archive"]:
+            return None
+        return self._object_path(entry["object"])
+    
+    def read(self, entry):
+        """
+        Legge i byte di un frame, dall'archivio zip se già compattato
+        
+        Args:
+            entry: Voce dell'indice
+        
+        Returns:
+            Byte dell'immagine
+        """
+        if entry["archive"]:
+            with zipfile.ZipFile(os.path.join(self.archives_dir, entry["archive"])) as archive:
+                return archive.read(entry["object"])
+        with open(self._object_path(entry["object"]), "rb") as f:
+            return f.read()
+    
+    def start(self):
+        """Avvia la compattazione periodica in un thread in background"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="screenshot-compactor", daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Ferma il thread di compattazione"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _run(self):
+        """Ciclo del thread di compattazione"""
+        while not self._stop.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                print(f"⚠️  Compattazione screenshot fallita: {e}")
+    
+    def compact(self):
+        """
+        Archivia i frame vecchi e applica la retention
+        
+        Returns:
+            Tupla (frame_archiviati, voci_eliminate)
+        """
+        now = time.time()
+        with self._lock:
+            archived = self._archive_old(now)
+            removed = self._apply_retention(now)
+            self._save_index()
+        if archived or removed:
+            print(f"🗜️  Screenshot: {archived} frame archiviati, {removed} eliminati dalla retention")
+        return archived, removed
+    
+    def _protected(self):
+        """Oggetti referenziati dall'ultimo frame di ogni simbolo/timeframe"""
+        return {entry["object"] for entry in self.latest.values()}
+    
+    def _archive_old(self, now):
+        """Sposta in zip giornalieri i frame più vecchi di archive_after_hours"""
+        if not self.archive_after_hours:
+            return 0
+        
+        cutoff = now - self.archive_after_hours * 3600
+        protected = self._protected()
+        
+        # Un oggetto si archivia solo se tutte le voci che lo usano sono vecchie
+        newest = {}
+        for entry in self.entries:
+            if not entry["archive"]:
+                newest[entry["object"]] = max(newest.get(entry["object"], 0), entry["timestamp"])
+        
+        archived = 0
+        for entry in self.entries:
+            name = entry["object"]
+            if entry["archive"] or name in protected or newest.get(name, now) > cutoff:
+                continue
+            
+            archive_name = datetime.fromtimestamp(entry["timestamp"]).strftime("%Y-%m-%d") + ".zip"
+            archive_path = os.path.join(self.archives_dir, archive_name)
+            object_path = self._object_path(name)
+            
+            if os.path.exists(object_path):
+                archive_size = os.path.getsize(archive_path) if os.path.exists(archive_path) else 0
+                with zipfile.ZipFile(archive_path, "a", compression=zipfile.ZIP_DEFLATED) as archive:
+                    if name not in archive.namelist():
+                        archive.write(object_path, arcname=name)
+                self.disk_bytes += os.path.getsize(archive_path) - archive_size - os.path.getsize(object_path)
+                os.remove(object_path)
+                archived += 1
+            
+            # Tutte le voci dello stesso oggetto puntano ora allo stesso archivio
+            for other in self.entries:
+                if other["object"] == name and not other["archive"]:
+                    other["archive"] = archive_name
+        
+        return archived
+    
+    def _apply_retention(self, now):
+        """Elimina le voci oltre retention_hours e, se serve, le più vecchie fino a max_size_mb"""
+        protected = self._protected()
+        before = len(self.entries)
+        
+        if self.retention_hours:
+            cutoff = now - self.retention_hours * 3600
+            self.entries = [entry for entry in self.entries
+                            if entry["timestamp"] >= cutoff or entry["object"] in protected]
+        
+        self._remove_unreferenced()
+        
+        # Unica scansione completa del disco: riallinea il contatore, poi aggiornato con i file eliminati
+        self.disk_bytes = self._disk_usage()
+        
+        if self.max_size_mb:
+            limit = self.max_size_mb * 1024 * 1024
+            if self.disk_bytes > limit:
+                by_object = {}
+                archive_refs = {}
+                for entry in self.entries:
+                    by_object.setdefault(entry["object"], []).append(entry)
+                    if entry["archive"]:
+                        archive_refs[entry["archive"]] = archive_refs.get(entry["archive"], 0) + 1
+                
+                # Dal frame più vecchio: un oggetto va eliminato con tutte le sue voci
+                removed = set()
+                for entry in self.entries:
+                    if self.disk_bytes <= limit:
+                        break
+                    name = entry["object"]
+                    if name in protected or name in removed:
+                        continue
+                    removed.add(name)
+                    self._delete_object(name, by_object[name], archive_refs)
+                self.entries = [entry for entry in self.entries if entry["object"] not in removed]
+        
+        return before - len(self.entries)
+    
+    def _delete_object(self, name, entries, archive_refs):
+        """
+        Elimina da disco un oggetto e gli archivi rimasti senza voci
+        
+        Args:
+            name: Oggetto da eliminare
+            entries: Voci dell'indice che usano l'oggetto
+            archive_refs: Voci per archivio {archive: n}, aggiornato
+        
+        Returns:
+            Byte liberati
+        """
+        freed = 0
+        paths = []
+        for entry in entries:
+            if not entry["archive"]:
+                paths.append(self._object_path(name))
+                continue
+            archive_refs[entry["archive"]] -= 1
+            if archive_refs[entry["archive"]] == 0:
+                paths.append(os.path.join(self.archives_dir, entry["archive"]))
+        
+        for path in set(paths):
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                freed += size
+            except OSError:
+                pass
+        self.disk_bytes -= freed
+        return freed
+    
+    def _remove_unreferenced(self):
+        """Cancella oggetti e archivi non più referenziati dall'indice"""
+        live_objects = {entry["object"] for entry in self.entries if not entry["archive"]}
+        live_archives = {entry["archive"] for entry in self.entries if entry["archive"]}
+        
+        for root, _, files in os.walk(self.objects_dir):
+            for name in files:
+                if name not in live_objects:
+                    os.remove(os.path.join(root, name))
+        
+        for name in os.listdir(self.archives_dir):
+            if name not in live_archives:
+                os.remove(os.path.join(self.archives_dir, name))
+    
+    def _disk_usage(self):
+        """Byte occupati da oggetti e archivi"""
+        total = 0
+        for directory in (self.objects_dir, self.archives_dir):
+            for root, _, files in os.walk(directory):
+                total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+        return total
+    
+    def stats(self):
+        """
+        Stato dell'archivio (per /api/status)
+        
+        Returns:
+            Dizionario con numero di frame, deduplicazioni e spazio occupato
+        """
+        with self._lock:
+            return {
+                "frames": len(self.entries),
+                "archived": sum(1 for entry in self.entries if entry["archive"]),
+                "dedup_hits": self.dedup_hits,
+                "bytes_saved": self.bytes_saved,
+                "disk_mb": round(self.disk_bytes / 1024 / 1024, 1),
+            }
@@ -0,0 +1,34 @@
+"""
+Test del trigger su movimento di prezzo e volatilità
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_trigger import PriceTrigger
+
+
+class FakeFeed:
+    """PriceFeed con un prezzo impostato dal test"""
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def price(self, symbol, max_age=None, broker=None):
+        return self.value
+
+
+def test_volatility_spike_triggers_once():
+    feed = FakeFeed(2000.0)
+    trigger = PriceTrigger(feed, "XAUUSD", volatility=5, window=300, min_spacing=0, max_spacing=3600, poll=0)
+    assert trigger.wait().reason == "avvio"
+    
+    # Spike di 10 pips: supera la soglia di volatilità una volta sola
+    feed.value = 2001.0
+    assert trigger.wait().reason == "volatilità"
+    
+    for _ in range(5):
+        trigger.sample()
+        assert trigger.check() is None
+    assert trigger.by_reason == {"avvio": 1, "volatilità": 1}
@@ -7,11 +7,25 @@ per generare segnali di trading.
 """
 import os
 import sys
-import time
 import argparse
 from datetime import datetime
 from tradingview_scraper import TradingViewScraper
+from async_scraper import AsyncTradingViewScraper, AsyncScraperRunner, ENGINES
 from deepseek_analyzer import DeepSeekAnalyzer
+from network_filter import NetworkFilter, MODES as NET_FILTER_MODES
+from image_pipeline import ImagePipeline, FORMATS as IMAGE_FORMATS
+from price_feed import PriceFeed
+from browser_watchdog import BrowserWatchdog
+from browser_state import BrowserState
+from screenshot_store import ScreenshotStore
+from frame_cache import FrameCache
+from conversation_memory import ConversationMemory
+from response_cache import ResponseCache
+from analysis_pipeline import AnalysisPipeline
+from scheduler import CandleScheduler, OVERRUN_POLICIES
+from price_trigger import PriceTrigger
+from scraper_pool import ScraperPool
+from orchestrator import MultiSymbolOrchestrator, load_symbol_configs
 
 
 def print_signal(signal: dict):
@@ -33,8 +47,58 @@ def print_signal(signal: dict):
     print("\n" + "="*70 + "\n")
 
 
+def publish_signal(job):
+    """
+    Pubblica il segnale di un'analisi conclusa nella pipeline
+    
+    Args:
+        job: AnalysisJob con il segnale validato
+    """
+    print(f"✅ [{job.label}] Segnale ricevuto con successo")
+    print_signal(job.signal)
+
+
+def run_multi_symbol(configs, pool, analyzer, screenshot_store, args):
+    """
+    Loop multi-simbolo: un solo browser e un solo analizzatore per tutti i simboli
+    
+    Args:
+        configs: Lista di SymbolConfig
+        pool: ScraperPool condiviso
+        analyzer: DeepSeekAnalyzer condiviso
+        screenshot_store: ScreenshotStore degli screenshot
+        args: Argomenti da linea di comando (scheduler, pipeline, modalità)
+    """
+    orchestrator = MultiSymbolOrchestrator(configs, pool, analyzer, publish_signal,
+                                           screenshots_dir=args.screenshots_dir, offset=args.schedule_offset,
+                                           overrun=args.overrun, infer_workers=args.infer_workers)
+    if not args.once:
+        print(f"🔄 Avvio loop multi-simbolo ({len(configs)} simboli, allineato alle candele)")
+        print("   Premi Ctrl+C per terminare\n")
+        screenshot_store.start()
+    
+    try:
+        orchestrator.run(once=args.once)
+    except KeyboardInterrupt:
+        print("\n\n⏹️  Bot interrotto dall'utente")
+    finally:
+        print("💾 Chiusura browser condiviso...")
+        orchestrator.close()
+        if args.once:
+            screenshot_store.compact()
+        else:
+            screenshot_store.stop()
+        analyzer.close()
+        
+        for symbol, stats in orchestrator.stats().items():
+            print(f"   {symbol:10s} cicli {stats['runs']}, segnali {stats['signals']}, errori {stats['failures']}")
+        print("\n👋 Arrivederci!\n")
+
+
 def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str, 
-                       screenshots_dir: str = "screenshots", scraper: TradingViewScraper = None):
+                       screenshots_dir: str = "screenshots", scraper: TradingViewScraper = None,
+                       analyzer: DeepSeekAnalyzer = None, deadline: float = None,
+                       pipeline: AnalysisPipeline = None, cycle: int = None):
     """
     Esegue un ciclo completo di analisi
     
@@ -44,9 +108,14 @@ def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str,
         deepseek_api_key: Chiave API DeepSeek
         screenshots_dir: Directory per salvare gli screenshot
         scraper: Istanza TradingViewScraper riutilizzabile (opzionale)
+        analyzer: Istanza DeepSeekAnalyzer riutilizzabile, con connessioni keep-alive (opzionale)
+        deadline: Istante (time.monotonic) di fine ciclo: i tentativi verso l'API si fermano prima (opzionale)
+        pipeline: AnalysisPipeline a cui consegnare i grafici: l'analisi prosegue in background
+                  e il ciclo termina dopo la cattura (opzionale)
+        cycle: Numero del ciclo (per i log della pipeline)
     
     Returns:
-        True se successo, False altrimenti
+        True se successo (con pipeline: grafici consegnati), False altrimenti
     """
     print(f"\n🚀 Avvio ciclo di analisi - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
     print(f"   Simbolo: {symbol}")
@@ -54,6 +123,7 @@ def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str,
     
     # Inizializza scraper solo se non fornito
     scraper_created = False
+    analyzer_created = False
     if scraper is None:
         scraper = TradingViewScraper(symbol=symbol, broker=broker)
         scraper_created = True
@@ -82,10 +152,20 @@ def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str,
         if current_price:
             print(f"\n💰 Ultimo prezzo conosciuto: {current_price}")
         
+        if pipeline is not None:
+            # Preparazione, inferenza e pubblicazione in background: il browser torna subito libero
+            pipeline.submit(symbol, available_screenshots, current_price=current_price, deadline=deadline, cycle=cycle,
+                            broker=broker)
+            print("📨 Grafici consegnati alla pipeline di analisi")
+            return True
+        
         # Analizza con DeepSeek
         print("\n🤖 Analisi AI in corso...")
-        analyzer = DeepSeekAnalyzer(api_key=deepseek_api_key)
-        signal = analyzer.analyze_charts(available_screenshots, current_price=current_price, symbol=symbol)
+        if analyzer is None:
+            analyzer = DeepSeekAnalyzer(api_key=deepseek_api_key, price_feed=scraper.price_feed)
+            analyzer_created = True
+        signal = analyzer.analyze_charts(available_screenshots, current_price=current_price, symbol=symbol,
+                                         deadline=deadline, broker=broker)
         
         if signal:
             print("✅ Segnale ricevuto con successo")
@@ -102,6 +182,8 @@ def run_analysis_cycle(symbol: str, broker: str, deepseek_api_key: str,
         # Chiudi scraper solo se creato localmente
         if scraper_created:
             scraper.close()
+        if analyzer_created:
+            analyzer.close()
 
 
 def main():
@@ -115,6 +197,19 @@ def main():
         default="XAUUSD",
         help="Simbolo CFD da analizzare (default: XAUUSD)"
     )
+    parser.add_argument(
+        "--symbols",
+        type=str,
+        default=None,
+        help="Più simboli nello stesso processo: lista SIMBOLO[:BROKER][@MINUTI] separata da virgole "
+             "(es. XAUUSD,US30@15,EURUSD:OANDA@5) o file JSON con intervallo, timeframe e prompt per simbolo"
+    )
+    parser.add_argument(
+        "--max-pages",
+        type=int,
+        default=4,
+        help="Pagine del browser condiviso con --symbols (default: 4)"
+    )
     parser.add_argument(
         "--broker",
         type=str,
@@ -131,7 +226,50 @@ def main():
         "--interval",
         type=int,
         default=10,
-        help="Intervallo in minuti tra le analisi (default: 10)"
+        help="Intervallo in minuti tra le analisi, allineato alla chiusura delle candele (default: 10)"
+    )
+    parser.add_argument(
+        "--schedule-offset",
+        type=float,
+        default=5,
+        help="Secondi dopo la chiusura della candela a cui avviare la cattura (default: 5)"
+    )
+    parser.add_argument(
+        "--overrun",
+        choices=OVERRUN_POLICIES,
+        default="skip",
+        help="Se un ciclo sfora lo slot successivo: skip attende il prossimo confine, "
+             "coalesce esegue subito un solo ciclo al posto di quelli persi (default: skip)"
+    )
+    parser.add_argument(
+        "--trigger-pips",
+        type=float,
+        default=0,
+        help="Analisi quando il prezzo si sposta di almeno N pips dall'ultima, invece che a intervallo fisso (default: 0 = off)"
+    )
+    parser.add_argument(
+        "--trigger-volatility",
+        type=float,
+        default=0,
+        help="Analisi quando la volatilità realizzata nella finestra supera N pips (default: 0 = off)"
+    )
+    parser.add_argument(
+        "--trigger-window",
+        type=float,
+        default=300,
+        help="Finestra in secondi per la volatilità realizzata (default: 300)"
+    )
+    parser.add_argument(
+        "--min-spacing",
+        type=float,
+        default=60,
+        help="Secondi minimi tra due analisi in modalità trigger (default: 60)"
+    )
+    parser.add_argument(
+        "--max-spacing",
+        type=float,
+        default=None,
+        help="Secondi massimi tra due analisi in modalità trigger, anche senza movimento (default: intervallo)"
     )
     parser.add_argument(
         "--screenshots-dir",
@@ -139,6 +277,138 @@ def main():
         default="screenshots",
         help="Directory per salvare gli screenshot (default: screenshots)"
     )
+    parser.add_argument(
+        "--retention-hours",
+        type=float,
+        default=48,
+        help="Ore di conservazione degli screenshot, archivi compresi (default: 48, 0 = illimitata)"
+    )
+    parser.add_argument(
+        "--max-screenshots-mb",
+        type=int,
+        default=1000,
+        help="Spazio massimo occupato da screenshot e archivi in MB (default: 1000, 0 = illimitato)"
+    )
+    parser.add_argument(
+        "--frame-cache-timeframes",
+        type=str,
+        default="60min,15min",
+        help="Timeframe riutilizzati finché la candela è aperta, separati da virgola "
+             "(default: 60min,15min, vuoto = nessuna cache)"
+    )
+    parser.add_argument(
+        "--frame-cache-move-pct",
+        type=float,
+        default=0.15,
+        help="Movimento di prezzo (%%) che invalida un frame in cache prima della chiusura "
+             "della candela (default: 0.15, 0 = solo chiusura)"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=1,
+        help="Numero massimo di timeframe catturati in parallelo (default: 1 = sequenziale)"
+    )
+    parser.add_argument(
+        "--ready-timeout",
+        type=float,
+        default=30,
+        help="Scadenza in secondi per la prontezza del grafico (default: 30)"
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="sync",
+        help="Motore di cattura: sync (Playwright sync, con watchdog) o async (pagine in parallelo "
+             "su un event loop, senza watchdog né tab live) (default: sync)"
+    )
+    parser.add_argument(
+        "--live-tabs",
+        action="store_true",
+        help="Mantiene una tab aperta per timeframe tra i cicli (ricaricata solo se ferma o rotta)"
+    )
+    parser.add_argument(
+        "--net-filter",
+        choices=NET_FILTER_MODES,
+        default="off",
+        help="Filtro richieste di rete: off, on (block list), learn (registra i domini usati), "
+             "strict (solo domini appresi); il routing disattiva la cache HTTP del browser (default: off)"
+    )
+    parser.add_argument(
+        "--image-format",
+        choices=list(IMAGE_FORMATS),
+        default="jpeg",
+        help="Formato degli screenshot inviati all'AI (default: jpeg)"
+    )
+    parser.add_argument(
+        "--image-width",
+        type=int,
+        default=1280,
+        help="Larghezza massima degli screenshot in pixel, 0 = originale (default: 1280)"
+    )
+    parser.add_argument(
+        "--image-quality",
+        type=int,
+        default=80,
+        help="Qualità JPEG/WebP degli screenshot (default: 80)"
+    )
+    parser.add_argument(
+        "--no-clip",
+        action="store_true",
+        help="Non ritagliare gli screenshot all'area del grafico"
+    )
+    parser.add_argument(
+        "--max-rss-mb",
+        type=int,
+        default=1500,
+        help="Memoria massima (MB) dei processi Chromium prima del riciclo del browser (default: 1500)"
+    )
+    parser.add_argument(
+        "--browser-state-dir",
+        type=str,
+        default=os.getenv("BROWSER_STATE_DIR", ""),
+        help="Directory per cookie/consensi e cache asset del browser tra i riavvii "
+             "(default: BROWSER_STATE_DIR, vuoto = disattivato)"
+    )
+    parser.add_argument(
+        "--reset-browser-state",
+        action="store_true",
+        help="Cancella lo stato persistente del browser prima di avviare"
+    )
+    parser.add_argument(
+        "--memory-tokens",
+        type=int,
+        default=1000,
+        help="Budget di token dello storico compatto dei segnali inviato all'AI (default: 1000, 0 = nessuno storico)"
+    )
+    parser.add_argument(
+        "--response-cache-ttl",
+        type=float,
+        default=900,
+        help="Secondi per cui un segnale viene riusato se i grafici non cambiano (default: 900, 0 = disattivato)"
+    )
+    parser.add_argument(
+        "--response-cache-file",
+        type=str,
+        default=os.getenv("LLM_CACHE_FILE", ""),
+        help="File in cui conservare la cache dei segnali tra i riavvii (default: LLM_CACHE_FILE, vuoto = solo in memoria)"
+    )
+    parser.add_argument(
+        "--no-stream",
+        action="store_true",
+        help="Attende la risposta completa dell'AI invece di interromperla appena il segnale JSON è completo"
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="Analisi in pipeline: la cattura del ciclo successivo non attende la risposta dell'AI"
+    )
+    parser.add_argument(
+        "--infer-workers",
+        type=int,
+        default=2,
+        help="Analisi AI in corso contemporaneamente nella pipeline (default: 2)"
+    )
     parser.add_argument(
         "--once",
         action="store_true",
@@ -154,52 +424,174 @@ def main():
         print("   Usa --api-key oppure imposta la variabile d'ambiente FIREWORKS_API_KEY")
         sys.exit(1)
     
+    configs = None
+    if args.symbols:
+        try:
+            configs = load_symbol_configs(args.symbols, broker=args.broker, interval=args.interval)
+        except (OSError, ValueError) as e:
+            parser.error(f"--symbols: {e}")
+    
     print("="*70)
     print("🤖 TRADING BOT - Analisi automatica CFD con DeepSeek AI")
     print("="*70)
     print(f"\nConfigurazione:")
-    print(f"  - Simbolo: {args.symbol}")
-    print(f"  - Broker: {args.broker}")
-    print(f"  - Intervallo: {args.interval} minuti")
-    print(f"  - Directory screenshot: {args.screenshots_dir}")
+    if configs is not None:
+        print(f"  - Simboli: {len(configs)} (browser condiviso, max {args.max_pages} pagine)")
+        for config in configs:
+            print(f"      {config.broker}:{config.symbol} ogni {config.interval} minuti, "
+                  f"timeframe {', '.join(config.timeframes)}, prompt {config.prompt or config.symbol}")
+    else:
+        print(f"  - Simbolo: {args.symbol}")
+        print(f"  - Broker: {args.broker}")
+    print(f"  - Intervallo: {args.interval} minuti (chiusura candela + {args.schedule_offset:g}s, sforamenti: {args.overrun})")
+    if args.trigger_pips > 0 or args.trigger_volatility > 0:
+        print(f"  - Trigger: movimento {args.trigger_pips or '-'} pips, volatilità {args.trigger_volatility or '-'} pips "
+              f"in {args.trigger_window:g}s, spaziatura {args.min_spacing:g}-{args.max_spacing or args.interval * 60:g}s")
+    print(f"  - Directory screenshot: {args.screenshots_dir} "
+          f"(retention {args.retention_hours:g} h, max {args.max_screenshots_mb} MB)")
+    print(f"  - Cache frame: {args.frame_cache_timeframes or 'disattivata'} "
+          f"(invalidata oltre {args.frame_cache_move_pct}%)")
+    print(f"  - Motore di cattura: {args.engine}")
+    print(f"  - Cattura parallela: {args.concurrency} pagine")
+    print(f"  - Tab live: {'attive' if args.live_tabs else 'disattivate'}")
+    print(f"  - Filtro rete: {args.net_filter}")
+    print(f"  - Immagini: {args.image_format}, max {args.image_width}px, qualità {args.image_quality}"
+          f"{'' if args.no_clip else ', ritaglio grafico'}")
+    print(f"  - Stato browser: {args.browser_state_dir or 'non persistente'}")
+    print(f"  - Cache segnali: {f'{args.response_cache_ttl:g} s' if args.response_cache_ttl > 0 else 'disattivata'}"
+          f"{f' ({args.response_cache_file})' if args.response_cache_file else ''}")
+    print(f"  - Pipeline: {f'attiva ({args.infer_workers} analisi in parallelo)' if args.pipeline or configs else 'disattivata'}")
     print(f"  - Modalità: {'Singola esecuzione' if args.once else 'Loop continuo'}")
     print()
     
     # Crea directory screenshot se non esiste
     os.makedirs(args.screenshots_dir, exist_ok=True)
     
+    network_filter = NetworkFilter(mode=args.net_filter) if args.net_filter != "off" else None
+    price_feed = PriceFeed()
+    image_pipeline = ImagePipeline(
+        clip=not args.no_clip,
+        max_width=args.image_width,
+        fmt=args.image_format,
+        quality=args.image_quality
+    )
+    
+    browser_state = BrowserState(args.browser_state_dir) if args.browser_state_dir else None
+    if browser_state is not None and args.reset_browser_state:
+        browser_state.invalidate()
+    
+    frame_cache = FrameCache(
+        timeframes=[tf.strip() for tf in args.frame_cache_timeframes.split(",") if tf.strip()],
+        max_move_pct=args.frame_cache_move_pct
+    )
+    # Analizzatore condiviso tra i cicli: connessioni HTTP keep-alive e storico compatto dei segnali
+    analyzer = DeepSeekAnalyzer(api_key=api_key, price_feed=price_feed, stream=not args.no_stream,
+                                memory=ConversationMemory(max_tokens=args.memory_tokens),
+                                response_cache=ResponseCache(path=args.response_cache_file or None,
+                                                             ttl=args.response_cache_ttl))
+    
+    screenshot_store = ScreenshotStore(args.screenshots_dir, retention_hours=args.retention_hours,
+                                       max_size_mb=args.max_screenshots_mb)
+    
+    if configs is not None:
+        if args.engine != "sync":
+            print(f"⚠️  --engine {args.engine} ignorato con --symbols: il pool usa il motore sync")
+        # Tutti i simboli su un solo Chromium, con pagine assegnate a turno
+        pool = ScraperPool(max_pages=args.max_pages, ready_timeout=args.ready_timeout,
+                           network_filter=network_filter, image_pipeline=image_pipeline,
+                           price_feed=price_feed, browser_state=browser_state,
+                           screenshot_store=screenshot_store, frame_cache=frame_cache)
+        run_multi_symbol(configs, pool, analyzer, screenshot_store, args)
+        return
+    
+    # Pipeline: preparazione, inferenza e pubblicazione in thread propri, la cattura resta qui
+    pipeline = AnalysisPipeline(analyzer, publish_signal, infer_workers=args.infer_workers) if args.pipeline else None
+    
+    # Opzioni comuni ai due motori di cattura
+    scraper_options = dict(symbol=args.symbol, broker=args.broker, concurrency=args.concurrency,
+                           ready_timeout=args.ready_timeout, network_filter=network_filter,
+                           image_pipeline=image_pipeline, price_feed=price_feed, browser_state=browser_state,
+                           screenshot_store=screenshot_store, frame_cache=frame_cache)
+    
     if args.once:
         # Esegui una sola volta
-        run_analysis_cycle(
-            symbol=args.symbol,
-            broker=args.broker,
-            deepseek_api_key=api_key,
-            screenshots_dir=args.screenshots_dir
-        )
+        if args.engine == "async":
+            scraper = AsyncScraperRunner(AsyncTradingViewScraper(**scraper_options))
+        else:
+            scraper = TradingViewScraper(live_tabs=args.live_tabs, **scraper_options)
+        try:
+            run_analysis_cycle(
+                symbol=args.symbol,
+                broker=args.broker,
+                deepseek_api_key=api_key,
+                screenshots_dir=args.screenshots_dir,
+                scraper=scraper,
+                analyzer=analyzer,
+                pipeline=pipeline
+            )
+            if pipeline is not None:
+                pipeline.close()
+        finally:
+            scraper.close()
+            analyzer.close()
+            screenshot_store.compact()
     else:
         # Loop continuo
-        print(f"🔄 Avvio loop continuo (ogni {args.interval} minuti)")
+        print(f"🔄 Avvio loop continuo (ogni {args.interval} minuti, allineato alle candele)")
         print("   Premi Ctrl+C per terminare\n")
         
         cycle_count = 0
         
         # Crea scraper persistente per mantenere la cache
-        persistent_scraper = TradingViewScraper(symbol=args.symbol, broker=args.broker)
-        print("💾 Scraper persistente creato (cache 1H attiva)\n")
+        if args.engine == "async":
+            # Un solo event loop per tutta la sessione: le pagine async restano legate al loop che le crea
+            persistent_scraper = AsyncScraperRunner(AsyncTradingViewScraper(**scraper_options))
+            print("💾 Scraper async persistente creato (cache frame per candela attiva)")
+            print("⚠️  Motore async: watchdog browser non disponibile\n")
+        else:
+            persistent_scraper = TradingViewScraper(live_tabs=args.live_tabs, **scraper_options)
+            
+            # Watchdog: ricicla il browser su crash o memoria eccessiva, con standby pre-avviato
+            persistent_scraper = BrowserWatchdog(persistent_scraper, max_rss_mb=args.max_rss_mb)
+            print("💾 Scraper persistente creato (cache frame per candela attiva)")
+            print(f"🛡️  Watchdog browser attivo (max RSS {args.max_rss_mb} MB)\n")
+        
+        # Archiviazione e retention degli screenshot in background
+        screenshot_store.start()
+        
+        # Avvii sui confini delle candele: la durata del ciclo non sposta i successivi
+        scheduler = CandleScheduler(args.interval, offset=args.schedule_offset, overrun=args.overrun)
+        
+        # Con le soglie di trigger gli avvii seguono il prezzo invece dell'orologio
+        trigger = None
+        if args.trigger_pips > 0 or args.trigger_volatility > 0:
+            trigger = PriceTrigger(price_feed, args.symbol, pips=args.trigger_pips, volatility=args.trigger_volatility,
+                                   window=args.trigger_window, min_spacing=args.min_spacing,
+                                   max_spacing=args.max_spacing or args.interval * 60, broker=args.broker)
         
         try:
             while True:
+                if trigger is not None:
+                    # In attesa il browser resta attivo: i tick dei websocket arrivano al feed
+                    run = trigger.wait(pump=persistent_scraper.pump_events)
+                else:
+                    run = scheduler.wait_next()
                 cycle_count += 1
                 print(f"\n{'='*70}")
                 print(f"🔄 CICLO #{cycle_count}")
                 print(f"{'='*70}")
                 
+                # L'analisi deve concludersi prima dell'inizio dello slot successivo
                 success = run_analysis_cycle(
                     symbol=args.symbol,
                     broker=args.broker,
                     deepseek_api_key=api_key,
                     screenshots_dir=args.screenshots_dir,
-                    scraper=persistent_scraper  # ← Passa lo scraper persistente
+                    scraper=persistent_scraper,  # ← Passa lo scraper persistente
+                    analyzer=analyzer,
+                    deadline=run.deadline,
+                    pipeline=pipeline,
+                    cycle=cycle_count
                 )
                 
                 if success:
@@ -207,14 +599,47 @@ def main():
                 else:
                     print(f"⚠️  Ciclo #{cycle_count} completato con errori")
                 
-                # Attendi intervallo
-                next_run = datetime.now().timestamp() + (args.interval * 60)
-                next_run_str = datetime.fromtimestamp(next_run).strftime('%H:%M:%S')
+                browser_stats = persistent_scraper.stats()
+                print(f"🛡️  Browser: RSS {browser_stats['rss_mb']} MB, riavvii {browser_stats['restarts']}, "
+                      f"crash pagine {browser_stats['page_crashes']}")
+                http_stats = analyzer.transport.stats()
+                print(f"🔌 API: {http_stats['requests']} richieste, "
+                      f"{http_stats['connections_reused']} su connessioni riutilizzate, "
+                      f"latenza media {http_stats['avg_latency_ms']} ms")
+                if len(analyzer.backends) > 1:
+                    for backend_stats in analyzer.backend_stats():
+                        print(f"🔀 {backend_stats['name']}: {backend_stats['wins']} segnali usati, "
+                              f"{backend_stats['cancelled']} annullate, {backend_stats['failures']} errori, "
+                              f"p50 {backend_stats['p50_ms']} ms, p95 {backend_stats['p95_ms']} ms")
+                if pipeline is not None:
+                    pipeline_stats = pipeline.stats()
+                    print(f"🧵 Pipeline: {pipeline_stats['in_flight']} analisi in corso, "
+                          f"{pipeline_stats['signals']} segnali pubblicati, {pipeline_stats['expired']} scadute")
+                limiter_stats = analyzer.limiter.stats()
+                if limiter_stats['waits'] or limiter_stats['throttled']:
+                    print(f"🚦 Limitatore: concorrenza {limiter_stats['concurrency_limit']}, "
+                          f"{limiter_stats['waits']} attese ({limiter_stats['wait_time_s']}s), "
+                          f"{limiter_stats['throttled']} risposte 429")
+                cache_stats = analyzer.response_cache.stats()
+                if cache_stats['hits'] or cache_stats['misses']:
+                    print(f"♻️  Cache segnali: {cache_stats['hits']} hit, {cache_stats['misses']} miss "
+                          f"(hit rate {cache_stats['hit_rate']:.0%})")
                 
-                print(f"\n⏳ Prossima analisi alle {next_run_str} ({args.interval} minuti)")
+                if trigger is not None:
+                    trigger_stats = trigger.stats()
+                    print(f"⚡ Trigger: {trigger_stats['runs']} analisi (a intervallo fisso sarebbero "
+                          f"{trigger_stats['fixed_interval_runs']}), per motivo: "
+                          f"{', '.join(f'{reason} {count}' for reason, count in trigger_stats['by_reason'].items())}")
+                    next_run_str = datetime.fromtimestamp(trigger.next_forced()).strftime('%H:%M:%S')
+                    print(f"\n⏳ Prossima analisi al movimento del prezzo (al più tardi alle {next_run_str})")
+                else:
+                    scheduler.finish(run)
+                    next_run_str = datetime.fromtimestamp(scheduler.next_slot).strftime('%H:%M:%S')
+                    print(f"\n⏳ Prossima analisi alle {next_run_str} (candele da {args.interval} minuti)")
                 print("   Premi Ctrl+C per terminare")
                 
-                time.sleep(args.interval * 60)
+                # Browser di riserva del watchdog avviato tra un ciclo e l'altro
+                persistent_scraper.idle()
                 
         except KeyboardInterrupt:
             print("\n\n⏹️  Bot interrotto dall'utente")
@@ -223,7 +648,11 @@ def main():
         finally:
             # Chiudi lo scraper persistente
             print("💾 Chiusura scraper persistente...")
+            if pipeline is not None:
+                pipeline.close(timeout=60)
             persistent_scraper.close()
+            screenshot_store.stop()
+            analyzer.close()
             sys.exit(0)
 
 
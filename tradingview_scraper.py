@@ -2,56 +2,389 @@
 Modulo per catturare screenshot di TradingView con indicatori tecnici
 Versione Playwright - Molto più stabile e semplice in Docker
 """
+import re
 import time
 from datetime import datetime
 from playwright.sync_api import sync_playwright
 import os
 
+from frame_cache import FrameCache
+from price_feed import PRICE_FEED_MAX_AGE
+
+
+# Sonda JavaScript per lo stato di prontezza del grafico (una sola evaluate per controllo)
+CHART_READY_PROBE_JS = """
+() => {
+    const result = {canvas: false, studies: [], last_bar: false, last_bar_text: '', error: null};
+    
+    // Errori che non si risolvono aspettando
+    const bodyText = document.body ? document.body.innerText : '';
+    if (/simbolo non valido|invalid symbol|symbol doesn't exist/i.test(bodyText)) {
+        result.error = 'simbolo non valido';
+        return result;
+    }
+    
+    // 1) Canvas del grafico disegnato: almeno un canvas visibile con pixel non trasparenti
+    for (const canvas of document.querySelectorAll('.chart-container canvas, [class*="chart-markup-table"] canvas')) {
+        if (canvas.width < 100 || canvas.height < 100) continue;
+        try {
+            const ctx = canvas.getContext('2d');
+            if (!ctx) continue;
+            const w = Math.min(200, canvas.width), h = Math.min(200, canvas.height);
+            const data = ctx.getImageData((canvas.width - w) / 2, (canvas.height - h) / 2, w, h).data;
+            for (let i = 3; i < data.length; i += 16) {
+                if (data[i] !== 0) { result.canvas = true; break; }
+            }
+        } catch (e) {}
+        if (result.canvas) break;
+    }
+    
+    // 2) Pannelli degli indicatori presenti nella legenda
+    const titles = Array.from(document.querySelectorAll('[data-name="legend-source-title"], [data-name="legend-source-item"]'))
+        .map(el => (el.textContent || '').toUpperCase());
+    for (const name of ['EMA', 'MACD', 'RSI']) {
+        if (titles.some(t => t.includes(name))) result.studies.push(name);
+    }
+    
+    // 3) Ultima barra popolata: la legenda della serie principale mostra valori numerici
+    const values = document.querySelectorAll('[data-name="legend-series-item"] [class*="valueValue"], [data-name="legend-series-item"] [class*="valuesWrapper"]');
+    result.last_bar = Array.from(values).some(el => /[0-9]/.test(el.textContent || ''));
+    result.last_bar_text = Array.from(values).map(el => el.textContent || '').join(' ');
+    
+    return result;
+}
+"""
+
+# Indicatori che devono essere visibili prima dello screenshot
+REQUIRED_STUDIES = ("EMA", "MACD", "RSI")
+
+# Intervalli di prezzo plausibili per il fallback DOM, per simbolo
+PRICE_RANGES = {
+    "XAUUSD": (1000, 10000),
+}
+
+# Script di pulizia dell'interfaccia: dialog, modal e overlay che coprono il grafico
+CLEANUP_JS = """
+    // Rimuovi tutti i dialog
+    document.querySelectorAll('[role="dialog"]').forEach(el => el.remove());
+    
+    // Rimuovi modal wrapper
+    document.querySelectorAll('[class*="modal"]').forEach(el => {
+        if (!el.querySelector('canvas')) el.remove();
+    });
+    
+    // Rimuovi overlay/backdrop
+    document.querySelectorAll('[class*="overlay"], [class*="backdrop"]').forEach(el => el.remove());
+"""
+
+# Selettori DOM provati in ordine per il fallback del prezzo
+PRICE_SELECTORS = (
+    '[class*="last-"]',
+    '[class*="price-"]',
+    '[class*="lastPrice"]',
+    '.tv-symbol-price-quote__value',
+    '[data-name="legend-source-item"]'
+)
+
+
+def build_chart_url(symbol, broker, timeframe):
+    """
+    Costruisce URL con indicatori pre-caricati tramite parametri studies
+    
+    Args:
+        symbol: Simbolo del CFD (es. XAUUSD)
+        broker: Broker (es. EIGHTCAP)
+        timeframe: Timeframe (1, 15, 60)
+        
+    Returns:
+        URL completo
+    """
+    base_url = f"https://it.tradingview.com/chart/?symbol={broker}%3A{symbol}"
+    
+    # Parametri per gli indicatori
+    studies_param = "STD%3BMoving_Average_Exponential%2CSTD%3BMACD%2CSTD%3BRelative_Strength_Index"
+    
+    return f"{base_url}&interval={timeframe}&studies_overrides=%7B%7D&studies={studies_param}"
+
+
+def parse_price_text(text):
+    """
+    Estrae un valore numerico di prezzo dal testo di un elemento
+    
+    Args:
+        text: Testo dell'elemento (può essere None)
+        
+    Returns:
+        Prezzo come float o None
+    """
+    if not text:
+        return None
+    
+    # Cerca pattern di prezzo
+    price_match = re.search(r'([0-9]{1,5}[,\.]?[0-9]{1,3}\.?[0-9]{0,2})', text.replace(',', '').replace(' ', ''))
+    if not price_match:
+        return None
+    try:
+        return float(price_match.group(1))
+    except ValueError:
+        return None
+
+
+def is_plausible_price(price_value, price_range=None, reference=None):
+    """
+    Verifica che un valore letto dal DOM sia un prezzo plausibile
+    
+    Args:
+        price_value: Valore numerico estratto
+        price_range: Intervallo (min, max) configurato per il simbolo
+        reference: Ultimo prezzo noto, usato se non c'è un intervallo (±10%)
+        
+    Returns:
+        True se il valore è plausibile
+    """
+    if price_range is not None:
+        low, high = price_range
+        return low <= price_value <= high
+    if reference:
+        return abs(price_value - reference) <= reference * 0.1
+    return price_value > 0
+
+
+# Opzioni di avvio di Chromium headless adatte al container (API sync e async)
+CHROMIUM_LAUNCH_OPTIONS = {
+    "headless": True,
+    "args": [
+        '--no-sandbox',
+        '--disable-dev-shm-usage',
+        '--disable-gpu',
+        '--disable-software-rasterizer',
+    ],
+}
+
+
+def chart_context_options(browser_state=None):
+    """
+    Opzioni di browser.new_context() per le pagine del grafico (API sync e async)
+    
+    Args:
+        browser_state: BrowserState con lo storage state da ripristinare (opzionale)
+        
+    Returns:
+        Dizionario di opzioni con viewport e user agent
+    """
+    return {
+        "viewport": {'width': 1920, 'height': 1200},
+        "user_agent": 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        **(browser_state.context_options() if browser_state is not None else {})
+    }
+
+
+def launch_chromium(playwright):
+    """
+    Avvia Chromium headless con le opzioni adatte al container
+    
+    Args:
+        playwright: Istanza Playwright avviata
+        
+    Returns:
+        Browser Chromium
+    """
+    # Playwright gestisce automaticamente il browser!
+    return playwright.chromium.launch(**CHROMIUM_LAUNCH_OPTIONS)
+
+
+def new_chart_page(browser, network_filter=None, price_feed=None, browser_state=None):
+    """
+    Crea una pagina in un nuovo contesto isolato del browser
+    
+    Args:
+        browser: Browser Chromium
+        network_filter: NetworkFilter da installare sul contesto (opzionale)
+        price_feed: PriceFeed da collegare ai websocket della pagina (opzionale)
+        browser_state: BrowserState con storage state e cache asset da riutilizzare (opzionale)
+        
+    Returns:
+        Pagina Playwright con viewport e user agent configurati
+    """
+    # Crea un nuovo contesto browser con viewport specifico
+    context = browser.new_context(**chart_context_options(browser_state))
+    
+    # La cache asset va registrata prima del filtro: il filtro decide per primo
+    if browser_state is not None:
+        browser_state.install(context)
+    if network_filter is not None:
+        network_filter.install(context)
+    
+    page = context.new_page()
+    if price_feed is not None:
+        price_feed.attach(page)
+    
+    return page
+
+
+def pending_chart_phase(state):
+    """
+    Restituisce la prima fase di prontezza non ancora completata
+    
+    Args:
+        state: Risultato di CHART_READY_PROBE_JS
+        
+    Returns:
+        Nome della fase ('canvas', 'studies', 'last_bar') o None se il grafico è pronto
+    """
+    if not state["canvas"]:
+        return "canvas"
+    if not all(name in state["studies"] for name in REQUIRED_STUDIES):
+        return "studies"
+    if not state["last_bar"]:
+        return "last_bar"
+    return None
+
+
+class ChartNotReadyError(Exception):
+    """Il grafico non ha raggiunto lo stato di prontezza entro la scadenza"""
+    pass
+
 
 class TradingViewScraper:
     """Classe per catturare screenshot di grafici TradingView usando Playwright"""
     
-    def __init__(self, symbol="XAUUSD", broker="EIGHTCAP"):
+    def __init__(self, symbol="XAUUSD", broker="EIGHTCAP", concurrency=1, ready_timeout=30,
+                 live_tabs=False, live_tab_max_age=3600, live_tab_stale_after=300, browser=None,
+                 network_filter=None, image_pipeline=None, price_feed=None, price_range=None,
+                 browser_state=None, screenshot_store=None, frame_cache=None):
         """
         Inizializza lo scraper
         
         Args:
             symbol: Simbolo del CFD (es. XAUUSD)
             broker: Broker (es. EIGHTCAP)
+            concurrency: Numero massimo di timeframe caricati in parallelo
+                         (1 = cattura sequenziale sulla pagina principale)
+            ready_timeout: Scadenza massima (secondi) per la prontezza del grafico
+            live_tabs: Mantiene una pagina aperta per timeframe tra i cicli
+                       (il ciclo diventa solo screenshot + lettura prezzo)
+            live_tab_max_age: Secondi dopo i quali una tab viene comunque ricaricata
+            live_tab_stale_after: Secondi senza aggiornamenti dell'ultima barra
+                                  dopo i quali la tab è considerata ferma
+            browser: Browser Chromium condiviso (es. da ScraperPool); se fornito lo
+                     scraper apre solo i propri contesti e non lo chiude
+            network_filter: NetworkFilter applicato a ogni contesto (opzionale)
+            image_pipeline: ImagePipeline per ritaglio/ridimensionamento/codifica
+                            degli screenshot (opzionale, default: PNG a piena pagina)
+            price_feed: PriceFeed alimentato dai websocket delle pagine; se fornito
+                        il prezzo viene letto dalla cache e il DOM resta come fallback
+            price_range: Intervallo (min, max) di prezzi plausibili per il fallback DOM
+                         (default: da PRICE_RANGES per il simbolo, se presente)
+            browser_state: BrowserState per ripristinare cookie/consensi e servire gli
+                           asset statici dalla cache su disco (opzionale)
+            screenshot_store: ScreenshotStore in cui registrare i frame catturati
+                              (deduplicazione e retention; opzionale)
+            frame_cache: FrameCache dei frame per candela (default: 60min e 15min
+                         riutilizzati finché la candela è aperta)
         """
         self.symbol = symbol
         self.broker = broker
+        self.concurrency = max(1, int(concurrency))
+        self.ready_timeout = ready_timeout
         self.playwright = None
-        self.browser = None
+        self.browser = browser
+        self.shared_browser = browser is not None
+        self.network_filter = network_filter
+        self.image_pipeline = image_pipeline
+        self.price_feed = price_feed
+        self.price_range = price_range or PRICE_RANGES.get(symbol)
+        self.browser_state = browser_state
+        self.screenshot_store = screenshot_store
         self.page = None
         
-        # Cache per screenshot 1H
-        self.cached_1h_screenshot = None
-        self.cached_1h_hour = None  # Ora dell'ultimo screenshot 1H
+        # Tempi per fase dell'ultima attesa di prontezza {fase: secondi}
+        self.last_readiness = {}
+        
+        # Pagine di lavoro per la cattura concorrente (una per slot, riutilizzate tra i cicli)
+        self.worker_pages = []
+        
+        # Tab "live" persistenti per timeframe {tf_name: stato tab}
+        self.live_tabs = live_tabs
+        self.live_tab_max_age = live_tab_max_age
+        self.live_tab_stale_after = live_tab_stale_after
+        self.tabs = {}
+        
+        # Stato di salute delle pagine (usato anche da BrowserWatchdog)
+        self.crash_count = 0
+        self.crashed_pages = set()
+        
+        # Cache dei frame per (simbolo, timeframe, candela)
+        self.frame_cache = frame_cache if frame_cache is not None else FrameCache()
         
     def _init_browser(self):
-        """Inizializza Playwright e il browser"""
-        self.playwright = sync_playwright().start()
-        
-        # Playwright gestisce automaticamente il browser!
-        self.browser = self.playwright.chromium.launch(
-            headless=True,
-            args=[
-                '--no-sandbox',
-                '--disable-dev-shm-usage',
-                '--disable-gpu',
-                '--disable-software-rasterizer',
-            ]
-        )
-        
-        # Crea un nuovo contesto browser con viewport specifico
-        context = self.browser.new_context(
-            viewport={'width': 1920, 'height': 1200},
-            user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
-        )
-        
-        self.page = context.new_page()
+        """Inizializza Playwright e il browser (o solo la pagina se il browser è condiviso)"""
+        if self.browser is None:
+            self.playwright = sync_playwright().start()
+            self.browser = launch_chromium(self.playwright)
+        
+        self.page = self._new_page()
         print(f"    ✓ Browser Playwright inizializzato")
+    
+    def _new_page(self):
+        """
+        Crea una pagina in un nuovo contesto isolato dello stesso browser
+        
+        Returns:
+            Pagina Playwright con viewport e user agent configurati
+        """
+        page = new_chart_page(self.browser, self.network_filter, self.price_feed, self.browser_state)
+        page.on("crash", self._on_page_crash)
+        return page
+    
+    def _on_page_crash(self, page):
+        """Registra il crash di una pagina (il renderer non risponde più)"""
+        self.crash_count += 1
+        self.crashed_pages.add(page)
+        print(f"    💥 Crash della pagina rilevato ({self.crash_count} totali)")
+    
+    def _page_usable(self, page):
+        """Verifica che una pagina esista, sia aperta e non sia andata in crash"""
+        return page is not None and page not in self.crashed_pages and not page.is_closed()
+    
+    def _ensure_page(self):
+        """
+        Garantisce una pagina principale utilizzabile
+        
+        Ricrea la pagina se è in crash o chiusa, e rilancia il browser se si è
+        disconnesso (solo se non è condiviso).
+        """
+        if self.browser is not None and not self.browser.is_connected() and not self.shared_browser:
+            print(f"    ⚠️  Browser disconnesso, riavvio...")
+            self.replace_browser(launch_chromium(self.playwright))
+        
+        if self.browser is None:
+            self._init_browser()
+        elif not self._page_usable(self.page):
+            self.page = self._new_page()
+    
+    def replace_browser(self, browser):
+        """
+        Sostituisce il browser in uso (es. riciclo da parte di BrowserWatchdog)
+        
+        Chiude il browser precedente e dimentica tutte le pagine aperte su di esso;
+        la pagina principale viene ricreata sul nuovo browser.
+        
+        Args:
+            browser: Nuovo browser Chromium già avviato
+        """
+        old_browser = self.browser
+        self.browser = browser
+        self.worker_pages = []
+        self.tabs = {}
+        self.crashed_pages = set()
+        self.page = self._new_page()
+        
+        if old_browser is not None and not self.shared_browser:
+            try:
+                old_browser.close()
+            except Exception:
+                pass
         
     def _build_url_with_studies(self, timeframe):
         """
@@ -63,44 +396,116 @@ class TradingViewScraper:
         Returns:
             URL completo
         """
-        base_url = f"https://it.tradingview.com/chart/?symbol={self.broker}%3A{self.symbol}"
+        return build_chart_url(self.symbol, self.broker, timeframe)
+    
+    def _wait_for_chart_ready(self, page=None, deadline=None):
+        """
+        Attende che il grafico sia realmente pronto invece di un'attesa fissa
         
-        # Parametri per gli indicatori
-        studies_param = "STD%3BMoving_Average_Exponential%2CSTD%3BMACD%2CSTD%3BRelative_Strength_Index"
+        Le fasi sono verificate in ordine: canvas disegnato, pannelli degli
+        indicatori presenti, ultima barra popolata. Ogni fase registra la
+        propria durata in self.last_readiness.
         
-        url = f"{base_url}&interval={timeframe}&studies_overrides=%7B%7D&studies={studies_param}"
+        Args:
+            page: Pagina da controllare (default: pagina principale)
+            deadline: Istante assoluto (time.monotonic) oltre il quale fallire
+                      (default: ora + self.ready_timeout)
+            
+        Returns:
+            Dizionario {fase: secondi} con i tempi di ogni fase
+            
+        Raises:
+            ChartNotReadyError: scadenza superata o errore non recuperabile
+        """
+        page = page or self.page
+        start = time.monotonic()
+        if deadline is None:
+            deadline = start + self.ready_timeout
+        
+        timings = {}
+        phase_start = start
+        current = "canvas"
+        
+        while True:
+            state = page.evaluate(CHART_READY_PROBE_JS)
+            
+            if state.get("error"):
+                raise ChartNotReadyError(f"grafico non disponibile ({state['error']})")
+            
+            pending = pending_chart_phase(state)
+            if pending != current:
+                now = time.monotonic()
+                timings[current] = round(now - phase_start, 2)
+                phase_start = now
+                current = pending
+            if pending is None:
+                break
+            
+            if time.monotonic() >= deadline:
+                self.last_readiness = timings
+                detail = f"indicatori trovati: {', '.join(state['studies']) or 'nessuno'}" if current == "studies" else ""
+                raise ChartNotReadyError(
+                    f"fase '{current}' non completata entro {deadline - start:.1f}s {detail}".strip()
+                )
+            
+            time.sleep(0.25)
+        
+        timings["total"] = round(time.monotonic() - start, 2)
+        self.last_readiness = timings
+        return timings
+    
+    def _wait_for_load_and_clean(self, page=None, deadline=None):
+        """
+        Attende la prontezza del grafico e pulisce l'interfaccia
+        
+        Args:
+            page: Pagina da pulire (default: pagina principale)
+            deadline: Istante assoluto (time.monotonic) per la prontezza
+            
+        Raises:
+            ChartNotReadyError: se il grafico non è pronto entro la scadenza
+        """
+        page = page or self.page
         
-        return url
+        timings = self._wait_for_chart_ready(page, deadline=deadline)
+        
+        cleanup_start = time.monotonic()
+        self._clean_interface(page)
+        timings["cleanup"] = round(time.monotonic() - cleanup_start, 2)
+        self.last_readiness = timings
+        print(f"  ⏱️  Prontezza: " + ", ".join(f"{phase} {secs:.2f}s" for phase, secs in timings.items()))
     
-    def _wait_for_load_and_clean(self):
-        """Attende caricamento e pulisce l'interfaccia"""
-        # Attesa iniziale per caricamento
-        time.sleep(10)
+    def _clean_interface(self, page):
+        """
+        Chiude popup e rimuove dialog/overlay che coprirebbero il grafico
         
+        Args:
+            page: Pagina da pulire
+        """
         try:
             # Chiudi popup con Escape
-            for _ in range(5):
-                self.page.keyboard.press('Escape')
-                time.sleep(0.3)
+            for _ in range(2):
+                page.keyboard.press('Escape')
             
             # Rimuovi dialog/modal con JavaScript
-            self.page.evaluate("""
-                // Rimuovi tutti i dialog
-                document.querySelectorAll('[role="dialog"]').forEach(el => el.remove());
-                
-                // Rimuovi modal wrapper
-                document.querySelectorAll('[class*="modal"]').forEach(el => {
-                    if (!el.querySelector('canvas')) el.remove();
-                });
-                
-                // Rimuovi overlay/backdrop
-                document.querySelectorAll('[class*="overlay"], [class*="backdrop"]').forEach(el => el.remove());
-            """)
-            time.sleep(1)
+            page.evaluate(CLEANUP_JS)
             
         except Exception as e:
             print(f"    Warning cleanup: {str(e)[:40]}")
     
+    def _take_screenshot(self, page, output_path):
+        """
+        Salva lo screenshot della pagina, tramite la pipeline immagini se configurata
+        
+        Args:
+            page: Pagina Playwright
+            output_path: Percorso del file di output
+        """
+        if self.image_pipeline is not None:
+            self.image_pipeline.screenshot(page, output_path)
+        else:
+            page.screenshot(path=output_path, full_page=False)
+    
     def capture_screenshot(self, timeframe, output_path):
         """
         Cattura screenshot del grafico
@@ -113,16 +518,15 @@ class TradingViewScraper:
             True se successo, False altrimenti
         """
         try:
-            # Inizializza browser se necessario
-            if self.page is None:
-                self._init_browser()
+            # Inizializza browser se necessario (o ricrea la pagina dopo un crash)
+            self._ensure_page()
             
             # Costruisci URL con indicatori
             url = self._build_url_with_studies(timeframe)
             
             # Carica pagina
             print(f"  Caricamento con indicatori pre-configurati...")
-            self.page.goto(url, wait_until='networkidle', timeout=60000)
+            self.page.goto(url, wait_until='domcontentloaded', timeout=60000)
             
             # Attendi caricamento e pulisci
             self._wait_for_load_and_clean()
@@ -131,7 +535,7 @@ class TradingViewScraper:
             
             # Cattura screenshot - Playwright lo fa in modo molto più affidabile!
             print(f"  📸 Cattura screenshot...")
-            self.page.screenshot(path=output_path, full_page=False)
+            self._take_screenshot(self.page, output_path)
             
             print(f"  ✅ Salvato: {output_path}")
             return True
@@ -140,10 +544,203 @@ class TradingViewScraper:
             print(f"  ❌ Errore: {e}")
             return False
     
+    def _capture_concurrent(self, jobs):
+        """
+        Cattura più timeframe in parallelo su pagine separate dello stesso browser
+        
+        Le navigazioni vengono avviate tutte insieme (fino a self.concurrency pagine
+        per volta) e Chromium le carica in parallelo; l'attesa di caricamento viene
+        quindi pagata una sola volta per gruppo invece che per ogni timeframe.
+        
+        Args:
+            jobs: Lista di tuple (tf_name, tf_value, output_path)
+            
+        Returns:
+            Tupla (results, last_page)
+            - results: Dizionario {tf_name: True/False}
+            - last_page: Ultima pagina caricata con successo (per l'estrazione del prezzo)
+        """
+        self._ensure_page()
+        
+        # Prepara una pagina per ogni slot di concorrenza (sostituendo quelle in crash)
+        self.worker_pages = [page for page in self.worker_pages if self._page_usable(page)]
+        while len(self.worker_pages) < min(self.concurrency, len(jobs)):
+            self.worker_pages.append(self._new_page())
+        
+        results = {}
+        last_page = None
+        
+        for batch_start in range(0, len(jobs), self.concurrency):
+            batch = jobs[batch_start:batch_start + self.concurrency]
+            loading = []
+            
+            # Avvia tutte le navigazioni del gruppo senza attendere il caricamento completo
+            for (tf_name, tf_value, output_path), page in zip(batch, self.worker_pages):
+                try:
+                    print(f"  ⚡ [{tf_name}] Avvio caricamento in parallelo...")
+                    page.goto(self._build_url_with_studies(tf_value), wait_until='commit', timeout=60000)
+                    loading.append((tf_name, output_path, page))
+                except Exception as e:
+                    print(f"  ❌ [{tf_name}] Errore navigazione: {e}")
+                    results[tf_name] = False
+            
+            # Le pagine si caricano in parallelo: la scadenza di prontezza è comune al gruppo
+            deadline = time.monotonic() + self.ready_timeout
+            
+            for tf_name, output_path, page in loading:
+                try:
+                    self._wait_for_load_and_clean(page, deadline=deadline)
+                    print(f"  📸 [{tf_name}] Cattura screenshot...")
+                    self._take_screenshot(page, output_path)
+                    print(f"  ✅ [{tf_name}] Salvato: {output_path}")
+                    results[tf_name] = True
+                    last_page = page
+                except Exception as e:
+                    print(f"  ❌ [{tf_name}] Errore: {e}")
+                    results[tf_name] = False
+        
+        return results, last_page
+    
+    def _live_tab_problem(self, tab):
+        """
+        Verifica se una tab live può essere usata così com'è
+        
+        Args:
+            tab: Stato della tab (o None se non ancora aperta)
+            
+        Returns:
+            Motivo del ricaricamento, oppure None se la tab è sana
+        """
+        if tab is None:
+            return "nuova tab"
+        if tab["crashed"] or tab["page"].is_closed():
+            return "pagina in crash o chiusa"
+        
+        now = time.monotonic()
+        if now - tab["loaded_at"] > self.live_tab_max_age:
+            return f"età oltre {self.live_tab_max_age}s"
+        
+        try:
+            state = tab["page"].evaluate(CHART_READY_PROBE_JS)
+        except Exception as e:
+            return f"sonda fallita: {str(e)[:40]}"
+        
+        if state.get("error"):
+            return state["error"]
+        if not (state["canvas"] and state["last_bar"]):
+            return "grafico non più disegnato"
+        
+        # Dati in streaming: l'ultima barra deve cambiare almeno ogni live_tab_stale_after secondi
+        if state["last_bar_text"] != tab["last_bar_text"]:
+            tab["last_bar_text"] = state["last_bar_text"]
+            tab["last_change"] = now
+        elif now - tab["last_change"] > self.live_tab_stale_after:
+            return f"nessun aggiornamento da {now - tab['last_change']:.0f}s"
+        
+        return None
+    
+    def _open_live_tab(self, tf_name):
+        """
+        Apre (o riapre) la tab live di un timeframe in un contesto dedicato
+        
+        Args:
+            tf_name: Nome del timeframe (es. 15min)
+            
+        Returns:
+            Stato della nuova tab
+        """
+        self._close_live_tab(tf_name)
+        
+        page = self._new_page()
+        tab = {
+            "page": page,
+            "crashed": False,
+            "loaded_at": time.monotonic(),
+            "last_change": time.monotonic(),
+            "last_bar_text": "",
+        }
+        page.on("crash", lambda _: tab.update(crashed=True))
+        self.tabs[tf_name] = tab
+        return tab
+    
+    def _close_live_tab(self, tf_name):
+        """Chiude la tab live di un timeframe (pagina e contesto) e la rimuove"""
+        tab = self.tabs.pop(tf_name, None)
+        if tab is not None:
+            try:
+                tab["page"].context.close()
+            except Exception:
+                pass
+    
+    def _capture_live(self, jobs):
+        """
+        Cattura i timeframe dalle tab live, ricaricando solo quelle ferme o rotte
+        
+        Args:
+            jobs: Lista di tuple (tf_name, tf_value, output_path)
+            
+        Returns:
+            Tupla (results, last_page) come _capture_concurrent
+        """
+        self._ensure_page()
+        
+        results = {}
+        last_page = None
+        loading = []
+        
+        # Ricarica in parallelo solo le tab che ne hanno bisogno
+        for tf_name, tf_value, output_path in jobs:
+            reason = self._live_tab_problem(self.tabs.get(tf_name))
+            if reason is None:
+                continue
+            
+            print(f"  🔄 [{tf_name}] Caricamento tab live ({reason})...")
+            try:
+                tab = self._open_live_tab(tf_name)
+                tab["page"].goto(self._build_url_with_studies(tf_value), wait_until='commit', timeout=60000)
+                loading.append(tf_name)
+            except Exception as e:
+                print(f"  ❌ [{tf_name}] Errore navigazione: {e}")
+                self._close_live_tab(tf_name)
+                results[tf_name] = False
+        
+        deadline = time.monotonic() + self.ready_timeout
+        for tf_name in loading:
+            try:
+                self._wait_for_load_and_clean(self.tabs[tf_name]["page"], deadline=deadline)
+            except Exception as e:
+                print(f"  ❌ [{tf_name}] Errore: {e}")
+                self._close_live_tab(tf_name)
+                results[tf_name] = False
+        
+        for tf_name, tf_value, output_path in jobs:
+            if tf_name in results:
+                continue
+            
+            tab = self.tabs[tf_name]
+            try:
+                if tf_name not in loading:
+                    self._clean_interface(tab["page"])
+                    print(f"  ⚡ [{tf_name}] Tab live già pronta")
+                self._take_screenshot(tab["page"], output_path)
+                print(f"  ✅ [{tf_name}] Salvato: {output_path}")
+                results[tf_name] = True
+                last_page = tab["page"]
+            except Exception as e:
+                print(f"  ❌ [{tf_name}] Errore: {e}")
+                tab["crashed"] = True
+                results[tf_name] = False
+        
+        return results, last_page
+    
     def capture_all_timeframes(self, output_dir="screenshots"):
         """
         Cattura screenshot di tutti i timeframe ed estrae il prezzo corrente
         
+        Con live_tabs ogni timeframe ha una tab persistente e viene solo fotografato;
+        con concurrency > 1 i timeframe vengono caricati in parallelo su pagine
+        separate dello stesso browser; altrimenti uno dopo l'altro sulla pagina principale.
+        
         Args:
             output_dir: Directory dove salvare gli screenshot
             
@@ -156,7 +753,6 @@ class TradingViewScraper:
         
         now = datetime.now()
         timestamp = now.strftime("%Y%m%d_%H%M%S")
-        current_hour = now.hour
         
         timeframes = {
             "60min": 60,
@@ -165,43 +761,69 @@ class TradingViewScraper:
         }
         
         screenshots = {}
+        jobs = []
+        extension = self.image_pipeline.extension if self.image_pipeline else ".png"
         
         print("="*70)
         print(f"🚀 CATTURA SCREENSHOT - {now.strftime('%Y-%m-%d %H:%M:%S')}")
         print(f"   Simbolo: {self.broker}:{self.symbol}")
         print(f"   Indicatori: EMA 9, MACD, RSI (pre-caricati)")
         print(f"   Engine: Playwright (stabile e affidabile)")
+        if self.live_tabs:
+            print(f"   Modalità: tab live persistenti")
+        elif self.concurrency > 1:
+            print(f"   Modalità: concorrente (max {self.concurrency} pagine in parallelo)")
         print("="*70)
         print()
         
-        for i, (tf_name, tf_value) in enumerate(timeframes.items(), 1):
-            print(f"[{i}/3] " + "━"*50)
-            print(f"📊 Timeframe {tf_name}")
-            
-            # Logica di caching per 60min
-            if tf_name == "60min":
-                # Controlla se abbiamo già uno screenshot della stessa ora
-                if self.cached_1h_screenshot and self.cached_1h_hour == current_hour:
-                    print(f"   💾 Riutilizzo screenshot 1H della stessa ora (cache)")
-                    screenshots[tf_name] = self.cached_1h_screenshot
-                    print(f"   ✅ Screenshot riutilizzato: {self.cached_1h_screenshot}")
-                    print()
-                    continue
-                else:
-                    print(f"   🆕 Nuova ora rilevata, cattura nuovo screenshot 1H")
-            
-            output_path = os.path.join(output_dir, f"{timestamp}_{tf_name}.png")
-            
-            success = self.capture_screenshot(tf_value, output_path)
-            screenshots[tf_name] = output_path if success else None
-            
-            # Salva in cache se è 60min e ha avuto successo
-            if tf_name == "60min" and success:
-                self.cached_1h_screenshot = output_path
-                self.cached_1h_hour = current_hour
-                print(f"   💾 Screenshot 1H salvato in cache (ora: {current_hour:02d}:xx)")
+        # Prezzo di riferimento per la validità dei frame in cache (solo dal feed, è gratuito)
+        reference_price = None
+        if self.price_feed is not None:
+            reference_price = self.price_feed.price(self.symbol, max_age=PRICE_FEED_MAX_AGE, broker=self.broker)
+        
+        cached = set()
+        for tf_name, tf_value in timeframes.items():
+            # Frame della stessa candela ancora valido: niente ricaricamento del grafico
+            cached_path = self.frame_cache.get(self.symbol, tf_name, tf_value, reference_price,
+                                               now.timestamp())
+            if cached_path:
+                print(f"   💾 [{tf_name}] Candela ancora aperta, riutilizzo: {cached_path}")
+                screenshots[tf_name] = cached_path
+                cached.add(tf_name)
+                continue
             
+            output_path = os.path.join(output_dir, f"{timestamp}_{tf_name}{extension}")
+            jobs.append((tf_name, tf_value, output_path))
+        
+        price_page = self.page
+        
+        if self.live_tabs or (self.concurrency > 1 and len(jobs) > 1):
+            if self.live_tabs:
+                results, last_page = self._capture_live(jobs)
+            else:
+                results, last_page = self._capture_concurrent(jobs)
+            price_page = last_page or price_page
+            for tf_name, _, output_path in jobs:
+                screenshots[tf_name] = output_path if results.get(tf_name) else None
             print()
+        else:
+            for i, (tf_name, tf_value, output_path) in enumerate(jobs, 1):
+                print(f"[{i}/{len(jobs)}] " + "━"*50)
+                print(f"📊 Timeframe {tf_name}")
+                
+                success = self.capture_screenshot(tf_value, output_path)
+                screenshots[tf_name] = output_path if success else None
+                print()
+            price_page = self.page
+        
+        # Sposta i frame nuovi nell'archivio (deduplicati, con retention)
+        if self.screenshot_store is not None:
+            for tf_name, _, output_path in jobs:
+                if screenshots.get(tf_name):
+                    screenshots[tf_name] = self.screenshot_store.put(self.symbol, tf_name, output_path, now)
+        
+        # Mantieni l'ordine originale dei timeframe
+        screenshots = {tf_name: screenshots.get(tf_name) for tf_name in timeframes}
         
         # Riepilogo
         print("="*70)
@@ -215,53 +837,95 @@ class TradingViewScraper:
             path_str = path if path else "ERRORE"
             
             # Indica se è da cache
-            cache_indicator = ""
-            if tf_name == "60min" and path == self.cached_1h_screenshot and self.cached_1h_hour == current_hour:
-                cache_indicator = " 💾 (cache)"
+            cache_indicator = " 💾 (cache)" if tf_name in cached else ""
             
             print(f"   {status} {tf_name:5s} : {path_str}{cache_indicator}")
         
         print(f"\n   Successo: {success_count}/3")
-        if self.cached_1h_screenshot and self.cached_1h_hour == current_hour:
-            print(f"   💾 Screenshot 1H da cache (ora: {current_hour:02d}:xx)")
+        if cached:
+            cache_stats = self.frame_cache.stats()
+            print(f"   💾 Da cache: {', '.join(sorted(cached))} "
+                  f"(hit {cache_stats['hits']}, miss {cache_stats['misses']})")
         print("="*70)
         
-        # Estrai prezzo corrente dalla pagina
+        # Prezzo corrente dal feed websocket, con il DOM come fallback
+        current_price = None
+        if self.price_feed is not None:
+            tick = self.price_feed.last(self.symbol, max_age=PRICE_FEED_MAX_AGE, broker=self.broker)
+            if tick:
+                current_price = tick["price"]
+                bid_ask = f" (bid {tick['bid']}, ask {tick['ask']})" if tick["bid"] and tick["ask"] else ""
+                print(f"\n💰 Prezzo corrente dal feed websocket: {current_price}{bid_ask}")
+        
+        if current_price is None:
+            current_price = self._extract_current_price(price_page)
+        
+        # I frame nuovi restano validi fino alla chiusura della loro candela
+        for tf_name, tf_value, _ in jobs:
+            if screenshots.get(tf_name):
+                self.frame_cache.put(self.symbol, tf_name, tf_value, screenshots[tf_name],
+                                     current_price, now.timestamp())
+        
+        if self.network_filter is not None:
+            self.network_filter.report()
+        if self.image_pipeline is not None:
+            self.image_pipeline.report()
+        
+        # Salva cookie e consensi per il prossimo avvio a freddo
+        if self.browser_state is not None and price_page is not None and success_count:
+            self.browser_state.save(price_page.context)
+            stats = self.browser_state.stats()
+            print(f"💾 Cache asset: {stats['cache_hits']} hit, {stats['cache_misses']} miss")
+        
+        print("="*70)
+        print()
+        
+        return screenshots, current_price
+    
+    def _is_plausible_price(self, price_value):
+        """
+        Verifica che un valore letto dal DOM sia un prezzo plausibile per il simbolo
+        
+        Args:
+            price_value: Valore numerico estratto
+            
+        Returns:
+            True se il valore rientra nell'intervallo atteso
+        """
+        reference = self.price_feed.price(self.symbol, broker=self.broker) if self.price_feed is not None else None
+        return is_plausible_price(price_value, self.price_range, reference)
+    
+    def _extract_current_price(self, page):
+        """
+        Estrae il prezzo corrente dalla pagina del grafico (fallback del feed websocket)
+        
+        Args:
+            page: Pagina Playwright da cui leggere il prezzo
+            
+        Returns:
+            Prezzo corrente o None se non trovato
+        """
         current_price = None
         print("\n🔍 Estrazione prezzo corrente...")
         
+        if page is None:
+            print(f"\n⚠️  Nessuna pagina disponibile per l'estrazione del prezzo")
+            return None
+        
         try:
-            import re
-            
             # Prova diversi selettori
-            selectors = [
-                '[class*="last-"]',
-                '[class*="price-"]',
-                '[class*="lastPrice"]',
-                '.tv-symbol-price-quote__value',
-                '[data-name="legend-source-item"]'
-            ]
-            
-            for selector in selectors:
+            for selector in PRICE_SELECTORS:
                 try:
-                    elements = self.page.locator(selector).all()
+                    elements = page.locator(selector).all()
                     print(f"   Tentativo con selettore: {selector} - Trovati {len(elements)} elementi")
                     
                     for element in elements[:5]:  # Controlla i primi 5
-                        text = element.text_content()
-                        if text:
-                            # Cerca pattern di prezzo
-                            price_match = re.search(r'([0-9]{1,5}[,\.]?[0-9]{1,3}\.?[0-9]{0,2})', text.replace(',', '').replace(' ', ''))
-                            if price_match:
-                                try:
-                                    price_value = float(price_match.group(1))
-                                    # Valida che sia un prezzo ragionevole per XAUUSD (1000-10000)
-                                    if 1000 <= price_value <= 10000:
-                                        current_price = price_value
-                                        print(f"   ✅ Prezzo trovato: {current_price} (selettore: {selector})")
-                                        break
-                                except ValueError:
-                                    continue
+                        price_value = parse_price_text(element.text_content())
+                        # Valida che sia un prezzo ragionevole per il simbolo
+                        if price_value is not None and self._is_plausible_price(price_value):
+                            current_price = price_value
+                            print(f"   ✅ Prezzo trovato: {current_price} (selettore: {selector})")
+                            break
                     
                     if current_price:
                         break
@@ -278,13 +942,52 @@ class TradingViewScraper:
         except Exception as e:
             print(f"\n⚠️  Errore durante estrazione prezzo: {e}")
         
-        print("="*70)
-        print()
+        return current_price
+    
+    def pump_events(self, seconds):
+        """
+        Lascia lavorare il browser per alcuni secondi tra un ciclo e l'altro
         
-        return screenshots, current_price
+        Con l'API sync di Playwright i frame websocket arrivano al PriceFeed solo
+        mentre il thread è dentro una chiamata Playwright: questa attesa li consegna.
+        Se nessuna pagina è aperta, carica il grafico a 1 minuto sulla pagina principale.
+        
+        Args:
+            seconds: Durata dell'attesa
+        
+        Returns:
+            True se gli eventi sono stati consegnati, False se il browser non è disponibile
+        """
+        pages = [self.page] + self.worker_pages + [tab["page"] for tab in self.tabs.values()]
+        page = next((p for p in pages if self._page_usable(p)), None)
+        try:
+            if page is None:
+                self._ensure_page()
+                page = self.page
+                page.goto(self._build_url_with_studies(1), wait_until='commit', timeout=60000)
+            page.wait_for_timeout(seconds * 1000)
+            return True
+        except Exception as e:
+            print(f"    ⚠️  Feed prezzi non disponibile: {str(e)[:80]}")
+            time.sleep(seconds)
+            return False
     
     def close(self):
-        """Chiude il browser e Playwright"""
+        """Chiude il browser e Playwright (solo i propri contesti se il browser è condiviso)"""
+        if self.shared_browser:
+            pages = [self.page] + self.worker_pages + [tab["page"] for tab in self.tabs.values()]
+            for page in pages:
+                if page is None:
+                    continue
+                try:
+                    page.context.close()
+                except:
+                    pass
+            self.page = None
+            self.worker_pages = []
+            self.tabs = {}
+            return
+        
         if self.browser:
             try:
                 self.browser.close()